@@ -0,0 +1,305 @@
+"""
+Headless HTTP API for the recommendation pipeline.
+
+Wraps pipeline.py for mobile and other non-Streamlit clients. All requests in
+the process share the search/scrape caches, the LLM router and the metrics
+registry. Identical requests that are in flight at the same time are coalesced
+into one pipeline run. The blocking pipeline stages run on a worker thread
+pool, so the event loop keeps accepting connections while they wait.
+
+Endpoints:
+    GET  /search?q=...&num=5           search results (with scraped details)
+    GET  /scrape?url=...               scraped details for one page
+    GET  /recommend?food_type=...      recommendations as newline-delimited JSON events:
+         &budget=&num_people=&location=&restaurant=&format=json|text
+         {"event": "search", ...}, then one {"event": "card", ...} per card, then {"event": "done"}
+    POST /recommend                    same, parameters as a JSON body
+    GET  /restaurants?budget=800       cached restaurants whose estimated cost fits the budget, cheapest first
+         &num_people=2&location=&limit=20   (price_index.py range query, no LLM call)
+    GET  /metrics                      stage latencies, cache hit ratios, LLM router stats,
+                                       per-domain scrape latency and circuit breaker state,
+                                       background (stale-while-revalidate) refreshes,
+                                       Custom Search quota left and projected exhaustion
+    GET  /healthz
+
+Configuration: the usual API key variables, FOOD_API_WORKERS (pipeline threads,
+default 16) and FOOD_API_TOKEN (if set, requests need "Authorization: Bearer <token>").
+The token is required when the server listens on anything but a loopback address,
+and /scrape refuses (403) URLs that resolve to, or redirect to, a private, loopback
+or otherwise non-public address (see public_fetch.py).
+
+Profiling: with FOOD_PROFILE_PARAM=1, /search and /recommend accept
+&profile=sample|cprofile and write a profile of that request (the id is in the
+X-Profile-Id response header); FOOD_PROFILE profiles requests without the
+parameter. See profiling.py.
+
+Usage:
+    python api_server.py --port 8080
+    FOOD_API_TOKEN=... python api_server.py --host 0.0.0.0 --port 8080
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from urllib.parse import urlparse
+
+from aiohttp import web
+
+import pipeline
+from cache import SEARCH_CACHE, SCRAPE_CACHE
+from card_parser import parse_cards
+from domain_health import DOMAIN_HEALTH, CircuitOpen
+from google_search import api_usage, scrape_website
+from llm_router import get_router
+from metrics import METRICS
+from price_index import load_or_build
+from profiling import active_profile, profile_request, requested_mode
+from public_fetch import NonPublicAddress, is_public_address
+from query_canon import query_key, recommendation_key
+from quota import QUOTA
+from revalidate import REVALIDATOR
+from structured_output import json_mode_enabled, parse_recommendations
+
+MAX_SEARCH_RESULTS = 20
+PROFILED_PATHS = ('/search', '/recommend')
+# Seconds before /restaurants rebuilds the price index from the scrape cache
+PRICE_INDEX_MAX_AGE = 300
+
+class Coalescer:
+    """Share one in-flight asyncio task between concurrent callers with the same key."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            METRICS.incr(f'coalesced.{self.name}')
+            # shield: one caller disconnecting must not cancel the shared run
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(factory())
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+def _text(value: Any) -> str:
+    return ' '.join(str(value or '').split())
+
+def _key(*parts: Any) -> tuple:
+    return tuple(_text(part).lower() for part in parts)
+
+def _number(value: Any, name: str, cast: Callable = float) -> Any:
+    """A finite, non-negative number from a request parameter, else 400."""
+    try:
+        number = cast(value)
+    except (TypeError, ValueError):
+        raise web.HTTPBadRequest(text=f"{name} must be a number")
+    if not math.isfinite(number) or number < 0:
+        raise web.HTTPBadRequest(text=f"{name} must be a finite, non-negative number")
+    return number
+
+async def _public_host(url: str) -> bool:
+    """
+    Whether every address the URL's host resolves to is publicly routable: a quick 403.
+    The fetch itself re-checks every address it connects to (public_fetch.py).
+    """
+    host = urlparse(url).hostname
+    if not host:
+        return False
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None)
+    except OSError:
+        return False
+    addresses = {info[4][0] for info in infos}
+    return bool(addresses) and all(is_public_address(address) for address in addresses)
+
+def _route(request: web.Request) -> str:
+    """The matched route's path, so made-up paths share one metrics series."""
+    resource = request.match_info.route.resource
+    return resource.canonical if resource is not None else 'unmatched'
+
+class RecommendationAPI:
+    def __init__(self, workers: Optional[int] = None, api_token: Optional[str] = None):
+        self.executor = ThreadPoolExecutor(max_workers=workers or int(os.getenv('FOOD_API_WORKERS', 16)),
+                                           thread_name_prefix='api')
+        self.api_token = api_token if api_token is not None else os.getenv('FOOD_API_TOKEN')
+        self.together_api_key = os.getenv('TOGETHER_API_KEY')
+        self.searches = Coalescer('search')
+        self.scrapes = Coalescer('scrape')
+        self.completions = Coalescer('llm')
+        self.indexes = Coalescer('price_index')
+
+    async def _in_thread(self, func: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        profile = active_profile()
+        if profile is not None:
+            return await loop.run_in_executor(self.executor, lambda: profile.run_in_thread(func, *args, **kwargs))
+        return await loop.run_in_executor(self.executor, lambda: func(*args, **kwargs))
+
+    def _search(self, query: str, num_results: int):
+        return self.searches.run(_key(query_key(query), num_results),
+                                 lambda: self._in_thread(pipeline.search, query, num_results=num_results))
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        if self.api_token and request.path != '/healthz':
+            if request.headers.get('Authorization') != f"Bearer {self.api_token}":
+                return web.json_response({'error': 'unauthorized'}, status=401)
+        route = _route(request)
+        METRICS.incr(f'http.{route}')
+        mode = None
+        if request.path in PROFILED_PATHS:
+            mode = requested_mode(request.query.get('profile'), request.path_qs)
+        with METRICS.timed(f'http.{route}'), profile_request(request.path_qs, mode, in_workers=True) as profile:
+            try:
+                response = await handler(request)
+            except web.HTTPException:
+                raise
+            except Exception as e:
+                print(f"API error on {request.path}: {str(e)}")
+                response = web.json_response({'error': str(e)}, status=500)
+            if profile is not None and not response.prepared:
+                response.headers['X-Profile-Id'] = profile.id
+            return response
+
+    async def search(self, request: web.Request) -> web.Response:
+        query = _text(request.query.get('q'))
+        if not query:
+            raise web.HTTPBadRequest(text='missing q')
+        num_results = max(1, min(_number(request.query.get('num', 5), 'num', int), MAX_SEARCH_RESULTS))
+        results, _ = await self._search(query, num_results)
+        return web.json_response({'query': query, 'results': [result.to_dict() for result in results]})
+
+    async def scrape(self, request: web.Request) -> web.Response:
+        url = request.query.get('url', '').strip()
+        if not url.startswith(('http://', 'https://')):
+            raise web.HTTPBadRequest(text='missing or invalid url')
+        if not await _public_host(url):
+            raise web.HTTPForbidden(text='url must point at a public host')
+        try:
+            info = await self.scrapes.run(url, lambda: self._in_thread(scrape_website, url, public_only=True))
+        except NonPublicAddress:
+            raise web.HTTPForbidden(text='url must point at a public host')
+        except CircuitOpen as e:
+            return web.json_response({'url': url, 'error': str(e)}, status=503)
+        if info is None:
+            return web.json_response({'url': url, 'error': 'no restaurant details found'}, status=404)
+        return web.json_response({'url': url, 'info': info.to_dict()})
+
+    async def recommend(self, request: web.Request) -> web.StreamResponse:
+        params = dict(request.query)
+        if request.method == 'POST':
+            try:
+                body = await request.json()
+            except json.JSONDecodeError:
+                raise web.HTTPBadRequest(text='body must be JSON')
+            if not isinstance(body, dict):
+                raise web.HTTPBadRequest(text='body must be a JSON object')
+            params.update(body)
+        food_type = _text(params.get('food_type'))
+        if not food_type:
+            raise web.HTTPBadRequest(text='missing food_type')
+        budget = _number(params.get('budget', 1000), 'budget')
+        num_people = max(1, _number(params.get('num_people', 1), 'num_people', int))
+        location = _text(params.get('location')) or None
+        restaurant = _text(params.get('restaurant')) or None
+        output_format = params.get('format') or ('json' if json_mode_enabled() else 'text')
+        json_mode = output_format == 'json'
+
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        profile = active_profile()
+        if profile is not None:
+            response.headers['X-Profile-Id'] = profile.id
+        await response.prepare(request)
+
+        async def send(event: str, **data):
+            await response.write((json.dumps(dict(data, event=event), ensure_ascii=False) + '\n').encode('utf-8'))
+
+        try:
+            search_query = f"Best {food_type} {location or 'Bangalore'}"
+            results, search_info = await self._search(search_query, 5)
+            await send('search', query=search_query, results=len(results),
+                       restaurants=[result.info.name for result in results if result.info and result.info.name])
+
+            prompt = pipeline.build_prompt(food_type, budget, num_people, restaurant, location, search_info, json_mode)
+            text = await self.completions.run(
+                recommendation_key({'food_type': food_type, 'budget': budget, 'num_people': num_people,
+                                    'location': location, 'restaurant': restaurant, 'format': output_format}),
+                lambda: self._in_thread(pipeline.complete, self.together_api_key,
+                                        pipeline.build_payload(prompt, json_mode), restaurant))
+            if json_mode:
+                cards, problems = parse_recommendations(text, budget, num_people)
+            else:
+                cards, problems = parse_cards(text), []
+            # A coalesced answer may have been written for another budget in the same bucket (recommendation_key)
+            problems += [f"Rejected recommendation without a total within the budget: {card.restaurant}"
+                         for card in cards if not card.within_budget(budget, num_people)]
+            cards = [card for card in cards if card.within_budget(budget, num_people)]
+            for card in cards:
+                await send('card', **asdict(card))
+            await send('done', cards=len(cards), problems=problems)
+        except Exception as e:
+            print(f"Recommendation failed for '{food_type}': {str(e)}")
+            await send('error', error=str(e))
+        await response.write_eof()
+        return response
+
+    async def restaurants(self, request: web.Request) -> web.Response:
+        if 'budget' not in request.query:
+            raise web.HTTPBadRequest(text='missing budget')
+        budget = _number(request.query['budget'], 'budget')
+        num_people = max(1, _number(request.query.get('num_people', 1), 'num_people', int))
+        limit = max(1, min(_number(request.query.get('limit', 20), 'limit', int), 100))
+        location = _text(request.query.get('location')) or None
+        index = await self.indexes.run('price', lambda: self._in_thread(load_or_build, PRICE_INDEX_MAX_AGE))
+        hits = index.query(budget, num_people, location=location, limit=limit)
+        return web.json_response({'indexed': len(index), 'results': [asdict(hit) for hit in hits]})
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        snapshot = METRICS.snapshot()
+        snapshot['cache_hit_ratio'] = {'search': SEARCH_CACHE.hit_ratio(), 'scrape': SCRAPE_CACHE.hit_ratio()}
+        snapshot['cache_backend'] = SEARCH_CACHE.backend.name
+        snapshot['cse_calls'] = api_usage['cse_calls']
+        snapshot['domains'] = DOMAIN_HEALTH.snapshot()
+        snapshot['revalidate'] = REVALIDATOR.stats()
+        snapshot['quota'] = QUOTA.snapshot()
+        if self.together_api_key:
+            snapshot['llm_router'] = get_router(self.together_api_key).stats
+        return web.json_response(snapshot)
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        return web.json_response({'status': 'ok'})
+
+def create_app(api: Optional[RecommendationAPI] = None) -> web.Application:
+    api = api or RecommendationAPI()
+    app = web.Application(middlewares=[api.middleware])
+    app.add_routes([
+        web.get('/search', api.search),
+        web.get('/scrape', api.scrape),
+        web.get('/recommend', api.recommend),
+        web.post('/recommend', api.recommend),
+        web.get('/restaurants', api.restaurants),
+        web.get('/metrics', api.metrics),
+        web.get('/healthz', api.healthz),
+    ])
+    app.on_cleanup.append(lambda _: asyncio.get_running_loop().run_in_executor(None, api.executor.shutdown))
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, help='pipeline worker threads (default: $FOOD_API_WORKERS or 16)')
+    args = parser.parse_args()
+    api = RecommendationAPI(workers=args.workers)
+    if not api.api_token and args.host not in ('127.0.0.1', '::1', 'localhost'):
+        parser.error(f"set FOOD_API_TOKEN to listen on {args.host} (only loopback is served without a token)")
+    web.run_app(create_app(api), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
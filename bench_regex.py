@@ -0,0 +1,131 @@
+"""
+Micro-benchmark: per-page regex time for the extractors, before and after the
+precompiled registry in patterns.py.
+
+Runs without network or BeautifulSoup: a synthetic restaurant page is reduced to
+its text nodes and both variants run the same extraction work over them
+(price range, rating, the 8 keyword fields and the menu loop).
+
+Usage:
+    python bench_regex.py [--pages 200] [--repeat 5]
+"""
+import argparse
+import re
+import statistics
+import time
+
+import patterns
+
+# --- "Before": the inline patterns as they were used by the extractors ---
+
+def legacy_extract_price_range(text):
+    price_patterns = [
+        r'₹\s*(\d+)\s*-\s*₹\s*(\d+)',
+        r'Rs\.?\s*(\d+)\s*-\s*Rs\.?\s*(\d+)',
+        r'INR\s*(\d+)\s*-\s*INR\s*(\d+)',
+        r'(\d+)\s*-\s*(\d+)\s*rupees',
+    ]
+    for pattern in price_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            return f"₹{match.group(1)} - ₹{match.group(2)}"
+    return ""
+
+def legacy_extract_rating(text):
+    rating_patterns = [
+        r'(\d+\.?\d*)\s*\/\s*5',
+        r'(\d+\.?\d*)\s*out\s*of\s*5',
+        r'rating\s*:\s*(\d+\.?\d*)',
+    ]
+    for pattern in rating_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            return match.group(1)
+    return ""
+
+LEGACY_KEYWORDS = [
+    ['cuisine', 'food type', 'serves', 'specializes in'],
+    ['address', 'location', 'located at', 'find us'],
+    ['price range', 'cost for two', 'average cost', 'price level'],
+    ['rating', 'score', 'reviews?', 'stars?'],
+    ['specialt(?:ies|y)', 'signature', 'popular', 'recommended', 'must try'],
+    ['phone', 'contact', 'tel', 'call', 'book table'],
+    ['timing', 'hours', 'open(?:ing)?', 'days?'],
+    ['features', 'amenities', 'facilities', 'serv(?:es|ice)'],
+]
+
+def legacy_page(text_nodes, page_text):
+    legacy_extract_price_range(page_text)
+    legacy_extract_rating(page_text)
+    for keywords in LEGACY_KEYWORDS:
+        pattern = re.compile(r'|'.join(keywords), re.IGNORECASE)
+        [node for node in text_nodes if pattern.search(node)]
+    price_pattern = re.compile(r'(?:₹|Rs\.?|INR|\$|€|£)\s*(\d+(?:\.\d{1,2})?)\b')
+    for node in text_nodes:
+        match = price_pattern.search(node)
+        if match:
+            name = re.sub(r'[\r\n\t]+', ' ', node[:match.start()])
+            re.sub(r'\s{2,}', ' ', name).strip()
+
+# --- "After": the shared registry ---
+
+def registry_page(text_nodes, page_text):
+    patterns.match_price_range(page_text)
+    patterns.match_rating(page_text)
+    candidates = patterns.keyword_candidates(text_nodes)
+    for pattern in patterns.FIELD_KEYWORDS.values():
+        [node for node, lowered in candidates if pattern.search(lowered)]
+    for node in text_nodes:
+        match = patterns.MENU_PRICE.search(node)
+        if match:
+            name = patterns.CONTROL_WHITESPACE.sub(' ', node[:match.start()])
+            patterns.MULTI_SPACE.sub(' ', name).strip()
+
+def build_page(seed):
+    """Synthetic listing page, roughly the shape of an aggregator menu page."""
+    nodes = [
+        f"Restaurant {seed} | Koramangala",
+        "Cuisine: North Indian, Biryani, Kebabs",
+        "Address: 80 Feet Road, 4th Block, Koramangala, Bangalore",
+        f"Average cost for two: ₹{600 + seed % 400}",
+        f"Rating: 4.{seed % 10}",
+        "Opening hours: 11am - 11pm, all days",
+        "Call to book table: +91 80 1234 5678",
+        "Amenities: Home delivery, Indoor seating",
+    ]
+    for i in range(60):
+        nodes.append(f"Dish number {i} with a description\t of the dish  ₹{120 + i * 5}")
+        nodes.append("Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor.")
+    return nodes, ' '.join(nodes)
+
+def time_variant(func, pages, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for nodes, text in pages:
+            func(nodes, text)
+        samples.append((time.perf_counter() - start) / len(pages))
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    pages = [build_page(i) for i in range(args.pages)]
+    # Sanity check: both variants agree on the scalar extractors
+    for _, text in pages[:10]:
+        price_range = patterns.match_price_range(text)
+        assert legacy_extract_price_range(text) == (f"₹{price_range[0]} - ₹{price_range[1]}" if price_range else "")
+        assert legacy_extract_rating(text) == (patterns.match_rating(text) or "")
+
+    before = time_variant(legacy_page, pages, args.repeat)
+    after = time_variant(registry_page, pages, args.repeat)
+    print(f"pages={args.pages} repeat={args.repeat}")
+    print(f"before (inline patterns): {before * 1e6:8.1f} us/page")
+    print(f"after  (registry):        {after * 1e6:8.1f} us/page")
+    print(f"speedup: {before / after:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import os
+import time
+from typing import Any, Iterator, NamedTuple, Optional, Tuple
+
+from cache_backends import CacheBackend, CacheBackendError, CorruptEntry, get_backend
+
+# Namespaced TTL caches for the search, scrape and LLM (recommendation) layers.
+# Storage is pluggable (cache_backends.py): by default entries live in one
+# SQLite file so the Streamlit app and separate processes (e.g. the prewarm.py
+# scheduler) share them; FOOD_CACHE_BACKEND=redis://... shares them across app
+# replicas. Values must be JSON-like (dicts, lists, strings, numbers); callers
+# store records via their to_dict() form.
+#
+# FOOD_CACHE_PATH overrides the SQLite database location (default: .cache/food_finder.sqlite3).
+#
+# Stale-while-revalidate: lookup(stale_window=...) also returns entries up to
+# stale_window seconds past their TTL, flagged stale, so callers can answer
+# immediately and refresh in the background (see revalidate.py).
+# FOOD_STALE_WINDOW sets that window (default 24 h, 0 disables); backends that
+# expire entries on their own (Redis) keep them for TTL + FOOD_STALE_WINDOW.
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'food_finder.sqlite3')
+STALE_WINDOW = float(os.getenv('FOOD_STALE_WINDOW', 24 * 3600))
+# decode() result for an entry that could not be read back (treated as absent)
+_CORRUPT = object()
+
+class CacheEntry(NamedTuple):
+    value: Any
+    age: float  # seconds since stored
+    stale: bool  # past the TTL, inside the stale window
+
+class Cache:
+    """A TTL cache namespace (e.g. 'search', 'scrape') in the shared cache backend."""
+
+    def __init__(self, namespace: str, ttl: float, path: Optional[str] = None,
+                 backend: Optional[CacheBackend] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self._path = path
+        self._backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+    @property
+    def path(self) -> str:
+        return self._path or os.getenv('FOOD_CACHE_PATH', DEFAULT_CACHE_PATH)
+
+    @property
+    def backend(self) -> CacheBackend:
+        return self._backend or get_backend(self.path)
+
+    def _decode(self, key: str, data: Any) -> Any:
+        """The stored value, or _CORRUPT (logged) for a truncated or foreign entry."""
+        try:
+            return self.backend.decode(data)
+        except CorruptEntry as e:
+            print(f"Cache entry unreadable ({self.namespace}:{key}), ignoring it: {str(e)}")
+            return _CORRUPT
+
+    def lookup(self, key: str, max_age: Optional[float] = None, stale_window: float = 0.0) -> Optional[CacheEntry]:
+        """
+        Return the entry for key, or None if missing/expired. max_age tightens the TTL;
+        entries up to stale_window seconds past it are returned with stale=True.
+        """
+        limit = self.ttl if max_age is None else min(self.ttl, max_age)
+        try:
+            row = self.backend.get(self.namespace, key)
+        except CacheBackendError as e:
+            print(f"Cache read failed ({self.namespace}): {str(e)}")
+            row = None
+        if row is not None:
+            age = time.time() - row[1]
+            if age <= limit + stale_window:
+                value = self._decode(key, row[0])
+                if value is not _CORRUPT:
+                    stale = age > limit
+                    if stale:
+                        self.stale_hits += 1
+                    else:
+                        self.hits += 1
+                    return CacheEntry(value, age, stale)
+        self.misses += 1
+        return None
+
+    def get_entry(self, key: str, max_age: Optional[float] = None):
+        """Return (value, age_seconds) or None if missing/expired. max_age tightens the TTL."""
+        entry = self.lookup(key, max_age)
+        return None if entry is None else (entry.value, entry.age)
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Any:
+        entry = self.get_entry(key, max_age)
+        return None if entry is None else entry[0]
+
+    def peek(self, key: str) -> Any:
+        """The stored value for key whatever its age (None if absent), without hit/miss accounting."""
+        try:
+            row = self.backend.get(self.namespace, key)
+        except CacheBackendError as e:
+            print(f"Cache read failed ({self.namespace}): {str(e)}")
+            return None
+        value = _CORRUPT if row is None else self._decode(key, row[0])
+        return None if value is _CORRUPT else value
+
+    def set(self, key: str, value: Any, stored_at: Optional[float] = None) -> None:
+        """Store value; stored_at backdates the entry (e.g. to the page fetch time) so the TTL still applies."""
+        try:
+            self.backend.set(self.namespace, key, self.backend.encode(value), time.time() if stored_at is None else stored_at,
+                             expire=self.ttl + STALE_WINDOW)
+        except CacheBackendError as e:
+            print(f"Cache write failed ({self.namespace}): {str(e)}")
+
+    def items(self, max_age: Optional[float] = None) -> Iterator[Tuple[str, Any]]:
+        """Yield (key, value) for every unexpired entry in this namespace (no hit/miss accounting)."""
+        limit = self.ttl if max_age is None else min(self.ttl, max_age)
+        try:
+            rows = self.backend.scan(self.namespace, time.time() - limit)
+        except CacheBackendError as e:
+            print(f"Cache scan failed ({self.namespace}): {str(e)}")
+            return
+        for key, data in rows:
+            value = self._decode(key, data)
+            if value is not _CORRUPT:
+                yield key, value
+
+    def hit_ratio(self) -> float:
+        """Share of lookups answered from the cache, stale entries included."""
+        total = self.hits + self.stale_hits + self.misses
+        return (self.hits + self.stale_hits) / total if total else 0.0
+
+SEARCH_CACHE = Cache('search', ttl=6 * 3600)
+SCRAPE_CACHE = Cache('scrape', ttl=24 * 3600)
+# Final recommendation text per request (pipeline.serve_recommendation)
+RECOMMENDATION_CACHE = Cache('recommendation', ttl=float(os.getenv('FOOD_RECOMMENDATION_TTL', 3600)))
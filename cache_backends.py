@@ -0,0 +1,322 @@
+import json
+import marshal
+import os
+import socket
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+# Storage backends for cache.Cache.
+# A backend stores opaque serialized values under (namespace, key) with the
+# time they were stored; TTLs and stale windows are applied by cache.Cache.
+#   - SQLiteBackend: one local database file shared by the processes on a host (default)
+#   - LRUBackend: in-process and size-bounded, for tests and single-process runs
+#   - RedisBackend: any server speaking the Redis protocol (RESP), shared by all
+#     app replicas; stub_server.py has a small local one for tests
+#
+# FOOD_CACHE_BACKEND selects it: 'sqlite' (default), 'lru', or a URL such as
+# redis://:password@cache-host:6379/0 (FOOD_CACHE_PREFIX namespaces the keys,
+# default 'food'; FOOD_CACHE_LRU_SIZE bounds the LRU, default 10000 entries).
+#
+# Local stores (SQLite, LRU) serialize values with marshal behind a one-byte
+# tag: several times cheaper to encode and decode than JSON for the cached
+# records. Untagged values are read as JSON (entries written before the tag
+# existed). marshal is not meant for untrusted input, so the network store
+# (Redis) uses plain JSON and refuses marshal data unless FOOD_CACHE_FORMAT=marshal
+# opts in (only for a Redis the app replicas alone can write to);
+# FOOD_CACHE_FORMAT=json writes JSON everywhere. Truncated or foreign values,
+# and values that are not a dict, list, string or number, raise
+# CorruptEntry, which cache.Cache reads as a miss.
+
+MARSHAL_TAG = b'M'
+MARSHAL_VERSION = 4
+DEFAULT_LRU_SIZE = 10000
+REDIS_TIMEOUT = 2.0
+# After a Redis failure, calls fail fast for this long instead of waiting on the network again
+REDIS_RETRY_AFTER = 5.0
+REDIS_SCAN_COUNT = 500
+
+class CacheBackendError(Exception):
+    """A backend could not read or write (database locked, Redis unreachable, ...)."""
+
+class CorruptEntry(CacheBackendError):
+    """A stored value could not be decoded (truncated, foreign, or a format this store does not accept)."""
+
+# What cached values are at the top level (cache.py stores JSON-like data)
+VALUE_TYPES = (dict, list, str, int, float)
+
+def encode(value: Any, value_format: str = 'marshal') -> bytes:
+    if value_format == 'json':
+        return json.dumps(value, ensure_ascii=False).encode('utf-8')
+    return MARSHAL_TAG + marshal.dumps(value, MARSHAL_VERSION)
+
+def decode(data: Any, allow_marshal: bool = True) -> Any:
+    """The value stored by encode(); raises CorruptEntry for data it could not have written."""
+    try:
+        if isinstance(data, (bytes, bytearray, memoryview)) and data[:1] == MARSHAL_TAG:
+            if not allow_marshal:
+                raise CorruptEntry("marshal value in a JSON-only store")
+            value = marshal.loads(data[1:])
+        else:
+            value = json.loads(data)
+    except (ValueError, EOFError, TypeError) as e:
+        raise CorruptEntry(f"undecodable cache value: {str(e)}") from e
+    if not isinstance(value, VALUE_TYPES):
+        raise CorruptEntry(f"unexpected {type(value).__name__} cache value")
+    return value
+
+class CacheBackend:
+    """Stores serialized values under (namespace, key), with the time each was stored."""
+    name = 'backend'
+    # Value format unless FOOD_CACHE_FORMAT overrides it (see above)
+    value_format = 'marshal'
+
+    def _format(self) -> str:
+        return os.getenv('FOOD_CACHE_FORMAT') or self.value_format
+
+    def encode(self, value: Any) -> bytes:
+        return encode(value, self._format())
+
+    def decode(self, data: Any) -> Any:
+        return decode(data, allow_marshal=self.value_format == 'marshal' or self._format() == 'marshal')
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[bytes, float]]:
+        """(data, stored_at) or None."""
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: str, data: bytes, stored_at: float, expire: Optional[float] = None) -> None:
+        """Store data; backends that can evict on their own drop it after expire seconds."""
+        raise NotImplementedError
+
+    def scan(self, namespace: str, since: float) -> Iterator[Tuple[str, bytes]]:
+        """(key, data) for every entry in namespace stored at or after since."""
+        raise NotImplementedError
+
+class LRUBackend(CacheBackend):
+    name = 'lru'
+
+    def __init__(self, max_entries: int = DEFAULT_LRU_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[bytes, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[bytes, float]]:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None:
+                self._entries.move_to_end((namespace, key))
+            return entry
+
+    def set(self, namespace: str, key: str, data: bytes, stored_at: float, expire: Optional[float] = None) -> None:
+        with self._lock:
+            self._entries[(namespace, key)] = (data, stored_at)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def scan(self, namespace: str, since: float) -> Iterator[Tuple[str, bytes]]:
+        with self._lock:
+            entries = [(key, data) for (entry_namespace, key), (data, stored_at) in self._entries.items()
+                       if entry_namespace == namespace and stored_at >= since]
+        return iter(entries)
+
+class SQLiteBackend(CacheBackend):
+    name = 'sqlite'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections are not thread-safe)."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                ' namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, stored_at REAL NOT NULL,'
+                ' PRIMARY KEY (namespace, key))'
+            )
+            self._local.connection = connection
+        return connection
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[bytes, float]]:
+        try:
+            row = self._connection().execute(
+                'SELECT value, stored_at FROM cache WHERE namespace = ? AND key = ?', (namespace, key)
+            ).fetchone()
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e)) from e
+        return None if row is None else (row[0], row[1])
+
+    def set(self, namespace: str, key: str, data: bytes, stored_at: float, expire: Optional[float] = None) -> None:
+        try:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO cache (namespace, key, value, stored_at) VALUES (?, ?, ?, ?)',
+                    (namespace, key, data, stored_at)
+                )
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e)) from e
+
+    def scan(self, namespace: str, since: float) -> Iterator[Tuple[str, bytes]]:
+        try:
+            rows = self._connection().execute(
+                'SELECT key, value FROM cache WHERE namespace = ? AND stored_at >= ?', (namespace, since)
+            ).fetchall()
+        except sqlite3.Error as e:
+            raise CacheBackendError(str(e)) from e
+        return iter(rows)
+
+class RedisBackend(CacheBackend):
+    """
+    Minimal RESP2 client (GET / SET PX / SCAN / MGET), one connection per thread.
+    Keys are '<prefix>:<namespace>:<key>'; values are the stored time (8-byte
+    double) followed by the serialized data.
+    """
+    name = 'redis'
+    value_format = 'json'
+
+    def __init__(self, url: str, prefix: Optional[str] = None, timeout: float = REDIS_TIMEOUT):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.strip('/') or 0)
+        self.prefix = prefix or os.getenv('FOOD_CACHE_PREFIX', 'food')
+        self.timeout = timeout
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    def _key(self, namespace: str, key: str) -> bytes:
+        return f"{self.prefix}:{namespace}:{key}".encode('utf-8')
+
+    def _connect(self):
+        """Open and authenticate a connection; it becomes this thread's only once the handshake succeeded."""
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        connection = (sock, sock.makefile('rb'))
+        try:
+            if self.password:
+                self._send(connection, b'AUTH', self.password.encode('utf-8'))
+            if self.db:
+                self._send(connection, b'SELECT', str(self.db).encode())
+        except BaseException as e:
+            connection[1].close()
+            sock.close()
+            if isinstance(e, CacheBackendError):
+                # A refused AUTH/SELECT will not get better on retry: back off like a network error
+                raise ConnectionError(f"handshake failed: {str(e)}") from e
+            raise
+        self._local.connection = connection
+        return connection
+
+    def _close(self) -> None:
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection is not None:
+            connection[1].close()
+            connection[0].close()
+
+    def _read(self, reader) -> Any:
+        line = reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError('connection closed by the server')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload
+        if kind == b'-':
+            raise CacheBackendError(payload.decode('utf-8', 'replace'))
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError('connection closed by the server')
+            return data[:-2]
+        if kind == b'*':
+            count = int(payload)
+            return None if count < 0 else [self._read(reader) for _ in range(count)]
+        raise CacheBackendError(f"unexpected reply from Redis: {line[:20]!r}")
+
+    def _send(self, connection, *args: bytes) -> Any:
+        sock, reader = connection
+        command = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            command.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        sock.sendall(b''.join(command))
+        return self._read(reader)
+
+    def _call(self, *args: bytes) -> Any:
+        return self._send(getattr(self._local, 'connection', None) or self._connect(), *args)
+
+    def command(self, *args: bytes) -> Any:
+        """Run one command; reconnects on the next call after a network error."""
+        if time.monotonic() < self._down_until:
+            raise CacheBackendError(f"Redis at {self.host}:{self.port} unavailable, retrying shortly")
+        try:
+            return self._call(*args)
+        except (OSError, ConnectionError, ValueError) as e:
+            self._close()
+            self._down_until = time.monotonic() + REDIS_RETRY_AFTER
+            raise CacheBackendError(f"Redis at {self.host}:{self.port}: {str(e)}") from e
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[bytes, float]]:
+        value = self.command(b'GET', self._key(namespace, key))
+        if value is None or len(value) < 8:
+            return None
+        return value[8:], struct.unpack('>d', value[:8])[0]
+
+    def set(self, namespace: str, key: str, data: bytes, stored_at: float, expire: Optional[float] = None) -> None:
+        args = [b'SET', self._key(namespace, key), struct.pack('>d', stored_at) + data]
+        if expire is not None and expire != float('inf'):
+            # Backdated entries (stored_at in the past) expire correspondingly earlier
+            remaining = stored_at + expire - time.time()
+            if remaining <= 0:
+                return
+            args += [b'PX', str(int(remaining * 1000)).encode()]
+        self.command(*args)
+
+    def scan(self, namespace: str, since: float) -> Iterator[Tuple[str, bytes]]:
+        prefix = self._key(namespace, '')
+        pattern = b''.join(b'\\' + bytes([byte]) if byte in b'*?[]\\' else bytes([byte]) for byte in prefix) + b'*'
+        cursor = b'0'
+        found: List[Tuple[str, bytes]] = []
+        while True:
+            cursor, keys = self.command(b'SCAN', cursor, b'MATCH', pattern, b'COUNT', str(REDIS_SCAN_COUNT).encode())
+            if keys:
+                for key, value in zip(keys, self.command(b'MGET', *keys)):
+                    if value is not None and len(value) >= 8 and struct.unpack('>d', value[:8])[0] >= since:
+                        found.append((key[len(prefix):].decode('utf-8'), value[8:]))
+            if cursor == b'0':
+                return iter(found)
+
+_backends: Dict[Tuple[str, str], CacheBackend] = {}
+_backends_lock = threading.Lock()
+
+def get_backend(path: str, spec: Optional[str] = None) -> CacheBackend:
+    """The shared backend for spec (default $FOOD_CACHE_BACKEND) and the SQLite path."""
+    spec = (spec or os.getenv('FOOD_CACHE_BACKEND') or 'sqlite').strip()
+    cache_key = (spec, path if spec == 'sqlite' else '')
+    with _backends_lock:
+        backend = _backends.get(cache_key)
+        if backend is None:
+            if spec == 'sqlite':
+                backend = SQLiteBackend(path)
+            elif spec == 'lru':
+                backend = LRUBackend(int(os.getenv('FOOD_CACHE_LRU_SIZE', DEFAULT_LRU_SIZE)))
+            elif spec.startswith(('redis://', 'resp://')):
+                backend = RedisBackend(spec)
+            else:
+                raise ValueError(f"unknown FOOD_CACHE_BACKEND: {spec}")
+            _backends[cache_key] = backend
+        return backend
@@ -0,0 +1,172 @@
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional
+
+import patterns
+
+# Single-pass parser for the emoji-formatted recommendation cards the LLM
+# returns. A small state machine consumes one line at a time, so the whole
+# response is parsed in linear time, duplicate lines are harmless, and the same
+# parser can be fed a streaming token feed chunk by chunk.
+#
+#   🏪 Restaurant Name
+#   📍 Location
+#   🔗 Source Link
+#   💰 Total Cost: ₹X (₹Y per person)
+#   🍽️ Recommended Combination:
+#      - Item 1: ₹X
+#   ✨ Why This Combo: ...
+#   🎁 Special Offers: ...
+#   ---
+
+CARD_SEPARATOR = '---'
+
+def parse_amount(text: str) -> Optional[float]:
+    """Parse '1,800' / '900.50' into a float."""
+    try:
+        return float(text.replace(',', ''))
+    except ValueError:
+        return None
+
+@dataclass(slots=True)
+class Card:
+    """One parsed recommendation, with the cost already converted to numbers."""
+    restaurant: str = ''
+    location: str = ''
+    source_link: str = ''
+    cost_text: str = ''
+    total_cost: Optional[float] = None
+    per_person_cost: Optional[float] = None
+    menu_items: List[str] = field(default_factory=list)
+    why: str = ''
+    special_offers: str = ''
+
+    @property
+    def display_cost(self) -> str:
+        """Cost line without the prompt's budget reminder (' - MUST BE <= ₹X')."""
+        return self.cost_text.split(" - MUST BE")[0].strip()
+
+    def total_for(self, num_people: int = 1) -> Optional[float]:
+        """Total cost, derived from the per-person cost when only that was given."""
+        if self.total_cost is not None:
+            return self.total_cost
+        if self.per_person_cost is not None:
+            return self.per_person_cost * num_people
+        return None
+
+    def within_budget(self, budget: float, num_people: int = 1) -> bool:
+        total = self.total_for(num_people)
+        return total is not None and total <= budget
+
+def parse_cost(cost_text: str):
+    """Return (total, per_person) from a cost line like 'Total Cost: ₹1,800 (₹900 per person)'."""
+    total = per_person = None
+    match = patterns.RUPEE_AMOUNT.search(cost_text)
+    if match:
+        total = parse_amount(match.group(1))
+    match = patterns.PER_PERSON_AMOUNT.search(cost_text)
+    if match:
+        per_person = parse_amount(match.group(1))
+        # "₹900 per person" alone is not a total
+        if total == per_person and len(patterns.RUPEE_AMOUNT.findall(cost_text)) == 1:
+            total = None
+    return total, per_person
+
+class CardParser:
+    """
+    Incremental card parser.
+
+    feed() accepts arbitrary text chunks (e.g. streamed tokens) and returns the
+    cards completed so far; close() flushes the last partial line and card.
+    """
+
+    # Line prefix -> Card attribute. The menu marker is matched without its
+    # variation selector so '🍽' and '🍽️' both work.
+    _FIELDS = (
+        ('🏪', 'restaurant'),
+        ('📍', 'location'),
+        ('🔗', 'source_link'),
+        ('💰', 'cost_text'),
+        ('✨', 'why'),
+        ('🎁', 'special_offers'),
+    )
+    _MENU_MARKER = '🍽'
+
+    def __init__(self):
+        self._pending = ''
+        self._card = Card()
+        self._has_content = False
+        self._in_menu = False
+
+    def feed(self, chunk: str) -> List[Card]:
+        self._pending += chunk
+        if '\n' not in self._pending:
+            return []
+        *lines, self._pending = self._pending.split('\n')
+        cards = []
+        for line in lines:
+            card = self._consume(line)
+            if card is not None:
+                cards.append(card)
+        return cards
+
+    def close(self) -> List[Card]:
+        cards = []
+        if self._pending:
+            card = self._consume(self._pending)
+            self._pending = ''
+            if card is not None:
+                cards.append(card)
+        card = self._finish()
+        if card is not None:
+            cards.append(card)
+        return cards
+
+    def _finish(self) -> Optional[Card]:
+        card = self._card if self._has_content else None
+        self._card = Card()
+        self._has_content = False
+        self._in_menu = False
+        return card
+
+    def _consume(self, line: str) -> Optional[Card]:
+        """Process one line; return a card if this line completed one."""
+        stripped = line.strip()
+        if stripped.startswith(CARD_SEPARATOR):
+            return self._finish()
+        if not stripped:
+            self._in_menu = False
+            return None
+
+        completed = None
+        if self._in_menu:
+            if stripped.startswith('-'):
+                self._card.menu_items.append(stripped)
+                return None
+            self._in_menu = False
+
+        if stripped.startswith(self._MENU_MARKER):
+            self._in_menu = True
+        else:
+            for prefix, attribute in self._FIELDS:
+                if stripped.startswith(prefix):
+                    # A second restaurant line without a separator starts a new card
+                    if attribute == 'restaurant' and self._card.restaurant:
+                        completed = self._finish()
+                    value = stripped[len(prefix):].strip()
+                    setattr(self._card, attribute, value)
+                    if attribute == 'cost_text':
+                        self._card.total_cost, self._card.per_person_cost = parse_cost(value)
+                    break
+        self._has_content = True
+        return completed
+
+def iter_cards(chunks: Iterable[str]) -> Iterator[Card]:
+    """Yield cards as soon as they are complete from a stream of text chunks."""
+    parser = CardParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+def parse_cards(text: str) -> List[Card]:
+    """Parse a complete LLM response into cards."""
+    return list(iter_cards([text]))
@@ -0,0 +1,163 @@
+import hashlib
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Canonical URL normalization and near-duplicate collapsing for search items.
+# Runs on the raw Custom Search items before any filtering or scraping, so the
+# same restaurant reached through tracking links, m./www. hosts or a different
+# aggregator sub-page is only fetched (and put into the prompt) once.
+
+# Query parameters that never change the page content
+TRACKING_PARAMS = {
+    'gclid', 'dclid', 'fbclid', 'msclkid', 'yclid', 'igshid', 'srsltid',
+    'ref', 'ref_src', 'referrer', 'source', 'src', 'mc_cid', 'mc_eid', '_ga', '_gl',
+    'amp', 'share', 'si',
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'hsa_')
+
+# Host prefixes that serve the same content as the bare domain
+HOST_ALIAS_PREFIXES = ('www.', 'm.', 'mobile.', 'amp.')
+
+# Aggregator listing sub-pages: zomato.com/bangalore/<slug>/order and
+# zomato.com/bangalore/<slug>/reviews are the same restaurant.
+AGGREGATOR_HOSTS = {'zomato.com', 'swiggy.com', 'dineout.co.in', 'magicpin.in', 'eazydiner.com'}
+LISTING_SUBPAGES = {'order', 'menu', 'info', 'reviews', 'photos', 'book', 'overview', 'gallery', 'events'}
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalize a URL to a canonical identity key.
+
+    Lowercases scheme/host, folds http->https, strips www./m. style host aliases,
+    default ports, fragments, tracking parameters, trailing slashes and known
+    aggregator sub-pages, and sorts the remaining query parameters.
+    The result is for comparison only; keep fetching the original link.
+    """
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url.strip()
+    scheme = parts.scheme.lower()
+    if scheme == 'http':
+        scheme = 'https'
+
+    host = (parts.hostname or '').lower()
+    for prefix in HOST_ALIAS_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port not in (80, 443):
+        host = f"{host}:{port}"
+
+    path = re.sub(r'/{2,}', '/', parts.path)
+    if host in AGGREGATOR_HOSTS:
+        segments = [segment for segment in path.split('/') if segment]
+        while len(segments) > 2 and segments[-1].lower() in LISTING_SUBPAGES:
+            segments.pop()
+        path = '/' + '/'.join(segments)
+    path = path.rstrip('/') or '/'
+
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ]
+    query.sort()
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+def _features(text: str, shingle_size: int = 2) -> List[str]:
+    tokens = _TOKEN.findall(text.lower())
+    if len(tokens) < shingle_size:
+        return tokens
+    return [' '.join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)]
+
+def simhash(text: str, bits: int = 64) -> int:
+    """64-bit SimHash over word 2-shingles (stable across processes, unlike hash())."""
+    weights = [0] * bits
+    for feature in _features(text):
+        value = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=bits // 8).digest(), 'big')
+        for bit in range(bits):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+class NearDuplicateIndex:
+    """
+    SimHash index answering "is there a fingerprint within max_distance bits?".
+
+    Fingerprints are split into max_distance + 1 bands; by pigeonhole two
+    fingerprints within max_distance bits share at least one band exactly, so
+    only items in matching band buckets are compared.
+    """
+
+    def __init__(self, max_distance: int = 3, bits: int = 64):
+        self.max_distance = max_distance
+        self.bits = bits
+        self.band_count = max_distance + 1
+        self.band_width = -(-bits // self.band_count)
+        self._buckets: Dict[Tuple[int, int], List[int]] = {}
+
+    def _bands(self, fingerprint: int) -> Iterable[Tuple[int, int]]:
+        mask = (1 << self.band_width) - 1
+        for band in range(self.band_count):
+            yield band, fingerprint >> (band * self.band_width) & mask
+
+    def find(self, fingerprint: int) -> Optional[int]:
+        for key in self._bands(fingerprint):
+            for other in self._buckets.get(key, ()):
+                if hamming_distance(fingerprint, other) <= self.max_distance:
+                    return other
+        return None
+
+    def add(self, fingerprint: int) -> None:
+        for key in self._bands(fingerprint):
+            self._buckets.setdefault(key, []).append(fingerprint)
+
+def collapse_duplicates(items: List[Dict[str, Any]], max_distance: int = 3,
+                        text_of: Optional[Callable[[Dict[str, Any]], str]] = None) -> Tuple[List[Dict[str, Any]], List[Tuple[Dict[str, Any], str]]]:
+    """
+    Collapse exact (canonical URL) and near (SimHash of title+snippet) duplicates.
+
+    Keeps the first occurrence, i.e. the best ranked one. Items without a link are dropped.
+
+    Args:
+        items: Raw Custom Search items (dicts with 'link', 'title', 'snippet').
+        max_distance (int): Maximum Hamming distance between fingerprints to count as a near duplicate.
+        text_of: Optional function returning the text to fingerprint (default: title + snippet).
+
+    Returns:
+        Tuple of (kept items, [(dropped item, reason)]).
+    """
+    if text_of is None:
+        text_of = lambda item: f"{item.get('title', '')} {item.get('snippet', '')}"
+    seen_urls = set()
+    index = NearDuplicateIndex(max_distance=max_distance)
+    kept, dropped = [], []
+    for item in items:
+        link = item.get('link', '')
+        if not link:
+            continue
+        canonical = canonicalize_url(link)
+        if canonical in seen_urls:
+            dropped.append((item, f"duplicate url {canonical}"))
+            continue
+        fingerprint = simhash(text_of(item))
+        if fingerprint and index.find(fingerprint) is not None:
+            dropped.append((item, "near-duplicate title/snippet"))
+            continue
+        seen_urls.add(canonical)
+        if fingerprint:
+            index.add(fingerprint)
+        kept.append(item)
+    return kept, dropped
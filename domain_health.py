@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from metrics import METRICS
+
+# Per-domain latency/error tracking for the scraper, with adaptive timeouts and
+# a circuit breaker.
+#
+# Timeouts follow the TCP retransmission-timeout recipe: an EWMA of response
+# time (srtt) and of its deviation (rttvar) give read timeout = srtt + 4*rttvar,
+# clamped to [MIN_READ_TIMEOUT, MAX_READ_TIMEOUT]. Unknown domains get the old
+# flat 15 s. A timeout feeds the timeout value itself back as a sample.
+#
+# The breaker opens after FAILURE_THRESHOLD consecutive failures (timeouts,
+# connection errors, 403/429/5xx). While open, scrapes of that domain are
+# skipped (the caller falls back to the search snippet). After the cooldown,
+# one trial request is let through (half-open): success closes the breaker,
+# failure re-opens it with a doubled cooldown (up to MAX_COOLDOWN).
+
+MAX_READ_TIMEOUT = float(os.getenv('SCRAPE_MAX_TIMEOUT', 15))
+MIN_READ_TIMEOUT = 3.0
+CONNECT_TIMEOUT = 5.0
+MIN_CONNECT_TIMEOUT = 2.0
+EWMA_ALPHA = 0.25  # weight of a new latency sample
+EWMA_BETA = 0.25  # weight of a new deviation sample
+FAILURE_THRESHOLD = 3
+BASE_COOLDOWN = 60.0
+MAX_COOLDOWN = 600.0
+
+class CircuitOpen(Exception):
+    """Scraping was skipped because the domain's circuit breaker is open."""
+
+def domain_of(url: str) -> str:
+    host = (urlparse(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+@dataclass
+class DomainStats:
+    srtt: Optional[float] = None  # smoothed response time, seconds
+    rttvar: float = 0.0  # smoothed deviation, seconds
+    requests: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    consecutive_failures: int = 0
+    state: str = 'closed'  # 'closed', 'open' or 'half_open'
+    opened_at: float = 0.0
+    cooldown: float = BASE_COOLDOWN
+    skipped: int = 0
+
+    def timeouts_for(self) -> Tuple[float, float]:
+        """(connect, read) timeouts derived from the latency statistics."""
+        if self.srtt is None:
+            return CONNECT_TIMEOUT, MAX_READ_TIMEOUT
+        read = min(MAX_READ_TIMEOUT, max(MIN_READ_TIMEOUT, self.srtt + 4 * self.rttvar))
+        connect = min(CONNECT_TIMEOUT, max(MIN_CONNECT_TIMEOUT, read / 2))
+        return connect, read
+
+    def observe(self, seconds: float) -> None:
+        if self.srtt is None:
+            self.srtt, self.rttvar = seconds, seconds / 2
+        else:
+            self.rttvar = (1 - EWMA_BETA) * self.rttvar + EWMA_BETA * abs(self.srtt - seconds)
+            self.srtt = (1 - EWMA_ALPHA) * self.srtt + EWMA_ALPHA * seconds
+
+class DomainHealth:
+    """Thread-safe registry of DomainStats keyed by domain."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._domains: Dict[str, DomainStats] = {}
+
+    def _stats(self, domain: str) -> DomainStats:
+        stats = self._domains.get(domain)
+        if stats is None:
+            stats = self._domains[domain] = DomainStats()
+        return stats
+
+    def before_request(self, url: str) -> Tuple[float, float]:
+        """
+        Admit a request to url's domain and return its (connect, read) timeouts.
+
+        Raises:
+            CircuitOpen: If the domain's breaker is open (or a half-open trial is already running).
+        """
+        domain = domain_of(url)
+        with self._lock:
+            stats = self._stats(domain)
+            if stats.state != 'closed':
+                if stats.state == 'open' and time.time() - stats.opened_at >= stats.cooldown:
+                    stats.state = 'half_open'  # this caller is the trial request
+                    METRICS.incr('breaker.half_open')
+                else:
+                    stats.skipped += 1
+                    METRICS.incr('breaker.skipped')
+                    raise CircuitOpen(f"circuit open for {domain} ({stats.consecutive_failures} consecutive failures)")
+            stats.requests += 1
+            return stats.timeouts_for()
+
+    def record_success(self, url: str, seconds: float) -> None:
+        with self._lock:
+            stats = self._stats(domain_of(url))
+            stats.observe(seconds)
+            stats.consecutive_failures = 0
+            if stats.state != 'closed':
+                METRICS.incr('breaker.closed')
+            stats.state = 'closed'
+            stats.cooldown = BASE_COOLDOWN
+
+    def record_failure(self, url: str, seconds: float, timed_out: bool = False) -> None:
+        domain = domain_of(url)
+        with self._lock:
+            stats = self._stats(domain)
+            stats.observe(seconds)
+            stats.failures += 1
+            stats.timeouts += int(timed_out)
+            stats.consecutive_failures += 1
+            if stats.state == 'half_open':
+                stats.cooldown = min(MAX_COOLDOWN, stats.cooldown * 2)
+            if stats.state == 'half_open' or stats.consecutive_failures >= FAILURE_THRESHOLD:
+                if stats.state != 'open':
+                    METRICS.incr('breaker.opened')
+                    print(f"Circuit breaker open for {domain} for {stats.cooldown:.0f}s")
+                stats.state = 'open'
+                stats.opened_at = time.time()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Per-domain stats and breaker state, JSON-serializable."""
+        with self._lock:
+            return {domain: dict(asdict(stats), timeouts_now=stats.timeouts_for())
+                    for domain, stats in self._domains.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._domains.clear()
+
+DOMAIN_HEALTH = DomainHealth()
@@ -2,8 +2,12 @@ import streamlit as st
 import os
 import requests
 import json
-from google_search import perform_google_search
 import google_search
+import pipeline
+from card_parser import parse_cards
+from profiling import profile_request, requested_mode
+from query_log import log_query
+from structured_output import json_mode_enabled, parse_recommendations
 import importlib.metadata
 
 # Add debug log for library version using importlib.metadata
@@ -146,119 +150,38 @@ st.markdown("""
         color: #FF4B4B;
         font-weight: 600;
     }
+    .card-footer {
+        margin-top: 0.75rem;
+        color: #888;
+        font-size: 0.85rem;
+    }
 </style>
 """, unsafe_allow_html=True)
 
 def get_food_recommendations(food_type: str, budget: float, num_people: int, 
-                           restaurant: str = None, location: str = None) -> str:
-    """Generate food recommendations using Together AI (via requests) and Google Search."""
-    try:
-        # Get search results
-        search_query = f"Best {food_type} {location or 'Bangalore'}"
-        search_results = perform_google_search(search_query, num_results=5)
-        
-        # Format search results
-        search_info = "\nSearch Results:\n"
-        for result in search_results:
-            search_info += f"\nTitle: {result['title']}\n"
-            search_info += f"Link: {result['link']}\n"
-            search_info += f"Snippet: {result['snippet']}\n"
-            if 'name' in result:
-                search_info += f"Restaurant: {result['name']}\n"
-            if 'cuisine' in result:
-                search_info += f"Cuisine: {result['cuisine']}\n"
-            if 'price_range' in result:
-                search_info += f"Price Range: {result['price_range']}\n"
-            if 'specialties' in result:
-                search_info += f"Specialties: {result['specialties']}\n"
-            search_info += "-" * 50 + "\n"
-
-        # Create prompt for Together AI
-        prompt = f"""You are a food recommendation expert. Your task is to suggest the best food combinations that fit within the user's budget.
-
-CORE REQUIREMENTS:
-1. Focus on suggesting food combinations that:
-   - Match the user's food type preference
-   - Stay within the specified budget of ₹{budget} for {num_people} people
-   - Are available at restaurants in the specified location
-
-2. For each recommendation, calculate and show:
-   - Total cost for the combination
-   - Cost per person
-   - Whether it fits within the budget
-
-3. Prioritize restaurants that:
-   - Have clear pricing information
-   - Offer good value for money
-   - Have confirmed menu items and prices
-
-User Criteria:
-- Food Type: {food_type}
-- Budget: ₹{budget} for {num_people} people
-- Location: {location or 'Bangalore'}
-- Specific Restaurant: {restaurant if restaurant else 'Any'}
-
-Search Results:
-{search_info}
-
-For each recommended combination, provide in this exact format:
-🏪 Restaurant Name
-📍 Location
-💰 Total Cost: ₹X (₹Y per person)
-🍽️ Recommended Combination:
-   - Item 1: ₹X
-   - Item 2: ₹Y
-   - Item 3: ₹Z
-   Total: ₹T
-✨ Why This Combo: (explain why this combination is good value)
-🎁 Special Offers: (if any)
-
-Separate each recommendation with "---"."""
-
-        # ---- Using requests library for Together AI API call ----
-        url = "https://api.together.xyz/v1/completions"
-
-        payload = {
-            "model": "mistralai/Mixtral-8x7B-Instruct-v0.1",
-            "prompt": prompt,
-            "max_tokens": 1024,
-            "temperature": 0.7,
-            # Add other parameters if needed, e.g., "stop": ["---"]
-        }
+                           restaurant: str = None, location: str = None, json_mode: bool = False) -> pipeline.Served:
+    """Generate food recommendations using Together AI (via requests) and Google Search.
 
-        # Get API key securely
-        together_api_key = api_keys.get("TOGETHER_API_KEY")
-        if not together_api_key:
-            st.error("TOGETHER_API_KEY not found in secrets or environment variables.")
-            return "Error: TOGETHER_API_KEY is missing."
-
-        headers = {
-            "accept": "application/json",
-            "content-type": "application/json",
-            "Authorization": f"Bearer {together_api_key}" # Use securely fetched key
-        }
-
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-
-        response_data = response.json()
-        
-        if response_data and 'choices' in response_data and response_data['choices']:
-            recommendation_text = response_data['choices'][0].get('text', '').strip()
-            if not recommendation_text:
-                return "Error: Could not extract text from API response."
-        else:
-            return "Error: Unexpected response format from Together AI."
-
-        return recommendation_text
-        # ---- End of requests library usage ----
-        
+    With json_mode the model returns compact JSON (see structured_output.py) instead of emoji cards.
+    The engine itself lives in pipeline.py so it can run without Streamlit. A recent answer to the
+    same request is served from cache (stale ones are refreshed in the background).
+    """
+    try:
+        # The cache key buckets the budget (query_canon.recommendation_key); the prompt gets the real one
+        request = {'app': 'food_app', 'food_type': food_type, 'budget': budget, 'num_people': num_people,
+                   'restaurant': restaurant, 'location': location, 'json_mode': json_mode}
+        return pipeline.serve_recommendation(request, lambda: pipeline.recommend(
+            food_type, budget, num_people, restaurant, location,
+            json_mode=json_mode, api_key=api_keys.get("TOGETHER_API_KEY")))
+    except pipeline.PipelineError as e:
+        st.error(str(e))
+        return pipeline.Served(f"Error: {str(e)}", error=True)
     except requests.exceptions.RequestException as e:
         st.error(f"Error making API request to Together AI: {str(e)}")
-        return f"An error occurred while contacting Together AI: {str(e)}"
+        return pipeline.Served(f"An error occurred while contacting Together AI: {str(e)}", error=True)
     except Exception as e:
         st.error(f"Error in get_food_recommendations: {str(e)}")
-        return f"An error occurred: {str(e)}"
+        return pipeline.Served(f"An error occurred: {str(e)}", error=True)
 
 # Streamlit UI
 st.title("🍜 Bangalore Food Finder")
@@ -280,64 +203,48 @@ with st.form("food_finder"):
 
 if submit:
     with st.spinner("Finding the best food options..."):
-        recommendations = get_food_recommendations(food_type, budget, num_people, restaurant, location)
-        
-        # Split recommendations into cards
-        rec_cards = recommendations.split('---')
+        json_mode = json_mode_enabled()
+        log_query(app="food_app", food_type=food_type, budget=budget, num_people=num_people, location=location,
+                  restaurant=restaurant, query=f"Best {food_type} {location or 'Bangalore'}", json_mode=json_mode)
+        # ?profile=sample|cprofile (with FOOD_PROFILE_PARAM=1) or FOOD_PROFILE profiles this request
+        label = f"food_app: {food_type} {location or 'Bangalore'}"
+        with profile_request(label, requested_mode(st.query_params.get('profile'), label)) as profile:
+            served = get_food_recommendations(food_type, budget, num_people, restaurant, location, json_mode=json_mode)
+        if profile is not None and profile.report:
+            st.caption(f"Profile {profile.id} written to {os.path.dirname(profile.report['files'][0])}")
+        recommendations = served.text
+        footer = served.footer()
         
-        # Create a table to display recommendations
-        table_data = []
-        for card in rec_cards:
-            if card.strip():
-                # Parse the card content
-                lines = card.strip().split('\n')
-                data = {
-                    'Restaurant': '',
-                    'Location': '',
-                    'Total Cost': '',
-                    'Menu Items': [],
-                    'Why Recommended': '',
-                    'Special Offers': ''
-                }
-                
-                for line in lines:
-                    if line.startswith('🏪'):
-                        data['Restaurant'] = line.replace('🏪', '').strip()
-                    elif line.startswith('📍'):
-                        data['Location'] = line.replace('📍', '').strip()
-                    elif line.startswith('💰'):
-                        data['Total Cost'] = line.replace('💰', '').strip()
-                    elif line.startswith('🍽️'):
-                        menu_items = []
-                        for item in lines[lines.index(line)+1:]:
-                            if item.strip().startswith('-'):
-                                menu_items.append(item.strip())
-                            elif not item.strip().startswith('✨'):
-                                break
-                        data['Menu Items'] = menu_items
-                    elif line.startswith('✨'):
-                        data['Why Recommended'] = line.replace('✨', '').strip()
-                    elif line.startswith('🎁'):
-                        data['Special Offers'] = line.replace('🎁', '').strip()
-                
-                table_data.append(data)
+        # Parse recommendations into cards (single pass, see card_parser.py / structured_output.py)
+        if served.error:
+            # Already reported with st.error; there are no cards to parse
+            table_data = []
+        elif json_mode:
+            table_data, problems = parse_recommendations(recommendations, budget, num_people)
+            for problem in problems:
+                print(f"Structured output: {problem}")
+        else:
+            table_data = parse_cards(recommendations)
+        # A cached answer may have been written for another budget in the same bucket (query_canon.py)
+        table_data = [card for card in table_data if card.within_budget(budget, num_people)]
         
         # Display recommendations in a table
         if table_data:
             st.markdown("### Recommended Food Combinations")
-            for data in table_data:
+            for card in table_data:
                 st.markdown(f"""
                     <div class="recommendation-card">
-                        <div class="restaurant-name">{data['Restaurant']}</div>
-                        <div>📍 {data['Location']}</div>
-                        <div class="price-range">💰 {data['Total Cost']}</div>
+                        <div class="restaurant-name">{card.restaurant}</div>
+                        <div>📍 {card.location}</div>
+                        <div class="price-range">💰 {card.cost_text}</div>
                         <div>🍽️ Menu Items:</div>
-                        {"".join([f'<div class="menu-item">{item}</div>' for item in data['Menu Items']])}
-                        <div>✨ {data['Why Recommended']}</div>
-                        {f'<div class="special-offer">🎁 {data["Special Offers"]}</div>' if data['Special Offers'] else ''}
+                        {"".join([f'<div class="menu-item">{item}</div>' for item in card.menu_items])}
+                        <div>✨ {card.why}</div>
+                        {f'<div class="special-offer">🎁 {card.special_offers}</div>' if card.special_offers else ''}
+                        {f'<div class="card-footer">{footer}</div>' if footer else ''}
                     </div>
                 """, unsafe_allow_html=True)
-        else:
+        elif not served.error:
             st.warning("No recommendations found matching your criteria. Please try a different search or location.")
         
         st.markdown("---")
@@ -2,10 +2,14 @@ import streamlit as st
 import os
 import requests
 import json
-from google_search import perform_google_search
 import google_search
 import importlib.metadata
 import re
+import pipeline
+from card_parser import parse_cards
+from profiling import profile_request, requested_mode
+from query_log import log_query
+from structured_output import json_format_instructions, json_mode_enabled, parse_recommendations
 
 # Add debug log for library version using importlib.metadata
 # st.write(f"DEBUG: Together library version: {importlib.metadata.version('together')}") # Commented out
@@ -147,35 +151,25 @@ st.markdown("""
         color: #FF4B4B;
         font-weight: 600;
     }
+    .card-footer {
+        margin-top: 0.75rem;
+        color: #888;
+        font-size: 0.85rem;
+    }
 </style>
 """, unsafe_allow_html=True)
 
-def get_food_recommendations(food_query: str, budget: float, num_people: int, 
-                           restaurant: str = None) -> str:
-    """Generate food recommendations using a specific food query, Together AI, and Google Search."""
-    try:
-        # Perform Google search using the provided query - fetch more results
-        st.write(f"DEBUG: Performing Google search for: {food_query}") # Debug log
-        search_results = perform_google_search(food_query, num_results=10) # Increased to 10 results
-        
-        # Format search results
-        search_info = "\nSearch Results:\n"
-        for result in search_results:
-            search_info += f"\nTitle: {result['title']}\n"
-            search_info += f"Link: {result['link']}\n"
-            search_info += f"Snippet: {result['snippet']}\n"
-            if 'name' in result:
-                search_info += f"Restaurant: {result['name']}\n"
-            if 'cuisine' in result:
-                search_info += f"Cuisine: {result['cuisine']}\n"
-            if 'price_range' in result:
-                search_info += f"Price Range: {result['price_range']}\n"
-            if 'specialties' in result:
-                search_info += f"Specialties: {result['specialties']}\n"
-            search_info += "-" * 50 + "\n"
-
-        # Create prompt for Together AI
-        prompt = f"""You are a food recommendation expert. Your task is to suggest the best food combinations that fit strictly within the user's budget, based *only* on the provided web search results.
+def _compute_recommendations(food_query: str, budget: float, num_people: int, restaurant: str = None,
+                             json_mode: bool = False, location: str = None) -> str:
+    """Search (or resolve the restaurant locally), build the prompt and call the LLM; raises on failure."""
+    if restaurant and restaurant.strip():
+        # Known restaurants resolve to cached menu data (fuzzy name index); the web search is the fallback
+        search_results, search_info = pipeline.search_restaurant(restaurant.strip(), location, food_query, num_results=10)
+    else:
+        search_results, search_info = pipeline.search(food_query, num_results=10) # Increased to 10 results
+    
+    # Create prompt for Together AI
+    prompt = f"""You are a food recommendation expert. Your task is to suggest the best food combinations that fit strictly within the user's budget, based *only* on the provided web search results.
 
 **CRITICAL BUDGET INSTRUCTION:** You MUST ensure the 'Total Cost' for any recommended combination is LESS THAN OR EQUAL TO the user's budget of ₹{budget} for {num_people} people. If you cannot find combinations that meet the budget based *only* on the prices mentioned or strongly implied in the Search Results Provided, DO NOT suggest combinations that exceed the budget. Instead, clearly state that you couldn't find options within the budget based on the available information.
 
@@ -200,7 +194,11 @@ User Criteria:
 Search Results Provided:
 {search_info}
 
-For each recommended combination, provide in this exact format:
+"""
+    if json_mode:
+        prompt += json_format_instructions(budget, num_people)
+    else:
+        prompt += f"""For each recommended combination, provide in this exact format:
 🏪 Restaurant Name
 📍 Location (if identifiable from results)
 🔗 Source Link (if available)
@@ -216,50 +214,34 @@ For each recommended combination, provide in this exact format:
 Separate each recommendation with "---". If no combinations meet the budget, state that clearly.
 """
 
-        # ---- Using requests library for Together AI API call ----
-        url = "https://api.together.xyz/v1/completions"
+    # ---- Together AI call via the model router (tiers, timeouts, hedging; see llm_router.py) ----
+    return pipeline.complete(api_keys.get("TOGETHER_API_KEY"), pipeline.build_payload(prompt, json_mode), restaurant)
 
-        payload = {
-            "model": "mistralai/Mixtral-8x7B-Instruct-v0.1",
-            "prompt": prompt,
-            "max_tokens": 1024,
-            "temperature": 0.7,
-            # Add other parameters if needed, e.g., "stop": ["---"]
-        }
-
-        # Get API key securely
-        together_api_key = api_keys.get("TOGETHER_API_KEY")
-        if not together_api_key:
-            st.error("TOGETHER_API_KEY not found in secrets or environment variables.")
-            return "Error: TOGETHER_API_KEY is missing."
-
-        headers = {
-            "accept": "application/json",
-            "content-type": "application/json",
-            "Authorization": f"Bearer {together_api_key}" # Use securely fetched key
-        }
-
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+def get_food_recommendations(food_query: str, budget: float, num_people: int, 
+                           restaurant: str = None, json_mode: bool = False, location: str = None) -> pipeline.Served:
+    """Generate food recommendations using a specific food query, Together AI, and Google Search.
 
-        response_data = response.json()
-        
-        if response_data and 'choices' in response_data and response_data['choices']:
-            recommendation_text = response_data['choices'][0].get('text', '').strip()
-            if not recommendation_text:
-                return "Error: Could not extract text from API response."
-        else:
-            return "Error: Unexpected response format from Together AI."
+    With json_mode the model returns compact JSON (see structured_output.py) instead of emoji cards.
+    A recent answer to the same request is served from cache (stale ones are refreshed in the background).
+    """
+    try:
+        # Perform Google search using the provided query - fetch more results
+        st.write(f"DEBUG: Performing Google search for: {food_query}") # Debug log
+        # The cache key buckets the budget (query_canon.recommendation_key); the prompt gets the real one
+        request = {'app': 'food_app_ss', 'query': food_query, 'budget': budget, 'num_people': num_people,
+                   'restaurant': restaurant, 'location': location, 'json_mode': json_mode}
+        return pipeline.serve_recommendation(request, lambda: _compute_recommendations(
+            food_query, budget, num_people, restaurant, json_mode, location), num_results=10)
 
-        return recommendation_text
-        # ---- End of requests library usage ----
-        
+    except pipeline.PipelineError as e:
+        st.error(str(e))
+        return pipeline.Served(f"Error: {str(e)}", error=True)
     except requests.exceptions.RequestException as e:
         st.error(f"Error making API request to Together AI: {str(e)}")
-        return f"An error occurred while contacting Together AI: {str(e)}"
+        return pipeline.Served(f"An error occurred while contacting Together AI: {str(e)}", error=True)
     except Exception as e:
         st.error(f"Error in get_food_recommendations: {str(e)}")
-        return f"An error occurred: {str(e)}"
+        return pipeline.Served(f"An error occurred: {str(e)}", error=True)
 
 # Streamlit UI
 st.title("🍜 Bangalore Food Finder (Broad Search)") # Updated Title
@@ -306,93 +288,61 @@ if submit:
     st.info(display_message)
     
     with st.spinner("Finding the best food options from web search..."):
-        recommendations = get_food_recommendations(
-            food_query=google_query, # Pass the broad Google query
-            budget=budget, 
-            num_people=num_people, 
-            restaurant=restaurant # Still pass restaurant for the AI prompt context
-        )
+        json_mode = json_mode_enabled()
+        log_query(app="food_app_ss", food_type=food_type, budget=budget, num_people=num_people, location=location,
+                  restaurant=restaurant, query=google_query, json_mode=json_mode)
+        # ?profile=sample|cprofile (with FOOD_PROFILE_PARAM=1) or FOOD_PROFILE profiles this request
+        label = f"food_app_ss: {google_query}"
+        with profile_request(label, requested_mode(st.query_params.get('profile'), label)) as profile:
+            served = get_food_recommendations(
+                food_query=google_query, # Pass the broad Google query
+                budget=budget, 
+                num_people=num_people, 
+                restaurant=restaurant, # Still pass restaurant for the AI prompt context
+                json_mode=json_mode,
+                location=search_location
+            )
+        if profile is not None and profile.report:
+            st.caption(f"Profile {profile.id} written to {os.path.dirname(profile.report['files'][0])}")
+        recommendations = served.text
+        footer = served.footer()
         
-        # Split recommendations into cards
-        rec_cards = recommendations.split('---')
-        
-        # Create a table to display recommendations
-        unfiltered_table_data = []
-        for card in rec_cards:
-            if card.strip():
-                # Parse the card content
-                lines = card.strip().split('\n')
-                data = {
-                    'Restaurant': '',
-                    'Location': '',
-                    'SourceLink': '',
-                    'Total Cost String': '', # Store raw string for display
-                    'Total Cost Value': float('inf'), # Store numeric value for filtering
-                    'Menu Items': [],
-                    'Why Recommended': '',
-                    'Special Offers': ''
-                }
-                
-                for line in lines:
-                    if line.startswith('🏪'):
-                        data['Restaurant'] = line.replace('🏪', '').strip()
-                    elif line.startswith('📍'):
-                        data['Location'] = line.replace('📍', '').strip()
-                    elif line.startswith('🔗'):
-                        data['SourceLink'] = line.replace('🔗', '').strip()
-                    elif line.startswith('💰'):
-                        cost_string = line.replace('💰', '').strip()
-                        data['Total Cost String'] = cost_string
-                        # Extract numeric value from cost string (e.g., "Total Cost: ₹1,800 (₹900 per person)")
-                        match = re.search(r'₹\s*([\d,]+(?:\.\d+)?)', cost_string)
-                        if match:
-                            try:
-                                cost_value = float(match.group(1).replace(',', ''))
-                                data['Total Cost Value'] = cost_value
-                            except ValueError:
-                                pass # Keep as infinity if conversion fails
-                    elif line.startswith('🍽️'):
-                        menu_items = []
-                        for item in lines[lines.index(line)+1:]:
-                            if item.strip().startswith('-'):
-                                menu_items.append(item.strip())
-                            elif not item.strip().startswith('✨'):
-                                break
-                        data['Menu Items'] = menu_items
-                    elif line.startswith('✨'):
-                        data['Why Recommended'] = line.replace('✨', '').strip()
-                    elif line.startswith('🎁'):
-                        data['Special Offers'] = line.replace('🎁', '').strip()
-                
-                unfiltered_table_data.append(data)
+        # Parse recommendations into cards (single pass, numeric costs, see card_parser.py)
+        if served.error:
+            # Already reported with st.error; there are no cards to parse
+            unfiltered_table_data = []
+        elif json_mode:
+            # Over-budget cards are already rejected here, before rendering
+            unfiltered_table_data, problems = parse_recommendations(recommendations, budget, num_people)
+            for problem in problems:
+                print(f"Structured output: {problem}")
+        else:
+            unfiltered_table_data = parse_cards(recommendations)
 
         # Filter recommendations based on budget
-        table_data = [data for data in unfiltered_table_data if data['Total Cost Value'] <= budget]
+        table_data = [card for card in unfiltered_table_data if card.within_budget(budget, num_people)]
 
         # Display recommendations in a table
         if table_data:
             st.markdown("### Recommended Food Combinations (Within Budget)") # Updated heading
-            for data in table_data:
+            for card in table_data:
                 # Construct optional link HTML
-                link_html = f'<div>🔗 <a href="{data["SourceLink"]}" target="_blank">Source Link</a></div>' if data.get("SourceLink") else ""
-                
-                # Clean the cost string for display
-                raw_cost_string = data['Total Cost String']
-                display_cost_string = raw_cost_string.split(" - MUST BE")[0].strip()
+                link_html = f'<div>🔗 <a href="{card.source_link}" target="_blank">Source Link</a></div>' if card.source_link else ""
                 
                 st.markdown(f"""
                     <div class="recommendation-card">
-                        <div class="restaurant-name">{data['Restaurant']}</div>
-                        <div>📍 {data['Location']}</div>
+                        <div class="restaurant-name">{card.restaurant}</div>
+                        <div>📍 {card.location}</div>
                         {link_html}
-                        <div class="price-range">💰 {display_cost_string}</div> # Display cleaned string
+                        <div class="price-range">💰 {card.display_cost}</div>
                         <div>🍽️ Menu Items:</div>
-                        {"".join([f'<div class="menu-item">{item}</div>' for item in data['Menu Items']])}
-                        <div>✨ {data['Why Recommended']}</div>
-                        {f'<div class="special-offer">🎁 {data["Special Offers"]}</div>' if data['Special Offers'] else ''}
+                        {"".join([f'<div class="menu-item">{item}</div>' for item in card.menu_items])}
+                        <div>✨ {card.why}</div>
+                        {f'<div class="special-offer">🎁 {card.special_offers}</div>' if card.special_offers else ''}
+                        {f'<div class="card-footer">{footer}</div>' if footer else ''}
                     </div>
                 """, unsafe_allow_html=True)
-        else:
+        elif not served.error:
             # Check if there were results that were filtered out
             if unfiltered_table_data: 
                  st.warning(f"Found some recommendations, but none strictly met the budget of ₹{budget}. Showing nothing.")
@@ -1,212 +1,471 @@
 import os
 import requests
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Iterable, Iterator, Optional, Any, Tuple
 from bs4 import BeautifulSoup
 import time
-import re
+import math
 from googleapiclient.discovery import build
 import json
 import sys # Import sys module
 import streamlit as st
+import patterns
+from dedupe import canonicalize_url, collapse_duplicates
+from cache import SEARCH_CACHE, SCRAPE_CACHE, STALE_WINDOW
+from metrics import METRICS
+from singleflight import SCRAPE_FLIGHTS, SEARCH_FLIGHTS
+from domain_health import DOMAIN_HEALTH, CircuitOpen
+from public_fetch import PUBLIC_SESSION, NonPublicAddress
+from incremental_extract import CHUNK_SIZE as INCREMENTAL_CHUNK_SIZE, extract_stream, incremental_enabled
+from snapshot_store import SNAPSHOTS, snapshot_mode
+from query_fanout import VARIANT_TEMPLATES, fan_out, fanout_enabled, query_variants
+from site_extractors import extract_with_plugin, extractor_for
+from localities import nearby, nearby_terms
+from query_canon import parse_query
+from revalidate import REVALIDATOR
+from quota import QUOTA, QuotaExceeded
+from result_filter import ResultFilter
+from ranking import has_usable_prices, rank_items
+from records import MenuItem, RestaurantInfo, SearchResult, format_price
+
+# Custom Search returns at most 10 items per call and 100 per query
+CSE_PAGE_SIZE = 10
+MAX_SEARCH_ITEMS = 100
+# GOOGLE_CSE_URL overrides the endpoint (e.g. stub_server.py for load tests)
+DEFAULT_CSE_URL = "https://www.googleapis.com/customsearch/v1"
+
+# Seconds to wait after each live page fetch; SCRAPE_POLITENESS_DELAY overrides it
+# (replay.py --stub sets 0, the stub pages need no politeness)
+POLITENESS_DELAY = 0.5
+
+# Bump when the extraction heuristics change, so reextract.py knows which stored snapshots to redo
+EXTRACTOR_VERSION = 2
+
+# Custom Search API calls made by this process; the persistent daily budget is quota.QUOTA
+api_usage = {'cse_calls': 0}
+
+# Common Bangalore localities (prewarm.py's default pairs); query parsing uses the
+# fuller gazetteer in localities.py
+KNOWN_LOCALITIES = [
+    'koramangala', 'indiranagar', 'hsr layout', 'btm layout', 'jayanagar',
+    'jp nagar', 'whitefield', 'marathahalli', 'bellandur', 'electronic city',
+    'sarjapur road', 'mg road', 'brigade road', 'commercial street',
+    'rajajinagar', 'malleshwaram', 'banashankari', 'yelahanka', 'hebbal'
+    # Add more common areas lowercase
+]
 
 def extract_price_range(text: str) -> str:
     """Extract price range from text using common patterns."""
-    price_patterns = [
-        r'₹\s*(\d+)\s*-\s*₹\s*(\d+)',  # ₹100 - ₹500
-        r'Rs\.?\s*(\d+)\s*-\s*Rs\.?\s*(\d+)',  # Rs.100 - Rs.500
-        r'INR\s*(\d+)\s*-\s*INR\s*(\d+)',  # INR100 - INR500
-        r'(\d+)\s*-\s*(\d+)\s*rupees',  # 100 - 500 rupees
-    ]
-    
-    for pattern in price_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            return f"₹{match.group(1)} - ₹{match.group(2)}"
+    price_range = patterns.match_price_range(text)
+    if price_range:
+        return f"₹{price_range[0]} - ₹{price_range[1]}"
     return ""
 
 def extract_rating(text: str) -> str:
     """Extract rating from text using common patterns."""
-    rating_patterns = [
-        r'(\d+\.?\d*)\s*\/\s*5',  # 4.5/5
-        r'(\d+\.?\d*)\s*out\s*of\s*5',  # 4.5 out of 5
-        r'rating\s*:\s*(\d+\.?\d*)',  # rating: 4.5
-    ]
-    
-    for pattern in rating_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            return match.group(1)
-    return ""
+    return patterns.match_rating(text) or ""
+
+def snippet_info(item: Dict[str, Any]) -> Optional[RestaurantInfo]:
+    """Best-effort details from a search item's title and snippet, used when the page cannot be scraped."""
+    snippet = item.get('snippet', '')
+    info = RestaurantInfo(
+        name=patterns.TITLE_SUFFIX.sub('', item.get('title', '')).strip(),
+        price_range=extract_price_range(snippet),
+        rating=extract_rating(snippet),
+    )
+    return None if info.is_empty() else info
+
+def find_info_near_keyword(candidates, field: str, search_depth: int = 3) -> str:
+    """
+    Collect short text blocks surrounding the keywords registered for a field.
 
-def scrape_website(url: str) -> Dict[str, Any]:
+    Args:
+        candidates: (text node, lowercased text) pairs from patterns.keyword_candidates.
+        field (str): Key into patterns.FIELD_KEYWORDS.
+        search_depth (int): How many parents to climb looking for a useful text block.
+    """
+    field_pattern = patterns.FIELD_KEYWORDS[field]
+    keyword_tags = [tag for tag, lowered in candidates if field_pattern.search(lowered)]
+    found_info = []
+    for tag in keyword_tags:
+        current = tag
+        for _ in range(search_depth):
+            parent = current.find_parent()
+            if not parent: break
+            # Look for text in siblings or the parent itself
+            text_content = ' '.join(parent.stripped_strings)
+            # Simple heuristic: Check if text is sufficiently long and doesn't just repeat the keyword
+            if len(text_content) > len(tag) + 10 and tag.lower() not in text_content.lower()[len(tag):]:
+                 # Basic cleaning
+                cleaned_text = patterns.WHITESPACE.sub(' ', text_content).strip()
+                # Avoid overly long generic text blocks
+                if len(cleaned_text) < 300: 
+                    found_info.append(cleaned_text)
+                    break # Take the first plausible parent/sibling text
+            current = parent
+    return ' | '.join(list(set(found_info))) # Join unique findings
+
+def scrape_website(url: str, max_cache_age: Optional[float] = None, public_only: bool = False) -> Optional[RestaurantInfo]:
     """
     Scrape additional restaurant details from a given URL.
     Focuses on Cuisine, Location, Price Range, Rating, Specialties, Contact, Timing, Features, and Menu Items/Prices.
+    Results are cached per canonical URL (see cache.SCRAPE_CACHE).
 
     Args:
         url (str): The URL of the restaurant website or listing page.
+        max_cache_age (float): Ignore cached entries older than this many seconds (default: cache TTL).
+        public_only (bool): Only connect to public addresses, redirects included (caller-supplied
+                            URLs; see public_fetch.py). Raises NonPublicAddress otherwise.
 
     Returns:
-        Dict[str, Any]: A dictionary containing scraped restaurant information.
-                       Returns an empty dictionary if scraping fails or no relevant info is found.
+        Optional[RestaurantInfo]: The scraped restaurant information (use .to_dict() for the old dict shape).
+                                  Returns None if scraping fails or no relevant info is found.
+    """
+    return scrape_website_live(url, max_cache_age, public_only)[0]
+
+def scrape_website_live(url: str, max_cache_age: Optional[float] = None,
+                        public_only: bool = False) -> Tuple[Optional[RestaurantInfo], bool]:
+    """scrape_website, plus whether this call fetched the page itself (False for cache hits and shared fetches)."""
+    cache_key = canonicalize_url(url)
+    live = False
+
+    def fetch():
+        with METRICS.timed('stage.scrape'):
+            restaurant_info = _scrape_website(url, public_only)
+        if restaurant_info is not None:
+            SCRAPE_CACHE.set(cache_key, restaurant_info.to_dict())
+        return restaurant_info
+
+    # An explicit max_cache_age (prewarm.py) asks for fresh data, so no stale serving then
+    cached = SCRAPE_CACHE.lookup(cache_key, max_age=max_cache_age,
+                                 stale_window=STALE_WINDOW if max_cache_age is None else 0.0)
+    if cached is not None:
+        if cached.stale:
+            # Serve the last known details now, re-scrape in the background (see revalidate.py)
+            print(f"Scrape cache hit (stale, {cached.age:.0f}s old; refreshing): {url}")
+            REVALIDATOR.schedule(('scrape', cache_key), lambda: SCRAPE_FLIGHTS.do(cache_key, fetch))
+        else:
+            print(f"Scrape cache hit: {url}")
+        return RestaurantInfo.from_dict(cached.value), False
+
+    def fetch_now():
+        nonlocal live
+        live = True
+        return fetch()
+
+    # Concurrent scrapes of the same page share one fetch
+    info = SCRAPE_FLIGHTS.do(cache_key, fetch_now)
+    return info, live
+
+def _extract_full(html: str) -> RestaurantInfo:
+    """Tree-based extraction of the whole document (the default SCRAPE_MODE=full)."""
+    # Parse HTML content
+    soup = BeautifulSoup(html, 'html.parser')
+
+    restaurant_info = RestaurantInfo()
+
+    # --- Enhanced Information Extraction --- 
+
+    # 1. Restaurant Name (Try H1, title, specific meta tags)
+    name_tag = soup.find('h1')
+    if name_tag:
+        restaurant_info.name = name_tag.text.strip()
+    if not restaurant_info.name:
+        title_tag = soup.find('title')
+        if title_tag:
+             # Basic cleaning of title for restaurant name
+             restaurant_info.name = patterns.TITLE_SUFFIX.sub('', title_tag.text).strip()
+
+    # 2. Common Patterns for Sections (using text search and sibling/parent navigation)
+    keyword_candidates = patterns.keyword_candidates(soup.find_all(string=True))
+    restaurant_info.cuisine = find_info_near_keyword(keyword_candidates, 'cuisine')
+    restaurant_info.location = find_info_near_keyword(keyword_candidates, 'location')
+    restaurant_info.price_range = find_info_near_keyword(keyword_candidates, 'price_range')
+    restaurant_info.rating = find_info_near_keyword(keyword_candidates, 'rating')
+    restaurant_info.specialties = find_info_near_keyword(keyword_candidates, 'specialties')
+    restaurant_info.contact = find_info_near_keyword(keyword_candidates, 'contact')
+    restaurant_info.timing = find_info_near_keyword(keyword_candidates, 'timing')
+    restaurant_info.features = find_info_near_keyword(keyword_candidates, 'features')
+
+    # 3. Menu Items and Prices (More Robust Extraction)
+    menu_items = []
+    seen_names = set()
+
+    # Regex for price (common currencies/formats), see patterns.MENU_PRICE
+    price_pattern = patterns.MENU_PRICE
+
+    # Look for common menu containers
+    menu_containers = soup.find_all(['div', 'section', 'ul'], 
+                                   class_=patterns.MENU_CONTAINER_CLASS)
+    if not menu_containers:
+        menu_containers = soup.find_all('body') # Fallback to body if no specific containers
+
+    for container in menu_containers:
+        # Try finding elements with potential item names and prices nearby
+        potential_items = container.find_all(['div', 'li', 'p', 'span', 'h3', 'h4'])
+
+        for item_tag in potential_items:
+            item_text = ' '.join(item_tag.stripped_strings)
+            if not item_text or len(item_text) < 3: continue # Skip empty or very short tags
+
+            # Search for price within the item's text or immediate siblings/children
+            price_match = price_pattern.search(item_text)
+            if price_match:
+                # Try to extract the item name (text before the price)
+                item_name = item_text[:price_match.start()].strip()
+                # Basic cleaning of item name
+                item_name = patterns.CONTROL_WHITESPACE.sub(' ', item_name) # Remove newlines/tabs
+                item_name = patterns.MULTI_SPACE.sub(' ', item_name).strip() # Condense spaces
+                # Filter out very short/generic names or likely descriptions
+                if len(item_name) > 2 and len(item_name.split()) < 10 and not item_name.isdigit():
+                    # Avoid duplicates
+                    if item_name not in seen_names:
+                         seen_names.add(item_name)
+                         menu_items.append(MenuItem(name=item_name, price=float(price_match.group('amount')),
+                                                    currency=price_match.group('currency')))
+                         # Limit number of items found to avoid overly large results
+                         if len(menu_items) > 50: break 
+        if len(menu_items) > 50: break # Stop searching containers if enough items found
+
+    # Add extracted menu items to the record
+    restaurant_info.menu_items = menu_items
+    return restaurant_info
+
+def extract_html(body: bytes, encoding: Optional[str] = None, url: Optional[str] = None) -> RestaurantInfo:
     """
+    Run the current extractors over a complete page body: the site plugin for url's
+    domain (see site_extractors.py) if it finds anything, else the generic extractor
+    per SCRAPE_MODE. Used for plugin domains and by reextract.py.
+    """
+    if url and extractor_for(url) is not None:
+        restaurant_info = extract_with_plugin(url, body.decode(encoding or 'utf-8', errors='replace'))
+        if restaurant_info is not None:
+            return restaurant_info
+    with METRICS.timed('extract.generic'):
+        if incremental_enabled():
+            chunks = (body[i:i + INCREMENTAL_CHUNK_SIZE] for i in range(0, len(body), INCREMENTAL_CHUNK_SIZE))
+            return extract_stream(chunks, encoding)[0]
+        return _extract_full(body.decode(encoding or 'utf-8', errors='replace'))
+
+def _tee(chunks: Iterable[bytes], sink: List[bytes]) -> Iterator[bytes]:
+    """Pass chunks through, keeping a copy of each for the snapshot store."""
+    for chunk in chunks:
+        sink.append(chunk)
+        yield chunk
+
+def _store_snapshot(url: str, response: requests.Response, body: bytes, complete: bool) -> None:
+    SNAPSHOTS.put(url, body, status=response.status_code, encoding=response.encoding, headers=response.headers,
+                  complete=complete, extractor_version=EXTRACTOR_VERSION)
+
+def _scrape_website(url: str, public_only: bool = False) -> Optional[RestaurantInfo]:
+    """Fetch and extract one page (uncached); see scrape_website."""
     try:
         # Send HTTP request with a user-agent to mimic a browser
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
-        response = requests.get(url, headers=headers, timeout=15) # Increased timeout
+        # Plugin domains need the whole body (embedded state often sits at the end of the page)
+        incremental = incremental_enabled() and extractor_for(url) is None
+        # Per-domain adaptive timeouts; raises CircuitOpen for domains that keep failing
+        connect_timeout, read_timeout = DOMAIN_HEALTH.before_request(url)
+        started = time.monotonic()
+        try:
+            response = (PUBLIC_SESSION if public_only else requests).get(
+                url, headers=headers, timeout=(connect_timeout, read_timeout), stream=incremental)
+        except requests.exceptions.RequestException as e:
+            DOMAIN_HEALTH.record_failure(url, time.monotonic() - started, isinstance(e, requests.exceptions.Timeout))
+            raise
+        if response.status_code in (403, 429) or response.status_code >= 500:
+            DOMAIN_HEALTH.record_failure(url, time.monotonic() - started)
+        else:
+            DOMAIN_HEALTH.record_success(url, time.monotonic() - started)
         response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
 
         # Check if content type is suitable for parsing
         content_type = response.headers.get('Content-Type', '').lower()
         if 'html' not in content_type:
             print(f"Skipping scraping for non-HTML content type: {content_type}")
-            return {}
-
-        # Parse HTML content
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        restaurant_info = {
-            'name': '',
-            'cuisine': '', 
-            'location': '', 
-            'price_range': '', 
-            'rating': '', 
-            'specialties': '', 
-            'contact': '', 
-            'timing': '', 
-            'features': '',
-            'menu_items': [] # Initialize as list
-        }
-        
-        # --- Enhanced Information Extraction --- 
-
-        # 1. Restaurant Name (Try H1, title, specific meta tags)
-        name_tag = soup.find('h1')
-        if name_tag:
-            restaurant_info['name'] = name_tag.text.strip()
-        if not restaurant_info['name']:
-            title_tag = soup.find('title')
-            if title_tag:
-                 # Basic cleaning of title for restaurant name
-                 restaurant_info['name'] = re.sub(r'\|.*$| - .*$|', '', title_tag.text).strip()
-
-        # 2. Common Patterns for Sections (using text search and sibling/parent navigation)
-        def find_info_near_keyword(soup, keywords, search_depth=3):
-            pattern = re.compile(r'|'.join(keywords), re.IGNORECASE)
-            keyword_tags = soup.find_all(string=pattern)
-            found_info = []
-            for tag in keyword_tags:
-                current = tag
-                for _ in range(search_depth):
-                    parent = current.find_parent()
-                    if not parent: break
-                    # Look for text in siblings or the parent itself
-                    text_content = ' '.join(parent.stripped_strings)
-                    # Simple heuristic: Check if text is sufficiently long and doesn't just repeat the keyword
-                    if len(text_content) > len(tag) + 10 and tag.lower() not in text_content.lower()[len(tag):]:
-                         # Basic cleaning
-                        cleaned_text = re.sub(r'\s+', ' ', text_content).strip()
-                        # Avoid overly long generic text blocks
-                        if len(cleaned_text) < 300: 
-                            found_info.append(cleaned_text)
-                            break # Take the first plausible parent/sibling text
-                    current = parent
-            return ' | '.join(list(set(found_info))) # Join unique findings
-
-        restaurant_info['cuisine'] = find_info_near_keyword(soup, ['cuisine', 'food type', 'serves', 'specializes in'])
-        restaurant_info['location'] = find_info_near_keyword(soup, ['address', 'location', 'located at', 'find us'])
-        restaurant_info['price_range'] = find_info_near_keyword(soup, ['price range', 'cost for two', 'average cost', 'price level'])
-        restaurant_info['rating'] = find_info_near_keyword(soup, ['rating', 'score', 'reviews?', 'stars?'])
-        restaurant_info['specialties'] = find_info_near_keyword(soup, ['specialt(?:ies|y)', 'signature', 'popular', 'recommended', 'must try'])
-        restaurant_info['contact'] = find_info_near_keyword(soup, ['phone', 'contact', 'tel', 'call', 'book table'])
-        restaurant_info['timing'] = find_info_near_keyword(soup, ['timing', 'hours', 'open(?:ing)?', 'days?'])
-        restaurant_info['features'] = find_info_near_keyword(soup, ['features', 'amenities', 'facilities', 'serv(?:es|ice)'])
-        
-        # 3. Menu Items and Prices (More Robust Extraction)
-        menu_items = []
-        
-        # Regex for price (common currencies/formats)
-        # Allows for optional decimal part
-        price_pattern = re.compile(r'(?:₹|Rs\.?|INR|\$|€|£)\s*(\d+(?:\.\d{1,2})?)\b') 
-        
-        # Look for common menu containers
-        menu_containers = soup.find_all(['div', 'section', 'ul'], 
-                                       class_=re.compile(r'menu|item|dish|product|section', re.IGNORECASE))
-        if not menu_containers:
-            menu_containers = soup.find_all('body') # Fallback to body if no specific containers
-            
-        for container in menu_containers:
-            # Try finding elements with potential item names and prices nearby
-            potential_items = container.find_all(['div', 'li', 'p', 'span', 'h3', 'h4'])
-            
-            for item_tag in potential_items:
-                item_text = ' '.join(item_tag.stripped_strings)
-                if not item_text or len(item_text) < 3: continue # Skip empty or very short tags
-                
-                # Search for price within the item's text or immediate siblings/children
-                price_match = price_pattern.search(item_text)
-                price = None
-                if price_match:
-                    price = price_match.group(1)
-                    # Try to extract the item name (text before the price)
-                    item_name = item_text[:price_match.start()].strip()
-                    # Basic cleaning of item name
-                    item_name = re.sub(r'[\r\n\t]+', ' ', item_name) # Remove newlines/tabs
-                    item_name = re.sub(r'\s{2,}', ' ', item_name).strip() # Condense spaces
-                    # Filter out very short/generic names or likely descriptions
-                    if len(item_name) > 2 and len(item_name.split()) < 10 and not item_name.isdigit():
-                        # Avoid duplicates
-                        if not any(d['name'] == item_name for d in menu_items):
-                             menu_items.append({'name': item_name, 'price': price})
-                             # Limit number of items found to avoid overly large results
-                             if len(menu_items) > 50: break 
-            if len(menu_items) > 50: break # Stop searching containers if enough items found
-
-        # Add extracted menu items to the main dictionary
-        restaurant_info['menu_items'] = menu_items
+            response.close()
+            return None
+
+        snapshots = snapshot_mode()
+        if incremental:
+            # Stream the body through the incremental extractor; stop downloading once it is satisfied
+            body = []
+            try:
+                chunks = response.iter_content(chunk_size=INCREMENTAL_CHUNK_SIZE)
+                restaurant_info, bytes_read, stopped_early = extract_stream(
+                    _tee(chunks, body), response.encoding)
+                if stopped_early and snapshots == 'full':
+                    body.extend(chunks)
+            finally:
+                response.close()
+            METRICS.observe('size.scrape_bytes', bytes_read)
+            if stopped_early:
+                METRICS.incr('scrape.stopped_early')
+            if snapshots != 'off':
+                _store_snapshot(url, response, b''.join(body), complete=not stopped_early or snapshots == 'full')
+        else:
+            METRICS.observe('size.scrape_bytes', len(response.content))
+            if snapshots != 'off':
+                _store_snapshot(url, response, response.content, complete=True)
+            restaurant_info = extract_html(response.content, response.encoding, url)
         
-        # --- Clean up empty fields --- 
-        cleaned_info = {k: v for k, v in restaurant_info.items() if v}
+        if restaurant_info.is_empty():
+            return None
         
         # Optional: Log if important fields are missing
-        if not cleaned_info.get('location') or not cleaned_info.get('cuisine'):
+        if not restaurant_info.location or not restaurant_info.cuisine:
              print(f"Warning: Missing location or cuisine for {url}")
              
-        return cleaned_info
+        return restaurant_info
         
+    except (CircuitOpen, NonPublicAddress):
+        raise
     except requests.exceptions.Timeout:
         print(f"Scraping timed out for URL: {url}")
-        return {}
+        return None
     except requests.exceptions.RequestException as e:
         print(f"Error scraping URL {url}: {str(e)}")
-        return {}
+        return None
     except Exception as e:
         # Catch other potential errors during parsing
         print(f"Error processing HTML for {url}: {str(e)}")
         import traceback
         traceback.print_exc() # Print stack trace for debugging unexpected errors
-        return {}
+        return None
 
-def perform_google_search(query: str, num_results: int = 10, scrape_details: bool = True) -> List[Dict[str, str]]:
+def _cse_get(url: str, params: Dict[str, Any]) -> requests.Response:
     """
-    Perform a Google Custom Search and optionally scrape additional details from the results.
-    Filters out advertisements and promotional content.
+    One Custom Search API request, charged to the daily quota under the current priority.
 
-    Args:
-        query (str): The search query
-        num_results (int): Number of results to return (default: 10)
-        scrape_details (bool): Whether to scrape additional details from each result (default: True)
+    Raises:
+        QuotaExceeded: If the quota manager refuses the call, or the API reports the quota as spent.
+    """
+    if url == DEFAULT_CSE_URL:
+        QUOTA.acquire(1)
+    api_usage['cse_calls'] += 1
+    response = requests.get(url, params=params)
+    if response.status_code == 429 or (response.status_code == 403 and 'quota' in response.text.lower()):
+        QUOTA.mark_exhausted()
+        raise QuotaExceeded(f"Custom Search API reported the daily quota as exhausted ({response.status_code})")
+    return response
+
+def _fetch_remaining_pages(url: str, params: Dict[str, Any], items: List[Dict[str, Any]], wanted: int) -> List[Dict[str, Any]]:
+    """Fetch further Custom Search pages (via 'start') until `wanted` items or the results run out."""
+    items = list(items)
+    page_size = params.get('num', CSE_PAGE_SIZE)
+    last_page_size = len(items)
+    while len(items) < wanted and last_page_size >= page_size:
+        page_params = dict(params, start=len(items) + 1, num=min(page_size, wanted - len(items)))
+        try:
+            response = _cse_get(url, page_params)
+            response.raise_for_status()
+        except QuotaExceeded as e:
+            # Keep the pages we have
+            print(f"Not fetching search page starting at {page_params['start']}: {str(e)}")
+            break
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching search page starting at {page_params['start']}: {str(e)}")
+            break
+        page_items = response.json().get('items', [])
+        if not page_items:
+            break
+        items.extend(page_items)
+        last_page_size = len(page_items)
+    return items
+
+def _fetch_search_items(url: str, params: Dict[str, Any], fallback_query: str, wanted: int) -> List[Dict[str, Any]]:
+    """Run the Custom Search request (retrying a 400 with a simpler query) and paginate up to `wanted` items."""
+    response = _cse_get(url, params)
+    # The simpler query costs another call: only worth it if it differs and the quota allows it
+    if response.status_code == 400 and fallback_query.lower() != params['q'].lower() and QUOTA.available(1):
+        print(f"Bad Request Error. Response content: {response.text}")
+        # Try a simpler query as fallback
+        print(f"Trying fallback query: {fallback_query}")
+        # Remove potentially problematic parameters for fallback
+        params = {
+            'key': params['key'],
+            'cx': params['cx'],
+            'q': fallback_query,
+            'num': params['num']
+        }
+        response = _cse_get(url, params)
 
-    Returns:
-        List[Dict[str, str]]: List of dictionaries containing search results and scraped details
+    response.raise_for_status()
+    data = response.json()
+    if 'items' not in data:
+        return []
+
+    # Paginate (10 items per call, 100 max) when more results are requested
+    return _fetch_remaining_pages(url, params, data['items'], wanted)
+
+def _cached_search_items(url: str, params: Dict[str, Any], fallback_query: str, wanted: int,
+                         max_cache_age: Optional[float] = None, cache_key: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Raw Custom Search items for params['q'], from the search cache (under cache_key) or the API."""
+    # Raw items are cached per query (its query_canon key when given); a hit is usable
+    # if it was fetched for at least as many results as wanted now
+    cache_key = cache_key or params['q'].lower()
+
+    def fetch():
+        with METRICS.timed('stage.cse'):
+            fetched = _fetch_search_items(url, params, fallback_query, wanted)
+        if fetched:
+            SEARCH_CACHE.set(cache_key, {'wanted': wanted, 'items': fetched})
+        return fetched
+
+    cached = SEARCH_CACHE.lookup(cache_key, max_age=max_cache_age,
+                                 stale_window=STALE_WINDOW if max_cache_age is None else 0.0)
+    if cached is not None and cached.value['wanted'] >= wanted:
+        if cached.stale:
+            # Serve the last known items now; the refresh spends quota, so it is bounded by revalidate.py
+            print(f"Search cache hit (stale, {cached.age:.0f}s old; refreshing): {params['q']}")
+            REVALIDATOR.schedule(('search', cache_key, wanted), lambda: SEARCH_FLIGHTS.do((cache_key, wanted), fetch),
+                                 cost=math.ceil(wanted / CSE_PAGE_SIZE))
+        else:
+            print(f"Search cache hit: {params['q']}")
+        return cached.value['items'][:wanted]
+
+    # Identical concurrent searches share one API request
+    try:
+        return SEARCH_FLIGHTS.do((cache_key, wanted), fetch)
+    except QuotaExceeded:
+        # Out of quota: items cached for this query at any age (or for fewer results) beat none
+        cached = SEARCH_CACHE.lookup(cache_key, stale_window=math.inf)
+        if cached is None:
+            raise
+        print(f"Quota exhausted, serving {cached.age:.0f}s old search cache entry: {params['q']}")
+        METRICS.incr('quota.degraded.cache')
+        return cached.value['items'][:wanted]
+
+def _local_results(base_query: str, location: str, location_type: str, num_results: int) -> List[SearchResult]:
+    """Results from the scraped-restaurant index (name_index.py), for when Custom Search is unavailable."""
+    from name_index import get_name_index
+    localities = [] if location.lower() in ('bangalore', 'bengaluru') else [location.lower()] + nearby_terms(location)
+    terms = [term for term in base_query.lower().split() if term != 'food']
+    results = []
+    for match in get_name_index().search(terms, localities, limit=num_results):
+        info = match.info
+        snippet = ', '.join(part for part in (info.cuisine, info.location, info.price_range) if part)
+        results.append(SearchResult(title=match.name, link=match.link, snippet=snippet, info=info,
+                                    query_location=location, query_location_type=location_type))
+    METRICS.incr('quota.degraded.local_index')
+    print(f"Quota exhausted, {len(results)} results from the local restaurant index")
+    return results
+
+def _google_credentials():
+    """Google API key and CSE id from Streamlit secrets, or (None, None) after reporting the problem.
+
+    Headless callers (pipeline.py, replay.py, prewarm.py) without a secrets file can set the
+    GOOGLE_API_KEY / GOOGLE_CSE_ID environment variables instead.
     """
+    env_credentials = (os.getenv("GOOGLE_API_KEY"), os.getenv("GOOGLE_CSE_ID"))
     try:
         try:
             api_key = st.secrets["GOOGLE_API_KEY"]
             cse_id = st.secrets["GOOGLE_CSE_ID"]
         except KeyError as e:
+            if all(env_credentials):
+                return env_credentials
             st.error(f"""
             ⚠️ Missing Google API credentials in Streamlit Secrets!
             
@@ -221,244 +480,179 @@ def perform_google_search(query: str, num_results: int = 10, scrape_details: boo
             
             You can add these in your Streamlit Cloud dashboard under Settings > Secrets.
             """)
-            return []
+            return None, None
     except Exception as e:
+        if all(env_credentials):
+            return env_credentials
         st.error(f"Could not access Streamlit secrets: {str(e)}")
+        return None, None
+
+    return api_key, cse_id
+
+def search_cost(num_results: int = 10, fanout: Optional[bool] = None) -> int:
+    """
+    Worst-case Custom Search calls for one uncached perform_google_search: every result
+    page, the simpler-query retry after a 400, and one call per fan-out variant.
+    """
+    if fanout is None:
+        fanout = fanout_enabled()
+    pages = math.ceil(min(num_results, MAX_SEARCH_ITEMS) / CSE_PAGE_SIZE)
+    return pages + 1 + (len(VARIANT_TEMPLATES) if fanout else 0)
+
+def perform_google_search(query: str, num_results: int = 10, scrape_details: bool = True,
+                          max_scrapes: Optional[int] = None, min_priced_results: int = 3,
+                          max_cache_age: Optional[float] = None, fanout: Optional[bool] = None) -> List[SearchResult]:
+    """
+    Perform a Google Custom Search and optionally scrape additional details from the results.
+    Filters out advertisements and promotional content, and ranks the remaining
+    results (domain priors, snippet price/rating, locality match) before scraping.
+    When the daily Custom Search quota is spent (quota.py), answers from cached search
+    items of any age, then from the local restaurant index.
+
+    Args:
+        query (str): The search query
+        num_results (int): Number of results to return (default: 10). More than 10 paginates, up to 100.
+        scrape_details (bool): Whether to scrape additional details from each result (default: True)
+        max_scrapes (int): Maximum pages to scrape (default: num_results)
+        min_priced_results (int): Stop scraping once this many results have usable prices (default: 3)
+        max_cache_age (float): Ignore cached search/scrape entries older than this many seconds (default: cache TTLs)
+        fanout (bool): Search several query variants concurrently and fuse the results (default: $SEARCH_FANOUT; see query_fanout.py)
+
+    Returns:
+        List[SearchResult]: Search results with scraped details attached as ``.info``.
+                            Results also support dict-style access (``result['title']``, ``'name' in result``).
+    """
+    api_key, cse_id = _google_credentials()
+    if api_key is None:
         return []
 
     if not api_key or not cse_id:
         st.error("Google API credentials are empty. Please check your Streamlit secrets configuration.")
         return []
 
-    # 1. Extract Location
-    location = None
-    location_type = None
-    base_query_text = query # Start with the full query
-    location_context = "Bangalore" # Assume Bangalore context unless location is Bangalore itself
-
     print(f"Original Query: {query}")
 
-    # --- Strategy 1: Explicit Patterns (near/in/at/area) --- 
-    location_keywords_boundary = r'\b(?:menu|price|cost|review|restaurant|hotel|food|rating|$)|'
-    location_patterns = [
-        (r'\b(?:near|in|at)\s+((?:[A-Za-z0-9][A-Za-z0-9\s,\-]*?))(?=\s*(?:'+location_keywords_boundary+r'))\b', None),
-        (r'\b((?:[A-Za-z0-9][A-Za-z0-9\s,\-]*?))\s+area(?=\s*(?:'+location_keywords_boundary+r'))\b', 'area')
-    ]
-
-    for pattern, loc_relation in location_patterns:
-        # print(f"Trying pattern: {pattern}") # Debug print
-        match = re.search(pattern, query, re.IGNORECASE)
-        if match:
-            # print(f"Explicit pattern matched!") # Debug print
-            extracted_location = match.group(1).strip()
-            if len(extracted_location) > 1:
-                location = extracted_location
-                if loc_relation == 'area':
-                    location_type = 'in'
-                else:
-                    relation_keyword = match.group(0).split()[0].lower()
-                    location_type = relation_keyword
-                base_query_text = query.replace(match.group(0), '', 1).strip()
-                print(f"Found location via explicit pattern: {location} ({location_type})")
-                break
-            # else: print(f"Extracted location '{extracted_location}' too short, ignoring match.") # Debug
-        # else: print("Pattern did not match.") # Debug
-
-    # --- Strategy 2: Fallback - Known Localities (if explicit patterns failed) --- 
-    if not location:
-        print("Explicit location patterns failed. Trying fallback with known localities...")
-        # Simple list of common Bangalore localities (can be expanded)
-        known_localities = [
-            'koramangala', 'indiranagar', 'hsr layout', 'btm layout', 'jayanagar',
-            'jp nagar', 'whitefield', 'marathahalli', 'bellandur', 'electronic city',
-            'sarjapur road', 'mg road', 'brigade road', 'commercial street',
-            'rajajinagar', 'malleshwaram', 'banashankari', 'yelahanka', 'hebbal'
-            # Add more common areas lowercase
-        ]
-        query_words = query.lower().split()
-        found_locality = None
-        # Check from the end of the query backwards
-        for i in range(len(query_words) - 1, -1, -1):
-            # Check single words
-            if query_words[i] in known_localities:
-                found_locality = query_words[i]
-                # Attempt to reconstruct original casing (simple title case)
-                # Find the original word in the query corresponding to this lowercase word
-                original_case_words = [w for w in query.split() if w.lower() == found_locality]
-                location = original_case_words[0] if original_case_words else found_locality.title()
-                break
-            # Optional: Check two-word phrases (like 'sarjapur road')
-            if i > 0:
-                two_word_phrase = f"{query_words[i-1]} {query_words[i]}"
-                if two_word_phrase in known_localities:
-                    found_locality = two_word_phrase
-                    original_case_words = [w for w in query.split() if w.lower() == query_words[i-1]]
-                    original_case_words_2 = [w for w in query.split() if w.lower() == query_words[i]]
-                    if original_case_words and original_case_words_2:
-                        location = f"{original_case_words[0]} {original_case_words_2[0]}"
-                    else:
-                         location = found_locality.title()
-                    break
-        
-        if location: # Found via fallback
-            location_type = 'in' # Assume 'in' if no explicit preposition
-            # Remove the found locality from the base query text (case-insensitive replace)
-            # Build a regex pattern to match the found locality case-insensitively
-            pattern_to_remove = r'\b' + re.escape(location) + r'\b'
-            base_query_text = re.sub(pattern_to_remove, '', base_query_text, flags=re.IGNORECASE).strip()
-            print(f"Found location via fallback: {location} ({location_type})")
-        else:
-            print("Fallback locality check failed.")
-
-    # --- Strategy 3: Default Location (if both explicit and fallback failed) --- 
-    if not location:
-        location = "Bangalore"
-        location_type = "in"
-        location_context = "" # Location is Bangalore, so no extra context needed
-        print(f"No location found, using default: {location}")
-    # Set context if a specific locality was found and it's not Bangalore
-    elif location.lower() != 'bangalore' and location.lower() != 'bengaluru':
-        location_context = "Bangalore"
-    else: # Location found is Bangalore
-         location_context = ""
-
-    # Clean potential duplicate spaces from base_query_text after removal
-    base_query_text = re.sub(r'\s+', ' ', base_query_text).strip()
-
-    # 2. Process Remaining Text for Base Query
-    filter_words = {
-        'near', 'in', 'at', 'area', 'menu', 'prices', 'price', 'cost',
-        'restaurant', 'restaurants', 'hotel', 'hotels', 'food', 'dining',
-        'the', 'and', 'or', 'for', 'with', 'to', 'from', 'by', 'on', 'a', 'an', 'of',
-        'reviews', 'review', 'rating', 'ratings'
-    }
-    query_terms = [word for word in base_query_text.split() if word.lower() not in filter_words]
-    base_query = ' '.join(query_terms)
-
-    # Fallback for base query
-    if not base_query:
-        print(f"Filtering left no terms from: '{base_query_text}'")
-        fallback_filter = {'near', 'in', 'at', 'area', 'menu', 'prices', 'price', 'cost',
-                           'restaurant', 'restaurants', 'reviews', 'review'}
-        base_query = ' '.join(word for word in base_query_text.split() if word.lower() not in fallback_filter)
-        print(f"Using fallback base query: '{base_query}'")
-    if not base_query:
-        print("Fallback also resulted in empty query, using 'food' as default.")
-        base_query = "food"
-
-    print(f"Refined Base query: '{base_query}'")
-
-    # 3. Construct Enhanced Query
-    location_part = f"{location_type} {location}"
-    if location_context:
-        location_part += f" {location_context}"
-    
-    # Simplify query construction and remove potentially problematic parts
-    enhanced_query = f"{base_query} {location_part}"
-    enhanced_query = re.sub(r'\s+', ' ', enhanced_query).strip()
+    # Canonical food terms and locality (query_canon.py): every phrasing of the same
+    # request sends the same Custom Search query and shares its cache entry
+    parsed = parse_query(query)
+    location = parsed.location
+    location_type = parsed.location_type
+    location_context = parsed.location_context
+    base_query = parsed.base_query
+    location_part = parsed.location_part
+    enhanced_query = parsed.enhanced_query
     print(f"Enhanced query: {enhanced_query}")
 
     # Construct the API request URL with simplified parameters
-    url = "https://www.googleapis.com/customsearch/v1"
+    url = os.getenv("GOOGLE_CSE_URL", DEFAULT_CSE_URL)
     params = {
         'key': api_key,
         'cx': cse_id,
         'q': enhanced_query,
-        'num': min(num_results, 10),  # Use the capped number of results
+        'num': min(num_results, CSE_PAGE_SIZE),  # Use the capped number of results
         'gl': 'in'  # Set location to India
     }
 
+    wanted = min(num_results, MAX_SEARCH_ITEMS)
+    fallback_query = parsed.fallback_query
+    if fanout is None:
+        fanout = fanout_enabled()
+
     try:
-        # Make the API request with error handling
-        response = requests.get(url, params=params)
-        if response.status_code == 400:
-            print(f"Bad Request Error. Response content: {response.text}")
-            # Try a simpler query as fallback
-            fallback_query = f"{base_query} {location}"
-            print(f"Trying fallback query: {fallback_query}")
-            params['q'] = fallback_query
-            # Remove potentially problematic parameters for fallback
-            params = {
-                'key': api_key,
-                'cx': cse_id,
-                'q': fallback_query,
-                'num': min(num_results, 10)
-            }
-            response = requests.get(url, params=params)
-        
-        response.raise_for_status()
-        data = response.json()
+        fusion_scores = None
+        if fanout:
+            # Complementary query variants in parallel, merged by reciprocal rank fusion;
+            # variants fetch one page each so the fan-out costs about one query's wall-clock
+            variants = query_variants(enhanced_query, base_query, location_part,
+                                      nearby=[area.display_name for area in nearby(location)])
+            # Each extra variant is another call; near the daily limit only the primary query runs
+            if not QUOTA.available(len(variants) - 1 + math.ceil(wanted / CSE_PAGE_SIZE)):
+                print("Custom Search quota is running low, skipping the query fan-out")
+                METRICS.incr('quota.degraded.fanout')
+                fanout = False
+
+            def search_variant(name: str, variant_query: str) -> List[Dict[str, Any]]:
+                variant_wanted = wanted if name == 'primary' else min(wanted, CSE_PAGE_SIZE)
+                return _cached_search_items(url, dict(params, q=variant_query), fallback_query, variant_wanted,
+                                            max_cache_age, cache_key=f"{parsed.key}#{name}")
 
-        if 'items' not in data:
+        try:
+            if fanout:
+                fused = fan_out(variants, search_variant)
+                items = [item for _, item in fused]
+                fusion_scores = {item['link']: score for score, item in fused}
+            else:
+                items = _cached_search_items(url, params, fallback_query, wanted, max_cache_age, cache_key=parsed.key)
+        except QuotaExceeded as e:
+            # Nothing cached for this query either: answer from the restaurants already scraped
+            print(f"Custom Search unavailable: {str(e)}")
+            return _local_results(base_query, location, location_type, num_results)
+
+        if not items:
             print(f"No search results found for: {enhanced_query}")
             return []
-
-        print(f"Found {len(data['items'])} initial results")
+        print(f"Found {len(items)} initial results")
 
         results = []
-        ad_keywords = ['sponsored', 'advertisement', 'promoted', 'ad:', 'deals', 'offers', 'discount', 'sale']
-        processed_links = set()
-
-        for item in data['items']:
-            link = item.get('link', '')
-            if not link or link in processed_links:
-                continue
-            processed_links.add(link)
-
-            title = item.get('title', '').lower()
-            snippet = item.get('snippet', '').lower()
-
-            if any(keyword in title or keyword in snippet for keyword in ad_keywords):
-                print(f"Skipping ad result: {title}")
-                continue
-
-            if any(domain in link.lower() for domain in ['ad.', '.ad', 'ads.', 'advertising.', 'promo.', 'deals.']):
-                print(f"Skipping ad domain: {link}")
-                continue
-
-            # Check location relevance using extracted location AND context
-            location_terms = location.lower().split()
-            context_terms = location_context.lower().split()
-            content = (title + ' ' + snippet).lower()
-
-            location_relevant = any(term in content for term in location_terms) or \
-                              (location_context and any(term in content for term in context_terms))
-
-            # If not relevant based on specific location/context, try fallback check for Bangalore
-            if not location_relevant:
-                 if location_context.lower() == 'bangalore' and any(city in content for city in ['bangalore', 'bengaluru']):
-                     location_relevant = True # Override: Consider it relevant if Bangalore matches
-            
-            # After potential override, check final relevance status
-            if not location_relevant:
-                 print(f"Skipping result not relevant to {location} or {location_context}: {title}")
-                 continue # Skip this item if it's still not relevant
+
+        # Collapse canonical-URL and near-duplicate (title+snippet) items before any scraping
+        items, duplicates = collapse_duplicates(items)
+        for item, reason in duplicates:
+            print(f"Skipping duplicate result ({reason}): {item.get('link', '')}")
+
+        # Ad / location relevance filter, compiled once for this query
+        # Results from adjacent localities stay relevant (localities.py)
+        nearby_areas = nearby_terms(location)
+        result_filter = ResultFilter(location, location_context, nearby=nearby_areas)
+        items, rejected = result_filter.apply(items)
+        for item, reason in rejected:
+            print(f"Skipping result ({reason}): {item.get('title', '')}")
+
+        # Rank before scraping so the most useful pages are fetched first
+        ranked = rank_items(items, location, fusion_scores, nearby=nearby_areas)
+        if max_scrapes is None:
+            max_scrapes = num_results
+        scrapes = 0
+        priced_results = 0
+
+        for score, item in ranked[:num_results]:
+            link = item['link']
 
             # --- If we reach here, the result is considered relevant --- 
-            result = {
-                'title': item.get('title', ''),
-                'link': link,
-                'snippet': item.get('snippet', ''),
-                'query_location': location,
-                'query_location_type': location_type
-            }
-
-            if scrape_details:
+            result = SearchResult(
+                title=item.get('title', ''),
+                link=link,
+                snippet=item.get('snippet', ''),
+                query_location=location,
+                query_location_type=location_type
+            )
+
+            # Stop scraping once enough results already carry usable prices
+            if scrape_details and scrapes < max_scrapes and priced_results < min_priced_results:
+                scrapes += 1
+                live = True
                 try:
-                    print(f"Scraping details from: {link}")
-                    scraped_data = scrape_website(link)
+                    print(f"Scraping details from (score {score:.1f}): {link}")
+                    scraped_data, live = scrape_website_live(link, max_cache_age=max_cache_age)
                     if scraped_data:
-                        result.update(scraped_data)
+                        result.info = scraped_data
                         print(f"Successfully scraped details from: {link}")
+                except CircuitOpen as e:
+                    print(f"Skipping scrape ({str(e)}), using the search snippet")
+                    result.info = snippet_info(item)
+                    live = False
                 except Exception as e:
                     print(f"Error scraping {link}: {str(e)}")
-
+                delay = float(os.getenv('SCRAPE_POLITENESS_DELAY', POLITENESS_DELAY))
+                if live and delay > 0:
+                    # Be polite between live fetches only; timed apart from stage.scrape
+                    with METRICS.timed('stage.politeness'):
+                        time.sleep(delay)
+
+            if has_usable_prices(result):
+                priced_results += 1
             results.append(result)
-            print(f"Added result: {result['title']}")
-            time.sleep(0.5)
-
-            if len(results) >= num_results:
-                break
+            print(f"Added result: {result.title}")
 
         print(f"Returning {len(results)} final results")
         return results
@@ -484,26 +678,25 @@ if __name__ == "__main__":
     # Print results
     for i, result in enumerate(results, 1):
         print(f"\nResult {i}:")
-        print(f"Title: {result['title']}")
-        print(f"Link: {result['link']}")
-        print(f"Snippet: {result['snippet']}")
+        print(f"Title: {result.title}")
+        print(f"Link: {result.link}")
+        print(f"Snippet: {result.snippet}")
         
-        if 'restaurant_info' in result:
-            info = result['restaurant_info']
+        if result.info:
+            info = result.info
             print("\nRestaurant Details:")
-            print(f"Name: {info.get('name', 'N/A')}")
-            print(f"Cuisine: {info.get('cuisine', 'N/A')}")
-            print(f"Location: {info.get('location', 'N/A')}")
-            print(f"Price Range: {info.get('price_range', 'N/A')}")
-            print(f"Rating: {info.get('rating', 'N/A')}")
-            print(f"Specialties: {info.get('specialties', 'N/A')}")
-            print(f"Contact: {info.get('contact', 'N/A')}")
-            print(f"Timing: {info.get('timing', 'N/A')}")
-            print(f"Features: {info.get('features', 'N/A')}")
+            print(f"Name: {info.name or 'N/A'}")
+            print(f"Cuisine: {info.cuisine or 'N/A'}")
+            print(f"Location: {info.location or 'N/A'}")
+            print(f"Price Range: {info.price_range or 'N/A'}")
+            print(f"Rating: {info.rating or 'N/A'}")
+            print(f"Specialties: {info.specialties or 'N/A'}")
+            print(f"Contact: {info.contact or 'N/A'}")
+            print(f"Timing: {info.timing or 'N/A'}")
+            print(f"Features: {info.features or 'N/A'}")
             
             # Print menu items if available
-            menu_items = info.get('menu_items', [])
-            if menu_items:
+            if info.menu_items:
                 print("\nMenu Items:")
-                for item in menu_items:
-                    print(f"{item['name']}: {item['price']}")
+                for item in info.menu_items:
+                    print(f"{item.name}: {item.currency}{format_price(item.price)}")
@@ -0,0 +1,222 @@
+import codecs
+import os
+from html.parser import HTMLParser
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import patterns
+from records import MenuItem, RestaurantInfo
+
+# Incremental (streaming) page extraction.
+# scrape_website's full mode downloads the whole page, builds a BeautifulSoup
+# tree and runs every extractor over it. This extractor is an HTMLParser fed
+# chunk by chunk as the body downloads; it applies the same heuristics as the
+# tree-based extractors when elements close, and reports `satisfied` as soon
+# as the required fields and enough menu items are found, so the caller can
+# stop downloading and parsing.
+#
+# Opt in with SCRAPE_MODE=incremental; the default (full) keeps the tree-based
+# extractor. Early-stopped records are partial by design and are cached like
+# full ones. SCRAPE_REQUIRED_FIELDS (comma-separated RestaurantInfo fields) and
+# SCRAPE_MIN_MENU_ITEMS tune when extraction stops.
+
+DEFAULT_REQUIRED_FIELDS = ('name', 'location')
+DEFAULT_MIN_MENU_ITEMS = 12
+MAX_MENU_ITEMS = 51  # same cap as the full extractor
+CHUNK_SIZE = 16 * 1024
+
+# Parents climbed from a keyword text node, as in find_info_near_keyword
+SEARCH_DEPTH = 3
+_MENU_ITEM_TAGS = frozenset(['div', 'li', 'p', 'span', 'h3', 'h4'])
+_MENU_CONTAINER_TAGS = frozenset(['div', 'section', 'ul'])
+_SKIP_TEXT_TAGS = frozenset(['script', 'style', 'noscript', 'template'])
+# Elements that never have an end tag, so they never get a frame
+_VOID_TAGS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+                        'param', 'source', 'track', 'wbr'])
+_FIELDS = tuple(patterns.FIELD_KEYWORDS)
+
+def incremental_enabled() -> bool:
+    return os.getenv('SCRAPE_MODE', 'full').strip().lower() == 'incremental'
+
+def stop_conditions() -> Tuple[Tuple[str, ...], int]:
+    """(required fields, minimum menu items) from the environment, with defaults."""
+    fields = tuple(f.strip() for f in os.getenv('SCRAPE_REQUIRED_FIELDS', '').split(',') if f.strip())
+    try:
+        min_items = int(os.getenv('SCRAPE_MIN_MENU_ITEMS', DEFAULT_MIN_MENU_ITEMS))
+    except ValueError:
+        min_items = DEFAULT_MIN_MENU_ITEMS
+    return fields or DEFAULT_REQUIRED_FIELDS, min_items
+
+class _Frame:
+    __slots__ = ('tag', 'texts', 'pending', 'menu_container')
+
+    def __init__(self, tag: str, menu_container: bool):
+        self.tag = tag
+        self.texts: List[str] = []
+        self.pending: List[Tuple[str, str, int]] = []  # (field, keyword text, parents climbed)
+        self.menu_container = menu_container
+
+class IncrementalExtractor(HTMLParser):
+    """Event-driven restaurant extractor; call feed() per chunk, then result()."""
+
+    def __init__(self, required_fields: Iterable[str] = DEFAULT_REQUIRED_FIELDS,
+                 min_menu_items: int = DEFAULT_MIN_MENU_ITEMS):
+        super().__init__(convert_charrefs=True)
+        self.required_fields = tuple(required_fields)
+        self.min_menu_items = min_menu_items
+        self._stack: List[_Frame] = [_Frame('#document', False)]
+        self._skip_depth = 0
+        self._in_menu_container = 0
+        self._title = ''
+        self._h1 = ''
+        self._found: Dict[str, List[str]] = {field: [] for field in _FIELDS}
+        self._menu: List[MenuItem] = []
+        self._fallback_menu: List[MenuItem] = []  # items outside menu containers
+        self._seen_names = set()
+        self._fallback_seen = set()
+        self.bytes_fed = 0
+
+    # --- HTMLParser events ---
+    def handle_starttag(self, tag, attrs):
+        if tag in _VOID_TAGS:
+            return
+        if tag in _SKIP_TEXT_TAGS:
+            self._skip_depth += 1
+        container = tag in _MENU_CONTAINER_TAGS and any(
+            name == 'class' and value and patterns.MENU_CONTAINER_CLASS.search(value) for name, value in attrs)
+        if container:
+            self._in_menu_container += 1
+        self._stack.append(_Frame(tag, container))
+
+    def handle_endtag(self, tag):
+        if tag in _VOID_TAGS:
+            return
+        # Close up to the matching open element (tolerates unclosed <li>, <p>, ...)
+        for depth in range(len(self._stack) - 1, 0, -1):
+            if self._stack[depth].tag == tag:
+                while len(self._stack) > depth:
+                    self._close_frame()
+                return
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        text = data.strip()
+        if not text:
+            return
+        frame = self._stack[-1]
+        frame.texts.append(text)
+        lowered = text.lower()
+        if patterns.ANY_FIELD_KEYWORD.search(lowered):
+            for field in _FIELDS:
+                if patterns.FIELD_KEYWORDS[field].search(lowered):
+                    frame.pending.append((field, text, 1))
+
+    def _close_frame(self):
+        frame = self._stack.pop()
+        parent = self._stack[-1]
+        if frame.tag in _SKIP_TEXT_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        text_content = ' '.join(frame.texts)
+        if frame.menu_container:
+            self._in_menu_container -= 1
+
+        if frame.tag == 'title' and not self._title:
+            self._title = text_content
+        elif frame.tag == 'h1' and not self._h1:
+            self._h1 = text_content
+
+        for field, keyword_text, climbed in frame.pending:
+            # Same heuristic as find_info_near_keyword: longer than the keyword, not repeating it, short
+            if (len(text_content) > len(keyword_text) + 10
+                    and keyword_text.lower() not in text_content.lower()[len(keyword_text):]):
+                cleaned = patterns.WHITESPACE.sub(' ', text_content).strip()
+                if len(cleaned) < 300:
+                    if cleaned not in self._found[field]:
+                        self._found[field].append(cleaned)
+                    continue
+            if climbed < SEARCH_DEPTH and len(self._stack) > 1:
+                parent.pending.append((field, keyword_text, climbed + 1))
+
+        if frame.tag in _MENU_ITEM_TAGS and len(text_content) >= 3:
+            if self._in_menu_container or frame.menu_container:
+                self._add_menu_item(text_content, self._menu, self._seen_names)
+            elif not self._menu:
+                self._add_menu_item(text_content, self._fallback_menu, self._fallback_seen)
+
+        if text_content:
+            parent.texts.append(text_content)
+
+    def _add_menu_item(self, item_text: str, items: List[MenuItem], seen: set):
+        if len(items) >= MAX_MENU_ITEMS:
+            return
+        price_match = patterns.MENU_PRICE.search(item_text)
+        if not price_match:
+            return
+        item_name = item_text[:price_match.start()].strip()
+        item_name = patterns.CONTROL_WHITESPACE.sub(' ', item_name)
+        item_name = patterns.MULTI_SPACE.sub(' ', item_name).strip()
+        if len(item_name) > 2 and len(item_name.split()) < 10 and not item_name.isdigit() and item_name not in seen:
+            seen.add(item_name)
+            items.append(MenuItem(name=item_name, price=float(price_match.group('amount')),
+                                  currency=price_match.group('currency')))
+
+    # --- Driving ---
+    def feed_chunk(self, chunk: str) -> bool:
+        """Feed decoded text; returns True once the stop conditions are met."""
+        self.bytes_fed += len(chunk)
+        self.feed(chunk)
+        return self.satisfied()
+
+    def _name(self) -> str:
+        if self._h1:
+            return self._h1
+        return patterns.TITLE_SUFFIX.sub('', self._title).strip() if self._title else ''
+
+    def satisfied(self) -> bool:
+        for field in self.required_fields:
+            if field == 'name':
+                if not self._name():
+                    return False
+            elif field == 'menu_items':
+                continue
+            elif not self._found.get(field):
+                return False
+        return len(self._menu) >= self.min_menu_items
+
+    def result(self) -> RestaurantInfo:
+        """The extracted record so far (close() first for a complete document)."""
+        info = RestaurantInfo(name=self._name())
+        for field in _FIELDS:
+            setattr(info, field, ' | '.join(self._found[field]))
+        info.menu_items = list(self._menu or self._fallback_menu)
+        return info
+
+    def close(self):
+        super().close()
+        while len(self._stack) > 1:
+            self._close_frame()
+
+def extract_stream(chunks: Iterable[bytes], encoding: Optional[str] = None,
+                   required_fields: Optional[Iterable[str]] = None,
+                   min_menu_items: Optional[int] = None) -> Tuple[RestaurantInfo, int, bool]:
+    """
+    Extract from an iterable of raw byte chunks, stopping early when satisfied.
+
+    Returns:
+        Tuple of (RestaurantInfo, bytes consumed, whether extraction stopped early).
+    """
+    default_fields, default_items = stop_conditions()
+    extractor = IncrementalExtractor(required_fields or default_fields,
+                                     default_items if min_menu_items is None else min_menu_items)
+    decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+    consumed = 0
+    stopped_early = False
+    for chunk in chunks:
+        consumed += len(chunk)
+        if extractor.feed_chunk(decoder.decode(chunk)):
+            stopped_early = True
+            break
+    if not stopped_early:
+        extractor.feed(decoder.decode(b'', final=True))
+    extractor.close()
+    return extractor.result(), consumed, stopped_early
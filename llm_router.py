@@ -0,0 +1,171 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import requests
+
+from singleflight import LLM_FLIGHTS
+
+# Model routing for the Together AI completion call.
+# Queries are routed to a model tier (a fast small model for general queries, a
+# larger one for restaurant-specific menu queries), every call has a timeout,
+# and a hedged backup request goes to the other tier if the primary has not
+# answered within LLM_HEDGE_AFTER seconds (or fails outright). Whichever
+# successful response arrives first is used.
+#
+# Configuration (environment variables):
+#   TOGETHER_API_URL     completions endpoint (point at stub_server.py for tests)
+#   LLM_MODEL_FAST       model for the fast tier
+#   LLM_MODEL_LARGE      model for the large tier
+#   LLM_TIMEOUT_FAST     read timeout in seconds for the fast tier
+#   LLM_TIMEOUT_LARGE    read timeout in seconds for the large tier
+#   LLM_HEDGE_AFTER      seconds before the backup request fires (0 disables hedging)
+
+DEFAULT_API_URL = "https://api.together.xyz/v1/completions"
+CONNECT_TIMEOUT = 5
+
+@dataclass(frozen=True)
+class ModelTier:
+    name: str
+    model: str
+    timeout: float  # read timeout, seconds
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+def default_tiers() -> Dict[str, ModelTier]:
+    return {
+        'fast': ModelTier('fast', os.getenv('LLM_MODEL_FAST', 'mistralai/Mistral-7B-Instruct-v0.2'),
+                          _env_float('LLM_TIMEOUT_FAST', 20)),
+        'large': ModelTier('large', os.getenv('LLM_MODEL_LARGE', 'mistralai/Mixtral-8x7B-Instruct-v0.1'),
+                           _env_float('LLM_TIMEOUT_LARGE', 45)),
+    }
+
+@dataclass
+class LLMResponse:
+    data: Dict[str, Any]  # decoded JSON body of the completions response
+    model: str
+    tier: str
+    latency: float  # seconds from the first request to this response
+    hedged: bool  # True if a backup request was fired
+
+# Shared by all routers; a losing hedge keeps its worker until its own timeout
+_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix='llm')
+
+class LLMRouter:
+    """Route completion calls to model tiers with per-call timeouts and hedging."""
+
+    def __init__(self, api_key: str, tiers: Optional[Dict[str, ModelTier]] = None,
+                 hedge_after: Optional[float] = None, url: Optional[str] = None):
+        self.api_key = api_key
+        self.tiers = tiers or default_tiers()
+        self.hedge_after = _env_float('LLM_HEDGE_AFTER', 6) if hedge_after is None else hedge_after
+        self.url = url or os.getenv('TOGETHER_API_URL', DEFAULT_API_URL)
+        self.stats = {'calls': 0, 'hedged': 0, 'errors': 0, 'wins': {name: 0 for name in self.tiers}}
+        # Updated from the callers' threads (hedged calls run concurrently)
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name: str, tier: Optional[str] = None) -> None:
+        with self._stats_lock:
+            if tier is None:
+                self.stats[name] += 1
+            else:
+                self.stats[name][tier] += 1
+
+    def choose_tier(self, restaurant: Optional[str] = None) -> str:
+        """Restaurant-specific menu queries go to the large model, everything else to the fast one."""
+        if restaurant and restaurant.strip() and 'large' in self.tiers:
+            return 'large'
+        return 'fast' if 'fast' in self.tiers else next(iter(self.tiers))
+
+    def backup_tier(self, primary: str) -> Optional[str]:
+        for name in self.tiers:
+            if name != primary:
+                return name
+        return None
+
+    def _post(self, tier: ModelTier, payload: Dict[str, Any]) -> Dict[str, Any]:
+        headers = {
+            "accept": "application/json",
+            "content-type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        response = requests.post(self.url, headers=headers, json=dict(payload, model=tier.model),
+                                 timeout=(CONNECT_TIMEOUT, tier.timeout))
+        response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+        return response.json()
+
+    def complete(self, payload: Dict[str, Any], restaurant: Optional[str] = None) -> LLMResponse:
+        """
+        Run a completion with routing and hedging.
+        Identical concurrent calls (same tier and payload) share one upstream request.
+
+        Args:
+            payload (dict): Completions request body without 'model' (prompt, max_tokens, ...).
+            restaurant (str): Specific restaurant from the query, used for routing.
+
+        Returns:
+            LLMResponse: The first successful response.
+
+        Raises:
+            requests.exceptions.RequestException: If every attempted tier failed or timed out.
+        """
+        primary = self.choose_tier(restaurant)
+        key = (self.url, primary, json.dumps(payload, sort_keys=True, ensure_ascii=False))
+        return LLM_FLIGHTS.do(key, lambda: self._complete(payload, primary))
+
+    def _complete(self, payload: Dict[str, Any], primary: str) -> LLMResponse:
+        self._count('calls')
+        backup = self.backup_tier(primary) if self.hedge_after > 0 else None
+        start = time.monotonic()
+        pending = {_EXECUTOR.submit(self._post, self.tiers[primary], payload): primary}
+        hedged = False
+        errors = {}
+
+        def fire_backup():
+            nonlocal hedged
+            hedged = True
+            self._count('hedged')
+            pending[_EXECUTOR.submit(self._post, self.tiers[backup], payload)] = backup
+
+        while pending:
+            timeout = None
+            if backup and not hedged:
+                timeout = max(0.0, self.hedge_after - (time.monotonic() - start))
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                print(f"LLM tier '{primary}' slower than {self.hedge_after}s, hedging with '{backup}'")
+                fire_backup()
+                continue
+            for future in done:
+                tier = pending.pop(future)
+                try:
+                    data = future.result()
+                except requests.exceptions.RequestException as e:
+                    print(f"LLM tier '{tier}' ({self.tiers[tier].model}) failed: {str(e)}")
+                    errors[tier] = e
+                    if backup and not hedged:
+                        fire_backup()
+                    continue
+                self._count('wins', tier)
+                return LLMResponse(data=data, model=self.tiers[tier].model, tier=tier,
+                                   latency=time.monotonic() - start, hedged=hedged)
+
+        self._count('errors')
+        raise errors.get(primary) or next(iter(errors.values()))
+
+_ROUTERS: Dict[str, LLMRouter] = {}
+
+def get_router(api_key: str) -> LLMRouter:
+    """Process-wide router per API key, so stats accumulate across Streamlit reruns."""
+    router = _ROUTERS.get(api_key)
+    if router is None:
+        router = _ROUTERS[api_key] = LLMRouter(api_key)
+    return router
@@ -0,0 +1,184 @@
+import math
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# Bundled gazetteer of Bangalore localities with approximate centroid
+# coordinates (no online geocoding), a grid index for radius queries, and
+# "nearby areas" expansion. perform_google_search uses it to recognise the
+# locality in a query, to keep and rank results from adjacent areas (ResultFilter,
+# rank_items) and for the 'nearby' query fan-out variant.
+#
+# LOCALITY_NEARBY_KM sets the expansion radius (default 4 km).
+
+NEARBY_RADIUS_KM = float(os.getenv('LOCALITY_NEARBY_KM', 4.0))
+MAX_NEARBY = 6
+GRID_CELL_DEGREES = 0.02  # ~2.2 km
+EARTH_RADIUS_KM = 6371.0
+
+_ACRONYMS = {'hsr', 'btm', 'jp', 'mg', 'kr', 'cv', 'rt', 'rr', 'itpl'}
+
+@dataclass(frozen=True)
+class Locality:
+    name: str  # lowercase canonical name
+    lat: float
+    lon: float
+    aliases: Tuple[str, ...] = ()
+
+    @property
+    def display_name(self) -> str:
+        return ' '.join(word.upper() if word in _ACRONYMS else word.title() for word in self.name.split())
+
+# (name, lat, lon, aliases); centroids are approximate (within ~1 km)
+_GAZETTEER = [
+    ('koramangala', 12.9279, 77.6271, ('kormangala',)),
+    ('indiranagar', 12.9719, 77.6412, ('indira nagar',)),
+    ('hsr layout', 12.9116, 77.6474, ('hsr',)),
+    ('btm layout', 12.9166, 77.6101, ('btm',)),
+    ('jayanagar', 12.9250, 77.5938, ()),
+    ('jp nagar', 12.9063, 77.5857, ('j p nagar', 'jayaprakash nagar')),
+    ('whitefield', 12.9698, 77.7500, ()),
+    ('itpl', 12.9870, 77.7370, ()),
+    ('marathahalli', 12.9569, 77.7011, ()),
+    ('bellandur', 12.9304, 77.6784, ()),
+    ('kadubeesanahalli', 12.9372, 77.6968, ()),
+    ('varthur', 12.9388, 77.7401, ()),
+    ('brookefield', 12.9655, 77.7185, ()),
+    ('hoodi', 12.9910, 77.7160, ()),
+    ('mahadevapura', 12.9880, 77.6895, ()),
+    ('kr puram', 13.0077, 77.6953, ('k r puram', 'krishnarajapuram')),
+    ('electronic city', 12.8452, 77.6602, ('e city', 'ecity')),
+    ('sarjapur road', 12.9100, 77.6870, ()),
+    ('bommanahalli', 12.9081, 77.6238, ()),
+    ('bannerghatta road', 12.8880, 77.5970, ()),
+    ('mg road', 12.9756, 77.6050, ('mahatma gandhi road',)),
+    ('brigade road', 12.9719, 77.6070, ()),
+    ('church street', 12.9750, 77.6040, ()),
+    ('residency road', 12.9680, 77.6030, ()),
+    ('richmond town', 12.9602, 77.6033, ()),
+    ('lavelle road', 12.9695, 77.5975, ()),
+    ('shanti nagar', 12.9571, 77.5983, ('shantinagar',)),
+    ('wilson garden', 12.9490, 77.5990, ()),
+    ('commercial street', 12.9822, 77.6083, ()),
+    ('shivajinagar', 12.9857, 77.6057, ('shivaji nagar',)),
+    ('cunningham road', 12.9866, 77.5950, ()),
+    ('vasanth nagar', 12.9908, 77.5930, ()),
+    ('frazer town', 12.9980, 77.6150, ()),
+    ('ulsoor', 12.9817, 77.6200, ('halasuru',)),
+    ('domlur', 12.9610, 77.6387, ()),
+    ('old airport road', 12.9594, 77.6490, ()),
+    ('murugeshpalya', 12.9560, 77.6560, ()),
+    ('cv raman nagar', 12.9855, 77.6639, ('c v raman nagar',)),
+    ('banaswadi', 13.0104, 77.6478, ()),
+    ('kammanahalli', 13.0150, 77.6370, ()),
+    ('kalyan nagar', 13.0280, 77.6400, ()),
+    ('hennur', 13.0368, 77.6430, ()),
+    ('thanisandra', 13.0580, 77.6330, ()),
+    ('rt nagar', 13.0220, 77.5950, ('r t nagar',)),
+    ('hebbal', 13.0358, 77.5970, ()),
+    ('sanjay nagar', 13.0352, 77.5780, ()),
+    ('sahakara nagar', 13.0623, 77.5876, ()),
+    ('jakkur', 13.0740, 77.6060, ()),
+    ('yelahanka', 13.1007, 77.5963, ()),
+    ('devanahalli', 13.2430, 77.7120, ()),
+    ('sadashivanagar', 13.0068, 77.5813, ('sadashiva nagar',)),
+    ('malleshwaram', 13.0035, 77.5709, ('malleswaram',)),
+    ('mathikere', 13.0330, 77.5630, ()),
+    ('yeshwanthpur', 13.0285, 77.5400, ('yeshwantpur',)),
+    ('jalahalli', 13.0460, 77.5490, ()),
+    ('peenya', 13.0329, 77.5273, ()),
+    ('rajajinagar', 12.9910, 77.5525, ()),
+    ('basaveshwara nagar', 12.9930, 77.5390, ('basaveshwaranagar',)),
+    ('vijayanagar', 12.9711, 77.5373, ()),
+    ('nagarbhavi', 12.9606, 77.5095, ()),
+    ('rajarajeshwari nagar', 12.9274, 77.5155, ('rr nagar', 'r r nagar')),
+    ('kengeri', 12.9142, 77.4872, ()),
+    ('basavanagudi', 12.9416, 77.5750, ()),
+    ('banashankari', 12.9255, 77.5468, ()),
+    ('padmanabhanagar', 12.9165, 77.5567, ()),
+    ('kumaraswamy layout', 12.9057, 77.5630, ()),
+    ('uttarahalli', 12.9063, 77.5416, ()),
+]
+
+LOCALITIES = [Locality(name, lat, lon, aliases) for name, lat, lon, aliases in _GAZETTEER]
+_BY_NAME: Dict[str, Locality] = {}
+for _locality in LOCALITIES:
+    for _alias in (_locality.name,) + _locality.aliases:
+        _BY_NAME[_alias] = _locality
+
+# Longest alias first so "jp nagar" wins over a shorter overlapping alias; whole words only
+_ALIAS_PATTERN = re.compile(r'\b(?:' + '|'.join(re.escape(alias) for alias in sorted(_BY_NAME, key=len, reverse=True))
+                            + r')\b', re.IGNORECASE)
+
+def distance_km(a: Locality, b: Locality) -> float:
+    """Great-circle (haversine) distance between two locality centroids."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (a.lat, a.lon, b.lat, b.lon))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+class GridIndex:
+    """Uniform lat/lon grid over the localities for radius queries."""
+
+    def __init__(self, localities: List[Locality], cell: float = GRID_CELL_DEGREES):
+        self.cell = cell
+        self._cells: Dict[Tuple[int, int], List[Locality]] = defaultdict(list)
+        for locality in localities:
+            self._cells[self._key(locality.lat, locality.lon)].append(locality)
+
+    def _key(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell)), int(math.floor(lon / self.cell))
+
+    def within(self, center: Locality, radius_km: float) -> List[Tuple[float, Locality]]:
+        """(distance, locality) within radius_km of center (excluding it), nearest first."""
+        # One degree of latitude is ~111 km; longitude degrees shrink with cos(latitude)
+        reach_lat = int(math.ceil(radius_km / 111.0 / self.cell))
+        reach_lon = int(math.ceil(radius_km / (111.0 * math.cos(math.radians(center.lat))) / self.cell))
+        row, col = self._key(center.lat, center.lon)
+        found = []
+        for d_row in range(-reach_lat, reach_lat + 1):
+            for d_col in range(-reach_lon, reach_lon + 1):
+                for locality in self._cells.get((row + d_row, col + d_col), ()):
+                    if locality is center:
+                        continue
+                    distance = distance_km(center, locality)
+                    if distance <= radius_km:
+                        found.append((distance, locality))
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+GRID = GridIndex(LOCALITIES)
+
+def get_locality(name: Optional[str]) -> Optional[Locality]:
+    """The gazetteer entry for a locality name or alias (case-insensitive), if known."""
+    if not name:
+        return None
+    return _BY_NAME.get(' '.join(name.lower().split()))
+
+def find_locality(text: str) -> Optional[Tuple[Locality, str]]:
+    """The last locality mentioned in text, as (locality, matched text with its original casing)."""
+    matches = list(_ALIAS_PATTERN.finditer(text))
+    if not matches:
+        return None
+    match = matches[-1]
+    return _BY_NAME[match.group(0).lower()], match.group(0)
+
+def nearby(name: Optional[str], radius_km: float = NEARBY_RADIUS_KM, limit: int = MAX_NEARBY) -> List[Locality]:
+    """Localities within radius_km of the named one, nearest first (empty for unknown names)."""
+    center = get_locality(name)
+    if center is None:
+        # e.g. "Koramangala 5th Block" from an explicit "in ..." pattern
+        found = find_locality(name or '')
+        if found is None:
+            return []
+        center = found[0]
+    return [locality for _, locality in GRID.within(center, radius_km)[:limit]]
+
+def nearby_terms(name: Optional[str], radius_km: float = NEARBY_RADIUS_KM, limit: int = MAX_NEARBY) -> List[str]:
+    """Lowercase names and aliases of the nearby localities, for text matching."""
+    terms = []
+    for locality in nearby(name, radius_km, limit):
+        terms.append(locality.name)
+        terms.extend(locality.aliases)
+    return terms
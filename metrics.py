@@ -0,0 +1,84 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, ContextManager, Dict, List, Optional
+
+# In-process metrics registry: counters and latency samples per pipeline stage.
+# Used by the replay load generator for capacity reports; cheap enough to stay
+# on in the apps (one lock acquire and a list append per observation).
+# profiling.py sets Metrics.stage_hook while a request is profiled, so timed
+# blocks double as profile stages; unset, it costs timed() one attribute check.
+
+# Latency samples kept per series; older samples are dropped in bulk
+MAX_SAMPLES = 50000
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list (None when empty)."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+class Metrics:
+    """Thread-safe counters and latency series."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {}
+        self.latencies: Dict[str, List[float]] = {}
+        # name -> context manager wrapped around each timed block (profiling.py)
+        self.stage_hook: Optional[Callable[[str], ContextManager]] = None
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            samples = self.latencies.setdefault(name, [])
+            if len(samples) >= MAX_SAMPLES:
+                del samples[:MAX_SAMPLES // 2]
+            samples.append(seconds)
+
+    @contextmanager
+    def timed(self, name: str):
+        """Record the duration of the with-block under `name` (also on error)."""
+        hook = self.stage_hook
+        start = time.perf_counter()
+        try:
+            if hook is None:
+                yield
+            else:
+                with hook(name):
+                    yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def summary(self, name: str) -> Dict[str, float]:
+        """count/mean/p50/p90/p99/max for one latency series, in seconds."""
+        with self._lock:
+            values = sorted(self.latencies.get(name, []))
+        if not values:
+            return {'count': 0}
+        return {
+            'count': len(values),
+            'mean': sum(values) / len(values),
+            'p50': percentile(values, 50),
+            'p90': percentile(values, 90),
+            'p99': percentile(values, 99),
+            'max': values[-1],
+        }
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """All counters and latency summaries, JSON-serializable."""
+        with self._lock:
+            counters = dict(self.counters)
+            names = list(self.latencies)
+        return {'counters': counters, 'latencies': {name: self.summary(name) for name in names}}
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.latencies.clear()
+
+METRICS = Metrics()
@@ -0,0 +1,207 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import patterns
+from cache import SCRAPE_CACHE
+from localities import Locality, find_locality, get_locality
+from metrics import METRICS
+from records import RestaurantInfo
+
+# Fuzzy restaurant-name index over the scraped restaurants in the cache.
+# Lets a "Restaurant" query ("Truffels", "Meghana's") resolve to cached menu
+# data locally instead of a fresh web search. Candidates come from a trigram
+# inverted index and are scored by optimal-string-alignment edit distance
+# against the whole name or the best window of its words ("meghana" ~ "Meghana
+# Foods"). When the query has a locality, branches elsewhere are rejected;
+# localities in the gazetteer (localities.py) are compared by canonical name,
+# so "HSR" matches "HSR Layout" and "Kormangala" matches "Koramangala".
+# NameIndex.search is a keyword/locality scan over the same entries, used when
+# the Custom Search quota is spent (quota.py).
+
+MIN_SCORE = 0.8
+# Query-trigram containment a name needs to be considered at all
+MIN_CANDIDATE_OVERLAP = 0.3
+MAX_CANDIDATES = 50
+# A query matching only some of a name's words ("meghana" for "meghana foods") scores a bit lower
+PARTIAL_MATCH_FACTOR = 0.92
+# Seconds before the in-process index is rebuilt from the scrape cache
+REBUILD_AFTER = 300
+
+_IGNORED_WORDS = {'the', 'restaurant', 'restaurants', 'bangalore', 'bengaluru', 'menu', 'of', 'and'}
+_POSSESSIVE = re.compile(r"['’]s\b")
+_NON_WORD = re.compile(r'[^a-z0-9 ]+')
+
+def normalize_name(name: str) -> str:
+    """'Meghana's Foods | Zomato' -> 'meghana foods'; 'Truffles, Koramangala' -> 'truffles'."""
+    name = patterns.TITLE_SUFFIX.sub('', name or '').split(',')[0]
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii').lower()
+    name = _NON_WORD.sub(' ', _POSSESSIVE.sub('', name.replace('&', ' and ')))
+    return ' '.join(word for word in name.split() if word not in _IGNORED_WORDS)
+
+def trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def edit_distance(a: str, b: str) -> int:
+    """Optimal string alignment distance (Levenshtein plus adjacent transpositions)."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, 1):
+            cost = char_a != char_b
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+def _resolve_locality(text: str) -> Optional[Locality]:
+    """The gazetteer locality text names or mentions ("HSR, Bangalore" -> hsr layout), if any."""
+    found = find_locality(text)
+    return get_locality(text) or (found[0] if found else None)
+
+def similarity(query: str, name: str) -> float:
+    """1.0 for equal normalized names; edit-distance based otherwise, best word window of name."""
+    if not query or not name:
+        return 0.0
+    best = 1 - edit_distance(query, name) / max(len(query), len(name))
+    query_words, name_words = query.split(), name.split()
+    if len(query_words) < len(name_words):
+        for start in range(len(name_words) - len(query_words) + 1):
+            window = ' '.join(name_words[start:start + len(query_words)])
+            score = (1 - edit_distance(query, window) / max(len(query), len(window))) * PARTIAL_MATCH_FACTOR
+            best = max(best, score)
+    return best
+
+@dataclass
+class NameMatch:
+    name: str
+    link: str
+    location: str
+    score: float
+    info: RestaurantInfo
+
+class NameIndex:
+    """Trigram index over restaurant names, with fuzzy lookup and locality filtering."""
+
+    def __init__(self, entries: Iterable[Tuple[str, RestaurantInfo]]):
+        self._entries: List[Tuple[str, str, RestaurantInfo]] = []  # (normalized name, link, info)
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for link, info in entries:
+            normalized = normalize_name(info.name)
+            # Only restaurants with something to recommend from
+            if not normalized or not (info.menu_items or info.price_range):
+                continue
+            entry_id = len(self._entries)
+            self._entries.append((normalized, link, info))
+            for gram in trigrams(normalized):
+                self._postings[gram].append(entry_id)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @classmethod
+    def from_cache(cls, cache=SCRAPE_CACHE) -> "NameIndex":
+        return cls((link, RestaurantInfo.from_dict(data)) for link, data in cache.items())
+
+    def lookup(self, name: str, location: Optional[str] = None, limit: int = 5) -> List[NameMatch]:
+        """
+        Restaurants whose name fuzzily matches name, best first.
+
+        Args:
+            name (str): Restaurant name as typed, typos allowed.
+            location (str): Locality; when given (and not just Bangalore), entries whose
+                            location names another area are dropped and matching ones rank first.
+            limit (int): Maximum matches.
+        """
+        query = normalize_name(name)
+        if not query:
+            return []
+        query_grams = trigrams(query)
+        overlap: Dict[int, int] = defaultdict(int)
+        for gram in query_grams:
+            for entry_id in self._postings.get(gram, ()):
+                overlap[entry_id] += 1
+        needed = MIN_CANDIDATE_OVERLAP * len(query_grams)
+        candidates = sorted((entry_id for entry_id, count in overlap.items() if count >= needed),
+                            key=lambda entry_id: overlap[entry_id], reverse=True)[:MAX_CANDIDATES]
+
+        locality = (location or '').strip().lower()
+        if locality in ('bangalore', 'bengaluru'):
+            locality = ''
+        area = _resolve_locality(locality) if locality else None
+        # Without a canonical area on both sides, fall back to text containment (any alias of a known area)
+        terms = (area.name,) + area.aliases if area else (locality,)
+        matches = []
+        for entry_id in candidates:
+            normalized, link, info = self._entries[entry_id]
+            score = similarity(query, normalized)
+            if score < MIN_SCORE:
+                continue
+            in_locality = True
+            if locality:
+                entry_location = (info.location or '').lower()
+                entry_area = _resolve_locality(entry_location) if area else None
+                if entry_area:
+                    in_locality = entry_area == area
+                else:
+                    in_locality = any(term in entry_location for term in terms)
+                link_text = link.lower().replace('-', ' ')
+                if entry_location and not in_locality and not any(term in link_text for term in terms):
+                    continue
+                in_locality = in_locality and bool(entry_location)
+            matches.append((score, in_locality, len(info.menu_items),
+                            NameMatch(info.name, link, info.location, round(score, 3), info)))
+        matches.sort(key=lambda match: match[:3], reverse=True)
+        return [match[-1] for match in matches[:limit]]
+
+    def search(self, terms: Iterable[str], localities: Iterable[str], limit: int = 10) -> List[NameMatch]:
+        """
+        Restaurants in any of localities that mention any of terms (in name, cuisine or menu),
+        most matching terms first. The offline stand-in for a web search (see quota.py).
+        """
+        terms = [term.lower() for term in terms if term]
+        localities = [locality.lower() for locality in localities if locality]
+        matches = []
+        for normalized, link, info in self._entries:
+            entry_location = f"{info.location} {link}".lower()
+            if localities and not any(locality in entry_location for locality in localities):
+                continue
+            text = ' '.join([normalized, info.cuisine.lower(), info.specialties.lower()]
+                            + [item.name.lower() for item in info.menu_items])
+            matched = sum(1 for term in terms if term in text)
+            if terms and not matched:
+                continue
+            matches.append((matched, len(info.menu_items),
+                            NameMatch(info.name, link, info.location, matched / max(len(terms), 1), info)))
+        matches.sort(key=lambda match: match[:2], reverse=True)
+        return [match[-1] for match in matches[:limit]]
+
+_index: Optional[NameIndex] = None
+_built_at = 0.0
+_lock = threading.Lock()
+
+def get_name_index(max_age: float = REBUILD_AFTER) -> NameIndex:
+    """The process-wide index, rebuilt from the scrape cache when older than max_age seconds."""
+    global _index, _built_at
+    with _lock:
+        if _index is None or time.time() - _built_at > max_age:
+            with METRICS.timed('name_index.build'):
+                _index = NameIndex.from_cache()
+            _built_at = time.time()
+        return _index
+
+def resolve_restaurant(name: str, location: Optional[str] = None) -> Optional[NameMatch]:
+    """The best cached match for a typed restaurant name, or None (search the web instead)."""
+    with METRICS.timed('stage.name_lookup'):
+        matches = get_name_index().lookup(name, location, limit=1)
+    METRICS.incr('name_index.hit' if matches else 'name_index.miss')
+    return matches[0] if matches else None
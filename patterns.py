@@ -0,0 +1,120 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Module-level registry of every regex used by the extractors.
+# Each field's alternatives are combined into ONE precompiled pattern (price and
+# rating use named groups), so an extractor does a single scan instead of looping over
+# raw pattern strings (and going through re's compile cache) on every call.
+#
+# The field patterns (price range, rating, keywords) are written in lowercase
+# and run against lowercased text instead of using re.IGNORECASE: case-folding
+# every position of a unicode string defeats the engine's literal prefix search
+# and costs several times more than a single str.lower().
+
+def _alternation(alternatives: List[Tuple[str, str]], first_chars: str = '', flags: int = 0) -> "re.Pattern":
+    """Join (name, pattern) pairs into a single compiled regex.
+
+    Each alternative is wrapped in a named group so the caller can tell which
+    one matched via ``match.lastgroup``. ``first_chars`` is a character class
+    body covering every possible first character; the leading lookahead lets
+    the engine skip other positions cheaply instead of trying every branch.
+    """
+    body = '|'.join(f'(?P<{name}>{pattern})' for name, pattern in alternatives)
+    if first_chars:
+        body = f'(?=[{first_chars}])(?:{body})'
+    return re.compile(body, flags)
+
+# --- Price range: "₹100 - ₹500", "Rs.100 - Rs.500", "INR100 - INR500", "100 - 500 rupees" ---
+PRICE_RANGE = _alternation([
+    ('rupee', r'₹\s*(?P<rupee_lo>\d+)\s*-\s*₹\s*(?P<rupee_hi>\d+)'),
+    ('rs', r'rs\.?\s*(?P<rs_lo>\d+)\s*-\s*rs\.?\s*(?P<rs_hi>\d+)'),
+    ('inr', r'inr\s*(?P<inr_lo>\d+)\s*-\s*inr\s*(?P<inr_hi>\d+)'),
+    ('words', r'(?<!\d)(?P<words_lo>\d+)\s*-\s*(?P<words_hi>\d+)\s*rupees'),
+], first_chars=r'₹ri\d')
+
+# --- Rating: "4.5/5", "4.5 out of 5", "rating: 4.5" ---
+RATING = _alternation([
+    ('slash', r'(?<![\d.])(?P<slash_value>\d+\.?\d*)\s*\/\s*5'),
+    ('out_of', r'(?<![\d.])(?P<out_of_value>\d+\.?\d*)\s*out\s*of\s*5'),
+    ('label', r'rating\s*:\s*(?P<label_value>\d+\.?\d*)'),
+], first_chars=r'r\d')
+
+# --- Keyword anchors used by find_info_near_keyword, one alternation per field ---
+_FIELD_KEYWORDS: Dict[str, List[str]] = {
+    'cuisine': ['cuisine', 'food type', 'serves', 'specializes in'],
+    'location': ['address', 'location', 'located at', 'find us'],
+    'price_range': ['price range', 'cost for two', 'average cost', 'price level'],
+    'rating': ['rating', 'score', 'reviews?', 'stars?'],
+    'specialties': ['specialt(?:ies|y)', 'signature', 'popular', 'recommended', 'must try'],
+    'contact': ['phone', 'contact', 'tel', 'call', 'book table'],
+    'timing': ['timing', 'hours', 'open(?:ing)?', 'days?'],
+    'features': ['features', 'amenities', 'facilities', 'serv(?:es|ice)'],
+}
+FIELD_KEYWORDS: Dict[str, "re.Pattern"] = {
+    field: re.compile('|'.join(keywords))
+    for field, keywords in _FIELD_KEYWORDS.items()
+}
+# All field keywords in one flat alternation, used to find the candidate text
+# nodes in a single pass over the document; the per-field patterns above then
+# only run over that much smaller candidate list. Deliberately ungrouped: a flat
+# alternation of literals gets a first-character prefix scan from the engine,
+# wrapping each field in a group loses it (~5x slower on a typical page).
+ANY_FIELD_KEYWORD = re.compile('|'.join('|'.join(keywords) for keywords in _FIELD_KEYWORDS.values()))
+
+# --- Menu extraction ---
+MENU_PRICE = re.compile(r'(?P<currency>₹|Rs\.?|INR|\$|€|£)\s*(?P<amount>\d+(?:\.\d{1,2})?)\b')
+MENU_CONTAINER_CLASS = re.compile(r'menu|item|dish|product|section', re.IGNORECASE)
+
+# --- Embedded page state (site_extractors.py) ---
+JSON_LD_SCRIPT = re.compile(r'<script[^>]*\btype\s*=\s*["\']application/ld\+json["\'][^>]*>(.*?)</script>', re.IGNORECASE | re.DOTALL)
+NEXT_DATA_SCRIPT = re.compile(r'<script[^>]*\bid\s*=\s*["\']__NEXT_DATA__["\'][^>]*>(.*?)</script>', re.IGNORECASE | re.DOTALL)
+
+# --- Price normalization (price_index.py) ---
+# Any currency-tagged amount, thousands separators allowed (run on lowercased text).
+# Currency words must stand alone ("rs 300", "inr500"), not end or start a word ("hours 11", "entrepreneur 5")
+CURRENCY_AMOUNT = re.compile(r'(?=[₹ri$€£ueg])(?P<currency>₹|\$|€|£|(?<![a-z])(?:rs\.?|inr|usd|eur|gbp)(?![a-z]))'
+                             r'\s*(?P<amount>\d+(?:,\d+)*(?:\.\d{1,2})?)')
+# What a price refers to (run on lowercased text)
+PRICE_FOR_TWO = re.compile(r'for\s+(?:two|2)\b|two\s+people|\bcouple\b')
+PRICE_PER_PERSON = re.compile(r'per\s+(?:person|head|pax)|/\s*(?:person|head|pax)|\bpp\b|\bper\s+plate\b')
+
+# --- Rupee amounts in LLM output ("Total Cost: ₹1,800 (₹900 per person)") ---
+RUPEE_AMOUNT = re.compile(r'₹\s*([\d,]+(?:\.\d+)?)')
+PER_PERSON_AMOUNT = re.compile(r'₹\s*([\d,]+(?:\.\d+)?)\s*(?:/\s*|per\s+|a\s+)(?:person|head|pax)', re.IGNORECASE)
+
+# --- Text cleanup ---
+TITLE_SUFFIX = re.compile(r'\|.*$| - .*$|')
+WHITESPACE = re.compile(r'\s+')
+CONTROL_WHITESPACE = re.compile(r'[\r\n\t]+')
+MULTI_SPACE = re.compile(r'\s{2,}')
+
+# --- Query location extraction (query_canon.parse_query) ---
+_LOCATION_BOUNDARY = r'\b(?:menu|price|cost|review|restaurant|hotel|food|rating|$)|'
+LOCATION_PATTERNS: List[Tuple["re.Pattern", Optional[str]]] = [
+    (re.compile(r'\b(?:near|in|at)\s+((?:[A-Za-z0-9][A-Za-z0-9\s,\-]*?))(?=\s*(?:' + _LOCATION_BOUNDARY + r'))\b', re.IGNORECASE), None),
+    (re.compile(r'\b((?:[A-Za-z0-9][A-Za-z0-9\s,\-]*?))\s+area(?=\s*(?:' + _LOCATION_BOUNDARY + r'))\b', re.IGNORECASE), 'area'),
+]
+
+def match_price_range(text: str) -> Optional[Tuple[str, str]]:
+    """Return the (low, high) strings of the first price range in text, if any."""
+    match = PRICE_RANGE.search(text.lower())
+    if not match:
+        return None
+    name = match.lastgroup
+    return match.group(f'{name}_lo'), match.group(f'{name}_hi')
+
+def match_rating(text: str) -> Optional[str]:
+    """Return the first rating value found in text, if any."""
+    match = RATING.search(text.lower())
+    if not match:
+        return None
+    return match.group(f'{match.lastgroup}_value')
+
+def keyword_candidates(strings) -> List[Tuple[str, str]]:
+    """Return (original, lowercased) pairs for the strings mentioning any field keyword."""
+    candidates = []
+    for text in strings:
+        lowered = text.lower()
+        if ANY_FIELD_KEYWORD.search(lowered):
+            candidates.append((text, lowered))
+    return candidates
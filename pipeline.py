@@ -0,0 +1,222 @@
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cache import RECOMMENDATION_CACHE, STALE_WINDOW
+from google_search import perform_google_search, search_cost
+from llm_router import get_router
+from metrics import METRICS
+from name_index import resolve_restaurant
+from price_index import price_profile
+from query_canon import recommendation_key
+from records import SearchResult, format_price
+from revalidate import REVALIDATOR, format_age
+from structured_output import JSON_MAX_TOKENS, JSON_STOP_SEQUENCES, JSON_TEMPERATURE, json_format_instructions
+
+# The recommendation engine (search -> scrape -> prompt -> LLM) without Streamlit.
+# food_app.py / food_app_ss.py wrap it with the UI; replay.py and other headless
+# callers use it directly. Stage latencies are recorded in metrics.METRICS.
+
+class PipelineError(Exception):
+    """The pipeline could not produce a recommendation (bad configuration or response)."""
+
+@dataclass
+class Served:
+    """A recommendation as served: fresh, cached, or stale while a background refresh runs."""
+    text: str
+    age: float = 0.0  # seconds since it was generated
+    stale: bool = False
+    error: bool = False  # text is an error message for the user, not a completion
+
+    def footer(self) -> str:
+        """Card footer describing how old the recommendation is ('' when just generated)."""
+        if self.age < 60 and not self.stale:
+            return ''
+        return f"🕒 Updated {format_age(self.age)}{' · refreshing in the background' if self.stale else ''}"
+
+def format_search_info(search_results: List[SearchResult]) -> str:
+    """Render search results (and their scraped details) for the prompt."""
+    search_info = "\nSearch Results:\n"
+    for result in search_results:
+        search_info += f"\nTitle: {result.title}\n"
+        search_info += f"Link: {result.link}\n"
+        search_info += f"Snippet: {result.snippet}\n"
+        info = result.info
+        if info:
+            if info.name:
+                search_info += f"Restaurant: {info.name}\n"
+            if info.cuisine:
+                search_info += f"Cuisine: {info.cuisine}\n"
+            if info.price_range:
+                search_info += f"Price Range: {info.price_range}\n"
+            estimate = price_profile(info, result.snippet).estimate_per_person()
+            if estimate is not None:
+                search_info += f"Estimated Cost Per Person (normalized): ₹{format_price(round(estimate))}\n"
+            if info.specialties:
+                search_info += f"Specialties: {info.specialties}\n"
+        search_info += "-" * 50 + "\n"
+    return search_info
+
+def search(search_query: str, num_results: int = 5, max_cache_age: Optional[float] = None) -> Tuple[List[SearchResult], str]:
+    """Run the search/scrape stage. Returns (results, prompt-ready search info)."""
+    with METRICS.timed('stage.search'):
+        search_results = perform_google_search(search_query, num_results=num_results, max_cache_age=max_cache_age)
+    return search_results, format_search_info(search_results)
+
+def search_restaurant(restaurant: str, location: Optional[str], search_query: str,
+                      num_results: int = 5) -> Tuple[List[SearchResult], str]:
+    """
+    Search stage for a specific restaurant: its cached menu data if the fuzzy name
+    index (name_index.py) knows it, otherwise a web search for search_query.
+    """
+    match = resolve_restaurant(restaurant, location)
+    if match is None:
+        return search(search_query, num_results=num_results)
+    print(f"Restaurant '{restaurant}' resolved locally to {match.name} ({match.link}, score {match.score})")
+    result = SearchResult(title=match.name, link=match.link, snippet='', query_location=location or 'Bangalore',
+                          query_location_type='in', info=match.info)
+    return [result], format_search_info([result])
+
+def build_prompt(food_type: str, budget: float, num_people: int, restaurant: Optional[str],
+                 location: Optional[str], search_info: str, json_mode: bool = False) -> str:
+    """The food_app.py recommendation prompt."""
+    prompt = f"""You are a food recommendation expert. Your task is to suggest the best food combinations that fit within the user's budget.
+
+CORE REQUIREMENTS:
+1. Focus on suggesting food combinations that:
+   - Match the user's food type preference
+   - Stay within the specified budget of ₹{budget} for {num_people} people
+   - Are available at restaurants in the specified location
+
+2. For each recommendation, calculate and show:
+   - Total cost for the combination
+   - Cost per person
+   - Whether it fits within the budget
+
+3. Prioritize restaurants that:
+   - Have clear pricing information
+   - Offer good value for money
+   - Have confirmed menu items and prices
+
+User Criteria:
+- Food Type: {food_type}
+- Budget: ₹{budget} for {num_people} people
+- Location: {location or 'Bangalore'}
+- Specific Restaurant: {restaurant if restaurant else 'Any'}
+
+Search Results:
+{search_info}
+
+"""
+    if json_mode:
+        prompt += json_format_instructions(budget, num_people)
+    else:
+        prompt += f"""For each recommended combination, provide in this exact format:
+🏪 Restaurant Name
+📍 Location
+💰 Total Cost: ₹X (₹Y per person)
+🍽️ Recommended Combination:
+   - Item 1: ₹X
+   - Item 2: ₹Y
+   - Item 3: ₹Z
+   Total: ₹T
+✨ Why This Combo: (explain why this combination is good value)
+🎁 Special Offers: (if any)
+
+Separate each recommendation with "---"."""
+    return prompt
+
+def build_payload(prompt: str, json_mode: bool = False) -> Dict[str, Any]:
+    """Completions request body (the router adds 'model')."""
+    payload = {
+        "prompt": prompt,
+        "max_tokens": 1024,
+        "temperature": 0.7,
+    }
+    if json_mode:
+        # Compact JSON needs far fewer tokens; stop as soon as the object line ends
+        payload.update(max_tokens=JSON_MAX_TOKENS, temperature=JSON_TEMPERATURE, stop=JSON_STOP_SEQUENCES)
+    return payload
+
+def complete(api_key: Optional[str], payload: Dict[str, Any], restaurant: Optional[str] = None) -> str:
+    """
+    Run the Together AI call via the model router (tiers, timeouts, hedging; see llm_router.py).
+
+    Returns:
+        str: The completion text.
+
+    Raises:
+        PipelineError: If the API key is missing or the response has no text.
+        requests.exceptions.RequestException: If every model tier failed.
+    """
+    if not api_key:
+        raise PipelineError("TOGETHER_API_KEY is missing.")
+    with METRICS.timed('stage.llm'):
+        llm_response = get_router(api_key).complete(payload, restaurant=restaurant)
+    print(f"LLM answered by {llm_response.model} ({llm_response.tier}) in {llm_response.latency:.1f}s"
+          f"{' after hedging' if llm_response.hedged else ''}")
+
+    response_data = llm_response.data
+    if not (response_data and 'choices' in response_data and response_data['choices']):
+        raise PipelineError("Unexpected response format from Together AI.")
+    recommendation_text = response_data['choices'][0].get('text', '').strip()
+    if not recommendation_text:
+        raise PipelineError("Could not extract text from API response.")
+    return recommendation_text
+
+def serve_recommendation(request: Dict[str, Any], compute: Callable[[], str], num_results: int = 5) -> Served:
+    """
+    Stale-while-revalidate for whole recommendations.
+
+    Args:
+        request: The user-facing parameters (app, food type, budget, ...); canonicalized into the
+                 cache key (query_canon.recommendation_key, which buckets the budget), so pass
+                 the user's own budget.
+        compute: Runs the search/LLM path and returns the recommendation text (raises on failure).
+        num_results: Search results compute() asks for; sizes the Custom Search quota a background
+                     refresh may spend (google_search.search_cost).
+
+    Returns:
+        Served: The cached text if fresh; the stale text (up to FOOD_STALE_WINDOW past
+                FOOD_RECOMMENDATION_TTL) with compute() re-run in the background; else compute().
+    """
+    cache_key = recommendation_key(request)
+
+    def refresh() -> str:
+        text = compute()
+        RECOMMENDATION_CACHE.set(cache_key, text)
+        return text
+
+    cached = RECOMMENDATION_CACHE.lookup(cache_key, stale_window=STALE_WINDOW)
+    if cached is not None:
+        if cached.stale:
+            # One LLM call and possibly an uncached search (all pages, fan-out variants); the revalidator bounds both
+            REVALIDATOR.schedule(('recommendation', cache_key), refresh, cost=search_cost(num_results))
+        METRICS.incr('recommendation.stale' if cached.stale else 'recommendation.cached')
+        return Served(cached.value, cached.age, cached.stale)
+    return Served(refresh())
+
+def recommend(food_type: str, budget: float, num_people: int, restaurant: Optional[str] = None,
+              location: Optional[str] = None, json_mode: bool = False, api_key: Optional[str] = None,
+              num_results: int = 5) -> str:
+    """
+    Generate food recommendations (the food_app.py flow) end to end.
+
+    Args:
+        food_type (str): Type of food, e.g. "biryani".
+        budget (float): Total budget in rupees.
+        num_people (int): Number of people.
+        restaurant (str): Specific restaurant, if any (routes to the large model tier).
+        location (str): Locality (default: Bangalore).
+        json_mode (bool): Ask for compact JSON (see structured_output.py) instead of emoji cards.
+        api_key (str): Together AI key (default: $TOGETHER_API_KEY).
+        num_results (int): Search results to use.
+
+    Returns:
+        str: Raw recommendation text, for card_parser / structured_output.
+    """
+    with METRICS.timed('stage.recommend'):
+        search_query = f"Best {food_type} {location or 'Bangalore'}"
+        _, search_info = search(search_query, num_results=num_results)
+        prompt = build_prompt(food_type, budget, num_people, restaurant, location, search_info, json_mode)
+        return complete(api_key or os.getenv("TOGETHER_API_KEY"), build_payload(prompt, json_mode), restaurant)
@@ -0,0 +1,151 @@
+"""
+Background cache pre-warmer for the search and scrape caches and the price index.
+
+Runs the same searches the app issues ("Best {food} {location}") for the most
+requested (locality x cuisine) pairs, so lunch- and dinner-peak queries are
+answered from cache.py instead of the Custom Search API and live scraping.
+Pairs are learned from the query log (FOOD_QUERY_LOG, see query_log.py);
+without a log it falls back to the known localities crossed with common
+cuisines. Each run stops before it would exceed --budget Custom Search API
+calls.
+
+Usage:
+    python prewarm.py --once --budget 40
+    python prewarm.py --at 11:15,18:45 --budget 80 --top 25
+    FOOD_QUERY_LOG=logs/queries.jsonl python prewarm.py --interval 3600
+"""
+import argparse
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from google_search import KNOWN_LOCALITIES, api_usage, perform_google_search, search_cost
+from cache import SEARCH_CACHE, SCRAPE_CACHE
+from price_index import load_or_build
+from query_canon import parse_query
+from query_log import read_queries
+from quota import QUOTA, describe, priority
+
+DEFAULT_CUISINES = ['biryani', 'pizza', 'south indian', 'north indian', 'chinese', 'burger', 'cafe']
+DEFAULT_PEAK_TIMES = '11:15,18:45'  # ahead of the lunch and dinner peaks
+# Search cache keys are canonical (query_canon.py), so any phrasing of the app's query hits these entries
+QUERY_TEMPLATE = "Best {food} {location}"
+
+def _pair_from_record(record: Dict) -> Optional[Tuple[str, str]]:
+    """Derive a canonical (locality, cuisine) pair from one query-log record, or None."""
+    query = str(record.get('query') or '')
+    if not query:
+        query = f"{record.get('food_type') or ''} in {record.get('location') or 'Bangalore'}"
+    parsed = parse_query(query, verbose=False)
+    food = parsed.base_query
+    # Long free-form queries do not generalize to other users; skip them
+    if not parsed.locality or food == 'food' or len(food.split()) > 3:
+        return None
+    return parsed.locality, food
+
+def load_pairs(log_path: Optional[str], top: int) -> List[Tuple[str, str]]:
+    """Top (locality, cuisine) pairs by frequency in the query log, falling back to defaults."""
+    counts = Counter()
+    if log_path and os.path.exists(log_path):
+        for record in read_queries(log_path):
+            pair = _pair_from_record(record)
+            if pair:
+                counts[pair] += 1
+        print(f"Loaded {sum(counts.values())} usable queries ({len(counts)} pairs) from {log_path}")
+    if counts:
+        return [pair for pair, _ in counts.most_common(top)]
+    print("No query log data, using known localities x default cuisines")
+    pairs = [(location, food) for food in DEFAULT_CUISINES for location in KNOWN_LOCALITIES]
+    return pairs[:top]
+
+def warm(pairs: List[Tuple[str, str]], budget: int, num_results: int = 5,
+         max_age: float = 2 * 3600, min_priced_results: int = 3) -> Dict[str, int]:
+    """
+    Pre-run searches (and their scrapes) for the given pairs within an API call budget.
+
+    Args:
+        pairs (list): (locality, cuisine) pairs, most important first.
+        budget (int): Maximum Custom Search API calls for this run.
+        num_results (int): Results per search; must match the app for its requests to hit the cache.
+        max_age (float): Entries younger than this are left alone, older ones are refreshed.
+        min_priced_results (int): Passed through to perform_google_search.
+
+    Returns:
+        dict: Counts of warmed, skipped (budget or quota) and failed pairs plus API calls used.
+    """
+    # Worst case per search: every result page, a 400 retry and the fan-out variants (SEARCH_FANOUT)
+    max_calls_per_search = search_cost(num_results)
+    start_calls = api_usage['cse_calls']
+    stats = {'warmed': 0, 'skipped': 0, 'failed': 0, 'cse_calls': 0}
+    for location, food in pairs:
+        used = api_usage['cse_calls'] - start_calls
+        if used + max_calls_per_search > budget or not QUOTA.available(max_calls_per_search, 'prefetch'):
+            stats['skipped'] += 1
+            continue
+        query = QUERY_TEMPLATE.format(food=food, location=location.title())
+        try:
+            with priority('prefetch'):
+                results = perform_google_search(query, num_results=num_results,
+                                                min_priced_results=min_priced_results, max_cache_age=max_age)
+        except Exception as e:
+            print(f"Pre-warm failed for '{query}': {str(e)}")
+            results = []
+        stats['warmed' if results else 'failed'] += 1
+    stats['cse_calls'] = api_usage['cse_calls'] - start_calls
+    return stats
+
+def next_run(times: List[str], now: datetime) -> datetime:
+    """Next occurrence of any HH:MM in `times` after `now`."""
+    candidates = []
+    for value in times:
+        hour, minute = (int(part) for part in value.split(':'))
+        run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        candidates.append(run if run > now else run + timedelta(days=1))
+    return min(candidates)
+
+def run_once(args) -> None:
+    pairs = load_pairs(args.query_log, args.top)
+    started = time.monotonic()
+    stats = warm(pairs, args.budget, args.num_results, args.max_age)
+    # Rebuild the price index over everything now in the scrape cache
+    index = load_or_build(max_age=0)
+    print(f"Pre-warm finished in {time.monotonic() - started:.1f}s: {stats['warmed']} warmed, "
+          f"{stats['failed']} failed, {stats['skipped']} skipped (budget/quota), {stats['cse_calls']}/{args.budget} API calls; "
+          f"cache hit ratio search {SEARCH_CACHE.hit_ratio():.0%}, scrape {SCRAPE_CACHE.hit_ratio():.0%}; "
+          f"price index {len(index)} restaurants")
+    print(describe(QUOTA.snapshot()))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=int, default=50, help='max Custom Search API calls per run (default: 50)')
+    parser.add_argument('--top', type=int, default=30, help='number of (locality, cuisine) pairs to warm (default: 30)')
+    parser.add_argument('--query-log', default=os.getenv('FOOD_QUERY_LOG'), help='JSON-lines query log (default: $FOOD_QUERY_LOG)')
+    parser.add_argument('--num-results', type=int, default=5, help='results per search, as requested by the app (default: 5)')
+    parser.add_argument('--max-age', type=float, default=2 * 3600, help='refresh entries older than this many seconds (default: 7200)')
+    schedule = parser.add_mutually_exclusive_group()
+    schedule.add_argument('--once', action='store_true', help='run a single pass now and exit')
+    schedule.add_argument('--at', default=DEFAULT_PEAK_TIMES, help=f'daily HH:MM run times (default: {DEFAULT_PEAK_TIMES})')
+    schedule.add_argument('--interval', type=float, help='run every N seconds instead of at fixed times')
+    args = parser.parse_args()
+
+    if args.once:
+        run_once(args)
+        return
+    times = [value.strip() for value in args.at.split(',') if value.strip()]
+    try:
+        while True:
+            if args.interval:
+                run_once(args)
+                time.sleep(args.interval)
+                continue
+            run_at = next_run(times, datetime.now())
+            print(f"Next pre-warm run at {run_at:%Y-%m-%d %H:%M}")
+            time.sleep(max(0.0, (run_at - datetime.now()).total_seconds()))
+            run_once(args)
+    except KeyboardInterrupt:
+        print("Pre-warm scheduler stopped")
+
+if __name__ == "__main__":
+    main()
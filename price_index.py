@@ -0,0 +1,236 @@
+import os
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import patterns
+from cache import SCRAPE_CACHE, DEFAULT_CACHE_PATH
+from records import MenuItem, RestaurantInfo
+
+# Price normalization and a columnar menu price index.
+# Scraped prices arrive as strings in several places (extract_price_range's
+# "₹100 - ₹500", menu item prices in ₹/$/€/£, free-text price_range blobs like
+# "Cost for two: ₹1,200"). normalize_* turns them into numeric INR and detect
+# whether a price is per person or for two. PriceIndex keeps one
+# row per cached restaurant in NumPy float columns, so "under ₹X for N people"
+# is a vectorized mask and argsort instead of a question for the LLM.
+#
+# FOOD_FX_RATES overrides the conversion rates, e.g. "USD=83.5,EUR=91".
+
+FX_TO_INR: Dict[str, float] = {'INR': 1.0, 'USD': 83.0, 'EUR': 90.0, 'GBP': 105.0}
+
+_CURRENCY_CODES = {'₹': 'INR', 'rs': 'INR', 'rs.': 'INR', 'inr': 'INR', '$': 'USD', 'usd': 'USD',
+                   '€': 'EUR', 'eur': 'EUR', '£': 'GBP', 'gbp': 'GBP'}
+
+# Characters either side of an amount searched for "for two" / "per person"
+BASIS_WINDOW = 40
+
+PRICE_INDEX_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), 'price_index.npz')
+
+def fx_rates() -> Dict[str, float]:
+    rates = dict(FX_TO_INR)
+    for entry in os.getenv('FOOD_FX_RATES', '').split(','):
+        code, _, rate = entry.partition('=')
+        try:
+            rates[code.strip().upper()] = float(rate)
+        except ValueError:
+            continue
+    return rates
+
+def currency_code(symbol: str) -> str:
+    """ISO code for a currency symbol or abbreviation ('₹', 'Rs.', '$', ...); defaults to INR."""
+    return _CURRENCY_CODES.get(symbol.strip().lower(), 'INR')
+
+def to_inr(amount: float, currency: str = 'INR') -> Optional[float]:
+    """Convert an amount given in an ISO code or symbol to INR; None for unknown currencies."""
+    rates = fx_rates()
+    code = currency.strip().upper()
+    rate = rates.get(code if code in rates else currency_code(currency))
+    return round(amount * rate, 2) if rate is not None else None
+
+@dataclass(slots=True)
+class PriceQuote:
+    """A normalized price: INR bounds plus what they refer to."""
+    low: float
+    high: float
+    basis: str  # 'per_person', 'for_two' or 'unknown'
+    currency: str  # ISO code of the source text
+
+    def per_person(self) -> Tuple[float, float]:
+        """Bounds per person. Unknown basis counts as per person, which never under-estimates."""
+        if self.basis == 'for_two':
+            return self.low / 2, self.high / 2
+        return self.low, self.high
+
+def _basis(lowered: str, start: int, end: int) -> str:
+    window = lowered[max(0, start - BASIS_WINDOW):end + BASIS_WINDOW]
+    if patterns.PRICE_FOR_TWO.search(window):
+        return 'for_two'
+    if patterns.PRICE_PER_PERSON.search(window):
+        return 'per_person'
+    return 'unknown'
+
+def normalize_price_text(text: str) -> Optional[PriceQuote]:
+    """
+    Normalize a free-text price ("₹300 - ₹600 for two", "$12 per person", "Cost for two: ₹1,200").
+
+    Returns:
+        Optional[PriceQuote]: None if the text carries no recognizable amount.
+    """
+    if not text:
+        return None
+    lowered = text.lower()
+    price_range = patterns.PRICE_RANGE.search(lowered)
+    if price_range:
+        name = price_range.lastgroup
+        low, high = float(price_range.group(f'{name}_lo')), float(price_range.group(f'{name}_hi'))
+        return PriceQuote(min(low, high), max(low, high), _basis(lowered, *price_range.span()), 'INR')
+
+    # Otherwise the first one or two currency amounts ("₹300 to ₹600", "$12")
+    amounts = []
+    for match in patterns.CURRENCY_AMOUNT.finditer(lowered):
+        code = currency_code(match.group('currency'))
+        value = to_inr(float(match.group('amount').replace(',', '')), code)
+        if value is not None and value > 0:
+            amounts.append((value, code, match.span()))
+        if len(amounts) == 2:
+            break
+    if not amounts:
+        return None
+    if len(amounts) == 2 and amounts[1][1] == amounts[0][1] and amounts[1][2][0] - amounts[0][2][1] <= 6:
+        (low, code, (start, _)), (high, _, (_, end)) = amounts
+    else:
+        (low, code, (start, end)) = amounts[0]
+        high = low
+    return PriceQuote(min(low, high), max(low, high), _basis(lowered, start, end), code)
+
+def normalize_menu_item(item: MenuItem) -> Optional[float]:
+    """Menu item price in INR (None if unpriced or in an unknown currency)."""
+    if item.price is None:
+        return None
+    return to_inr(item.price, currency_code(item.currency or '₹'))
+
+@dataclass(slots=True)
+class PriceProfile:
+    """Numeric price summary of one restaurant (INR, None when unknown)."""
+    per_person_low: Optional[float] = None
+    per_person_high: Optional[float] = None
+    menu_min: Optional[float] = None
+    menu_median: Optional[float] = None
+    menu_count: int = 0
+
+    def estimate_per_person(self) -> Optional[float]:
+        """Best guess of what one person spends: the listed per-person floor, else a median dish."""
+        return self.per_person_low if self.per_person_low is not None else self.menu_median
+
+def price_profile(info: RestaurantInfo, snippet: str = '') -> PriceProfile:
+    """Combine a restaurant's price range text, menu prices and search snippet into a PriceProfile."""
+    profile = PriceProfile()
+    quote = normalize_price_text(info.price_range) or normalize_price_text(snippet)
+    if quote is not None:
+        profile.per_person_low, profile.per_person_high = quote.per_person()
+    prices = sorted(price for price in map(normalize_menu_item, info.menu_items) if price is not None)
+    if prices:
+        profile.menu_min = prices[0]
+        profile.menu_median = statistics.median(prices)
+        profile.menu_count = len(prices)
+    return profile
+
+@dataclass(slots=True)
+class IndexHit:
+    name: str
+    link: str
+    location: str
+    per_person: float
+    total: float
+
+_TEXT_COLUMNS = ('names', 'links', 'locations')
+_NUMBER_COLUMNS = ('per_person_low', 'per_person_high', 'menu_min', 'menu_median', 'estimate')
+
+class PriceIndex:
+    """Columnar price index: one row per restaurant, NaN where a price is unknown."""
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+        self._locations_lower = np.char.lower(columns['locations'])
+
+    def __len__(self) -> int:
+        return len(self.columns['names'])
+
+    @classmethod
+    def build(cls, entries: Iterable[Tuple[str, RestaurantInfo]]) -> "PriceIndex":
+        """Build from (link, RestaurantInfo) pairs; restaurants without any usable price are skipped."""
+        rows = {name: [] for name in _TEXT_COLUMNS + _NUMBER_COLUMNS}
+        for link, info in entries:
+            profile = price_profile(info)
+            estimate = profile.estimate_per_person()
+            if estimate is None:
+                continue
+            rows['names'].append(info.name or link)
+            rows['links'].append(link)
+            rows['locations'].append(info.location or '')
+            rows['per_person_low'].append(profile.per_person_low)
+            rows['per_person_high'].append(profile.per_person_high)
+            rows['menu_min'].append(profile.menu_min)
+            rows['menu_median'].append(profile.menu_median)
+            rows['estimate'].append(estimate)
+        columns = {name: np.array(rows[name], dtype=str) for name in _TEXT_COLUMNS}
+        columns.update({name: np.array([np.nan if v is None else v for v in rows[name]], dtype=np.float64)
+                        for name in _NUMBER_COLUMNS})
+        return cls(columns)
+
+    @classmethod
+    def from_cache(cls, cache=SCRAPE_CACHE) -> "PriceIndex":
+        """Index every unexpired scraped restaurant in the shared cache."""
+        return cls.build((link, RestaurantInfo.from_dict(data)) for link, data in cache.items())
+
+    def query(self, budget: float, num_people: int = 1, location: Optional[str] = None,
+              limit: Optional[int] = None, descending: bool = False) -> List[IndexHit]:
+        """
+        Restaurants whose estimated cost for num_people fits the budget, cheapest first.
+
+        Args:
+            budget (float): Total budget in INR.
+            num_people (int): Party size.
+            location (str): Case-insensitive substring the restaurant's location must contain.
+            limit (int): Maximum hits.
+            descending (bool): Most expensive (still within budget) first.
+        """
+        estimate = self.columns['estimate']
+        totals = estimate * max(1, num_people)
+        mask = totals <= budget  # NaN compares False
+        if location:
+            mask &= np.char.find(self._locations_lower, location.lower()) >= 0
+        rows = np.flatnonzero(mask)
+        order = np.argsort(totals[rows], kind='stable')
+        if descending:
+            order = order[::-1]
+        rows = rows[order[:limit] if limit else order]
+        return [IndexHit(str(self.columns['names'][i]), str(self.columns['links'][i]),
+                         str(self.columns['locations'][i]), float(estimate[i]), float(totals[i])) for i in rows]
+
+    def save(self, path: str = PRICE_INDEX_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez_compressed(path, **self.columns)
+
+    @classmethod
+    def load(cls, path: str = PRICE_INDEX_PATH) -> "PriceIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in _TEXT_COLUMNS + _NUMBER_COLUMNS})
+
+def load_or_build(max_age: float = 300, path: str = PRICE_INDEX_PATH) -> PriceIndex:
+    """The saved index if it is younger than max_age seconds, else a fresh build from the scrape cache (saved)."""
+    try:
+        if os.path.getmtime(path) >= time.time() - max_age:
+            return PriceIndex.load(path)
+    except (OSError, ValueError, KeyError):
+        pass
+    index = PriceIndex.from_cache()
+    try:
+        index.save(path)
+    except OSError as e:
+        print(f"Could not save price index {path}: {str(e)}")
+    return index
@@ -0,0 +1,446 @@
+import contextlib
+import contextvars
+import cProfile
+import html
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple
+
+from metrics import METRICS
+
+# On-demand per-request profiling.
+# A profiled request runs under a sampling profiler ('sample': a thread that
+# records the Python stacks of every other thread every FOOD_PROFILE_INTERVAL
+# ms, default 5) or cProfile ('cprofile': deterministic, the request's threads
+# only), with tracemalloc tracking the peak memory of each METRICS.timed stage.
+# Written to FOOD_PROFILE_DIR (default .cache/profiles), one set per request:
+#   <id>.collapsed  collapsed stacks ("thread;module:function;... count"), the
+#                   input format of flamegraph.pl, speedscope and inferno
+#   <id>.svg        the same as a self-contained flame graph
+#   <id>.prof       cProfile statistics (cprofile mode; snakeviz, pstats)
+#   <id>.json       summary: time per category (regex, HTML parsing, network,
+#                   LLM, ...), top-N hot functions, stage timings and memory peaks
+#
+# Switches: FOOD_PROFILE=sample|cprofile profiles every request (narrowed by
+# FOOD_PROFILE_MATCH, a case-insensitive substring of the request label, e.g.
+# the query); with FOOD_PROFILE_PARAM=1 a request can ask for it itself
+# (?profile=sample on the API server or the Streamlit apps). One request is
+# profiled at a time; others run normally meanwhile.
+#
+# Only the profiled request's own stages are recorded: the stage hook checks
+# that the profile is active in the calling context, so work for other requests
+# running meanwhile is ignored (worker threads join the request through
+# RequestProfile.run_in_thread or a copied context).
+#
+# tracemalloc has a single process-wide peak, reset as each stage starts. A
+# stage's peak is an upper bound when stages run concurrently; the request peak
+# is the highest peak seen before any of those resets or at the end, and counts
+# all memory the process traced meanwhile, other requests' included.
+#
+# When no profile is running the only cost is METRICS.timed checking that its
+# stage hook is unset; profile_request() returns a shared null context.
+
+MODES = ('sample', 'cprofile')
+DEFAULT_PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'profiles')
+SAMPLE_INTERVAL = float(os.getenv('FOOD_PROFILE_INTERVAL', 5)) / 1000.0
+TOP_N = 25
+TRACEMALLOC_FRAMES = 1
+# Leaf frames of threads waiting for work (idle pool workers, the event loop); not request time
+IDLE_FRAMES = {'threading:wait', 'selectors:select', 'queue:get', 'socketserver:serve_forever',
+               'concurrent.futures.thread:_worker'}
+
+# Stack categories, checked in order against "module:function" frames; the first match wins
+CATEGORIES: List[Tuple[str, "re.Pattern"]] = [
+    ('llm', re.compile(r'^llm_router:|^pipeline:complete$')),
+    ('network', re.compile(r'^(?:socket|ssl|http\.client|urllib3\.|requests\.|aiohttp\.):')),
+    ('html parsing', re.compile(r'^(?:bs4\.|html\.parser|_markupbase|incremental_extract|site_extractors|soupsieve\.)')),
+    ('regex', re.compile(r'^(?:re|sre_\w+|re\._\w+):')),
+    ('cache', re.compile(r'^(?:sqlite3\.|cache|cache_backends|snapshot_store|marshal|json(?:\.\w+)?:)')),
+    # Sleeps and lock waits outside the stages above; only cProfile sees C functions
+    ('waiting', re.compile(r'^builtins:<(?:built-in method time\.sleep|method .acquire. of ._thread\.)')),
+]
+
+_NULL = contextlib.nullcontext()
+_lock = threading.Lock()
+_active: "contextvars.ContextVar[Optional[RequestProfile]]" = contextvars.ContextVar('request_profile', default=None)
+
+def active_profile() -> "Optional[RequestProfile]":
+    """The profile of the request running in this context (None when it is not profiled)."""
+    return _active.get()
+
+def profile_dir() -> str:
+    return os.getenv('FOOD_PROFILE_DIR', DEFAULT_PROFILE_DIR)
+
+def requested_mode(param: Optional[str] = None, label: str = '') -> Optional[str]:
+    """
+    The profiler mode for one request, or None: the request's own ?profile= value when
+    FOOD_PROFILE_PARAM allows it, else FOOD_PROFILE (if FOOD_PROFILE_MATCH matches label).
+    """
+    if param and os.getenv('FOOD_PROFILE_PARAM', '').strip().lower() in ('1', 'true', 'yes', 'on'):
+        return param if param in MODES else 'sample'
+    mode = os.getenv('FOOD_PROFILE', '').strip().lower()
+    if not mode or mode in ('0', 'off', 'false', 'no'):
+        return None
+    match = os.getenv('FOOD_PROFILE_MATCH', '').strip().lower()
+    if match and match not in label.lower():
+        return None
+    return mode if mode in MODES else 'sample'
+
+def _frame_name(frame) -> str:
+    module = frame.f_globals.get('__name__', '?')
+    return f"{module}:{frame.f_code.co_name}"
+
+def _stack(frame) -> List[str]:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+def _module_name(filename: str) -> str:
+    """Dotted module name for a source file on sys.path ('.../http/client.py' -> 'http.client')."""
+    if filename == '~':
+        return 'builtins'
+    for root in sorted((path for path in sys.path if path), key=len, reverse=True):
+        root = os.path.abspath(root)
+        if filename.startswith(root + os.sep):
+            module = os.path.splitext(filename[len(root) + 1:])[0].replace(os.sep, '.')
+            return module[:-len('.__init__')] if module.endswith('.__init__') else module
+    return os.path.splitext(os.path.basename(filename))[0]
+
+def categorize(stack: List[str]) -> str:
+    for category, pattern in CATEGORIES:
+        if any(pattern.search(frame) for frame in stack):
+            return category
+    return 'other'
+
+class _StageSpan:
+    """A METRICS.timed block inside a profiled request: wall time and tracemalloc peak above its start."""
+
+    def __init__(self, profile: "RequestProfile", name: str):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        current, peak = tracemalloc.get_traced_memory()
+        self.profile._note_peak(peak)
+        stack = self.profile._span_stack()
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        stack.append([current, current])
+        tracemalloc.reset_peak()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        _, peak = tracemalloc.get_traced_memory()
+        stack = self.profile._span_stack()
+        start, span_peak = stack.pop()
+        span_peak = max(span_peak, peak)
+        if stack:
+            stack[-1][1] = max(stack[-1][1], span_peak)
+        with self.profile._stages_lock:
+            stats = self.profile.stages.setdefault(self.name, {'count': 0, 'seconds': 0.0, 'peak_kb': 0.0})
+            stats['count'] += 1
+            stats['seconds'] += elapsed
+            stats['peak_kb'] = max(stats['peak_kb'], (span_peak - start) / 1024)
+        return False
+
+class RequestProfile:
+    """One profiled request; use via profile_request()."""
+
+    def __init__(self, label: str, mode: str, output_dir: Optional[str] = None, in_workers: bool = False):
+        self.label = label
+        self.mode = mode
+        self.in_workers = in_workers
+        self.output_dir = output_dir or profile_dir()
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.samples: Counter = Counter()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.report: Dict[str, Any] = {}
+        self._spans = threading.local()
+        self._stages_lock = threading.Lock()
+        # cProfile keeps one call stack per Profile, so each thread gets its own: (thread name, profiler)
+        self._profilers: List[Tuple[str, cProfile.Profile]] = []
+        self._own_profiler: Optional[cProfile.Profile] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._started_tracemalloc = False
+        self.peak = 0
+
+    def _note_peak(self, peak: int) -> None:
+        """Fold tracemalloc's peak into the request peak before a stage resets it."""
+        with self._stages_lock:
+            self.peak = max(self.peak, peak)
+
+    def _stage_hook(self, name: str) -> ContextManager:
+        """METRICS.stage_hook: a span for this request's stages, nothing for other requests'."""
+        return _StageSpan(self, name) if _active.get() is self else _NULL
+
+    def _span_stack(self) -> List[List[int]]:
+        """Open stages of the current thread as [traced memory at entry, peak seen so far]."""
+        stack = getattr(self._spans, 'stack', None)
+        if stack is None:
+            stack = self._spans.stack = []
+        return stack
+
+    # --- Sampling ---
+    def _sample_loop(self) -> None:
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = _stack(frame)
+                if stack and stack[-1] in IDLE_FRAMES:
+                    continue
+                self.samples[(names.get(ident, str(ident)),) + tuple(stack)] += 1
+
+    # --- Lifecycle ---
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        METRICS.stage_hook = self._stage_hook
+        self.started = time.perf_counter()
+        if self.mode == 'cprofile':
+            if not self.in_workers:
+                self._own_profiler = self._new_profiler()
+                self._own_profiler.enable()
+        else:
+            self._sampler = threading.Thread(target=self._sample_loop, name='profile-sampler', daemon=True)
+            self._sampler.start()
+
+    def _new_profiler(self) -> cProfile.Profile:
+        profiler = cProfile.Profile()
+        with self._stages_lock:
+            self._profilers.append((threading.current_thread().name, profiler))
+        return profiler
+
+    def run_in_thread(self, func: Callable, *args, **kwargs) -> Any:
+        """Call func (on a worker thread) as part of this request; cProfile only sees threads enabled this way."""
+        token = _active.set(self)
+        try:
+            if self.mode != 'cprofile':
+                return func(*args, **kwargs)
+            profiler = self._new_profiler()
+            profiler.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.disable()
+        finally:
+            _active.reset(token)
+
+    def stop(self) -> None:
+        self.wall = time.perf_counter() - self.started
+        if self._own_profiler is not None:
+            self._own_profiler.disable()
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+        METRICS.stage_hook = None
+        self._note_peak(tracemalloc.get_traced_memory()[1])
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+    # --- Output ---
+    def _stats(self) -> Optional[pstats.Stats]:
+        """All threads' cProfile statistics merged (None if nothing was profiled)."""
+        if not self._profilers:
+            return None
+        return pstats.Stats(*(profiler for _, profiler in self._profilers))
+
+    def _cprofile_samples(self) -> Counter:
+        """Approximate collapsed stacks from cProfile's caller graphs (self time in microseconds)."""
+        def name(func):
+            filename, _, function = func
+            return f"{_module_name(filename)}:{function}"
+        samples: Counter = Counter()
+        for thread_name, profiler in self._profilers:
+            stats = pstats.Stats(profiler).stats
+            for func, (_, _, self_time, _, _) in stats.items():
+                # One representative path per function: follow the heaviest caller upwards
+                path, current, seen = [name(func)], func, {func}
+                while True:
+                    parents = stats.get(current, (0, 0, 0, 0, {}))[4]
+                    if not parents:
+                        break
+                    current = max(parents, key=lambda parent: parents[parent][3])
+                    if current in seen:
+                        break
+                    seen.add(current)
+                    path.append(name(current))
+                if self_time > 0:
+                    samples[(thread_name,) + tuple(reversed(path))] += int(self_time * 1e6) or 1
+        return samples
+
+    def _top_functions(self, samples: Counter) -> List[Dict[str, Any]]:
+        if self.mode == 'cprofile':
+            stats = self._stats()
+            if stats is None:
+                return []
+            rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP_N]
+            return [{'function': f"{os.path.basename(func[0])}:{func[1]}:{func[2]}", 'calls': row[1],
+                     'self_s': round(row[2], 4), 'cumulative_s': round(row[3], 4)} for func, row in rows]
+        total = sum(samples.values()) or 1
+        own, inclusive = Counter(), Counter()
+        for stack, count in samples.items():
+            own[stack[-1]] += count
+            for frame in set(stack[1:]):
+                inclusive[frame] += count
+        return [{'function': frame, 'self_pct': round(100 * count / total, 1),
+                 'inclusive_pct': round(100 * inclusive[frame] / total, 1)} for frame, count in own.most_common(TOP_N)]
+
+    def write(self) -> Dict[str, Any]:
+        """Write the collapsed stacks, flame graph, summary (and .prof) files; returns the summary."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, self.id)
+        samples = self._cprofile_samples() if self.mode == 'cprofile' else self.samples
+        with open(f"{base}.collapsed", 'w', encoding='utf-8') as f:
+            for stack, count in samples.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+        with open(f"{base}.svg", 'w', encoding='utf-8') as f:
+            f.write(flamegraph_svg(samples, title=f"{self.label} ({self.mode}, {self.wall * 1000:.0f} ms)"))
+        files = [f"{base}.collapsed", f"{base}.svg"]
+        stats = self._stats() if self.mode == 'cprofile' else None
+        if stats is not None:
+            stats.dump_stats(f"{base}.prof")
+            files.append(f"{base}.prof")
+
+        total = sum(samples.values()) or 1
+        categories = Counter()
+        for stack, count in samples.items():
+            categories[categorize(list(stack[1:]))] += count
+        self.report = {
+            'id': self.id,
+            'label': self.label,
+            'mode': self.mode,
+            'wall_ms': round(self.wall * 1000, 1),
+            'samples': sum(self.samples.values()) if self.mode == 'sample' else None,
+            'categories_pct': {name: round(100 * count / total, 1) for name, count in categories.most_common()},
+            'top': self._top_functions(samples),
+            'stages': {name: {'count': stats['count'], 'ms': round(stats['seconds'] * 1000, 1),
+                              'peak_kb': round(stats['peak_kb'], 1)}
+                       for name, stats in sorted(self.stages.items())},
+            'peak_kb': round(self.peak / 1024, 1),
+            'files': files + [f"{base}.json"],
+        }
+        with open(f"{base}.json", 'w', encoding='utf-8') as f:
+            json.dump(self.report, f, indent=2)
+        return self.report
+
+def summary_lines(report: Dict[str, Any], top: int = 10) -> List[str]:
+    """Human-readable profile summary for logs."""
+    lines = [f"Profile {report['id']} ({report['mode']}) of '{report['label']}': {report['wall_ms']:.0f} ms, "
+             f"peak traced memory {report['peak_kb']:.0f} KB",
+             "  time by category: " + ', '.join(f"{name} {pct:.0f}%" for name, pct in report['categories_pct'].items())]
+    for name, stats in report['stages'].items():
+        lines.append(f"  {name:<20} x{stats['count']:<3} {stats['ms']:>8.1f} ms  peak +{stats['peak_kb']:.0f} KB")
+    lines.append("  hot functions:")
+    for row in report['top'][:top]:
+        detail = (f"self {row['self_pct']}% incl {row['inclusive_pct']}%" if 'self_pct' in row
+                  else f"self {row['self_s'] * 1000:.1f} ms cum {row['cumulative_s'] * 1000:.1f} ms x{row['calls']}")
+        lines.append(f"    {row['function']}  {detail}")
+    lines.append(f"  files: {', '.join(report['files'])}")
+    return lines
+
+@contextlib.contextmanager
+def _profiled(label: str, mode: str, output_dir: Optional[str], in_workers: bool):
+    if not _lock.acquire(blocking=False):
+        print(f"Profiling busy, not profiling '{label}'")
+        yield None
+        return
+    profile = RequestProfile(label, mode, output_dir, in_workers)
+    token = _active.set(profile)
+    try:
+        profile.start()
+        try:
+            yield profile
+        finally:
+            profile.stop()
+            _active.reset(token)
+            # Also for failed requests: those are often the slow ones
+            try:
+                for line in summary_lines(profile.write()):
+                    print(line)
+                METRICS.incr('profile.requests')
+            except OSError as e:
+                print(f"Could not write profile {profile.id}: {str(e)}")
+    finally:
+        _lock.release()
+
+def profile_request(label: str, mode: Optional[str] = None, output_dir: Optional[str] = None,
+                    in_workers: bool = False) -> ContextManager:
+    """
+    Profile the with-block as one request when mode is set (see requested_mode); otherwise a
+    shared no-op context. The block receives the RequestProfile (or None), whose .report holds
+    the summary after the block.
+
+    With in_workers, cProfile only covers calls made through RequestProfile.run_in_thread: for
+    async callers, whose own thread is an event loop shared with other requests.
+    """
+    if not mode:
+        return _NULL
+    return _profiled(label, mode, output_dir, in_workers)
+
+# --- Flame graph ---
+FLAME_WIDTH = 1200
+FLAME_ROW = 16
+_PALETTE = {'llm': '#c586c0', 'network': '#569cd6', 'html parsing': '#4ec9b0', 'regex': '#dcdcaa',
+            'cache': '#9cdcfe', 'waiting': '#d4d4d4', 'other': '#f0a35e'}
+
+def flamegraph_svg(samples: Counter, title: str = '') -> str:
+    """A self-contained SVG flame graph (root at the bottom) from collapsed stacks."""
+    tree: Dict[str, Any] = {'count': 0, 'children': {}}
+    for stack, count in samples.items():
+        node = tree
+        node['count'] += count
+        for frame in stack:
+            node = node['children'].setdefault(frame, {'count': 0, 'children': {}})
+            node['count'] += count
+
+    def depth(node) -> int:
+        return 1 + max((depth(child) for child in node['children'].values()), default=0)
+
+    total = tree['count'] or 1
+    rows = depth(tree)
+    height = (rows + 2) * FLAME_ROW
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{FLAME_WIDTH}" height="{height}" '
+             f'font-family="monospace" font-size="11">',
+             f'<text x="4" y="12">{html.escape(title)}</text>']
+
+    def draw(node, name: str, x: float, level: int, path: List[str]) -> None:
+        width = node['count'] / total * FLAME_WIDTH
+        if width < 0.5:
+            return
+        y = height - (level + 1) * FLAME_ROW
+        color = _PALETTE[categorize(path)] if level else '#bbbbbb'
+        label = html.escape(name)
+        parts.append(f'<g><title>{label} ({node["count"]}, {100 * node["count"] / total:.1f}%)</title>'
+                     f'<rect x="{x:.1f}" y="{y}" width="{width:.1f}" height="{FLAME_ROW - 1}" fill="{color}"/>')
+        if width > 40:
+            parts.append(f'<text x="{x + 2:.1f}" y="{y + 11}">{label[:int(width / 7)]}</text>')
+        parts.append('</g>')
+        offset = x
+        for child_name, child in sorted(node['children'].items()):
+            draw(child, child_name, offset, level + 1, path + [child_name])
+            offset += child['count'] / total * FLAME_WIDTH
+
+    draw(tree, 'all', 0.0, 0, [])
+    parts.append('</svg>')
+    return '\n'.join(parts)
@@ -0,0 +1,68 @@
+import ipaddress
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Fetching caller-supplied URLs (api_server.py /scrape) without reaching
+# internal hosts.
+#
+# Checking the URL's host up front is not enough: the page can redirect to a
+# private address, and the host can resolve differently by the time the fetch
+# connects (DNS rebinding). public_session() therefore checks the address each
+# connection actually reached, for the first request and every redirect hop,
+# and refuses anything that is not globally routable (loopback, RFC 1918,
+# link-local such as 169.254.169.254, ...). Environment proxies are ignored so
+# the checked address is the origin's own.
+
+class NonPublicAddress(Exception):
+    """The fetch would have connected to an address that is not publicly routable."""
+
+def is_public_address(address: Any) -> bool:
+    """Whether an IP address (string or ipaddress object) is globally routable; IPv4-mapped IPv6 is unwrapped."""
+    if isinstance(address, str):
+        address = ipaddress.ip_address(address.split('%')[0])
+    if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.is_global
+
+class _PublicOnly:
+    """Connection mixin: close the socket unless its peer is a public address."""
+
+    def _new_conn(self):
+        sock = super()._new_conn()
+        peer = sock.getpeername()[0]
+        if not is_public_address(peer):
+            sock.close()
+            raise NonPublicAddress(f"refusing to connect to non-public address {peer} ({self.host})")
+        return sock
+
+class _PublicHTTPConnection(_PublicOnly, HTTPConnection):
+    pass
+
+class _PublicHTTPSConnection(_PublicOnly, HTTPSConnection):
+    pass
+
+class _PublicHTTPPool(HTTPConnectionPool):
+    ConnectionCls = _PublicHTTPConnection
+
+class _PublicHTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _PublicHTTPSConnection
+
+class PublicOnlyAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _PublicHTTPPool, 'https': _PublicHTTPSPool}
+
+def public_session() -> requests.Session:
+    """A requests session whose connections (redirects included) may only reach public addresses."""
+    session = requests.Session()
+    session.trust_env = False
+    adapter = PublicOnlyAdapter()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+PUBLIC_SESSION = public_session()
@@ -0,0 +1,303 @@
+"""
+Canonical query normalization for cache keys.
+
+"Biryani koramangala", "biryani in Koramangala" and "best biryani near
+koramangala bangalore" are the same request. parse_query() reduces a free-text
+food query to its canonical parts (case folding and accent stripping, filler
+and stopword removal, cuisine synonyms, locality canonicalization through the
+localities.py gazetteer) and perform_google_search builds its search-cache key
+from them. The Custom Search query it sends is the same canonical form plus the
+intent words the key drops ("cheap", "best", ...), and queries in non-Latin
+scripts keep their own words. recommendation_key() does the same for whole
+recommendations, with the per-person budget bucketed (bucket_budget) so nearby
+budgets share an answer; only the key is bucketed, the prompt gets the user's
+own budget.
+
+Run as a script to measure the effect on a query log: the hit rate an
+unbounded cache would get with raw keys versus canonical keys (replay.py
+prints the same comparison).
+
+Usage:
+    python query_canon.py logs/queries.jsonl
+    python query_canon.py "best biryani near koramangala bangalore"
+"""
+import json
+import math
+import re
+import string
+import sys
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+import patterns
+from localities import find_locality, get_locality
+
+CITY_WORDS = {'bangalore', 'bengaluru', 'blr'}
+# Words that are not the food or the place: dropped from the food terms and the cache keys
+FILLER_WORDS = {
+    'near', 'in', 'at', 'around', 'area', 'menu', 'menus', 'prices', 'price', 'cost', 'costs',
+    'restaurant', 'restaurants', 'hotel', 'hotels', 'food', 'foods', 'dining', 'eat', 'eatery', 'eateries',
+    'the', 'and', 'or', 'for', 'with', 'to', 'from', 'by', 'on', 'a', 'an', 'of', 'me', 'my', 'some', 'any',
+    'reviews', 'review', 'rating', 'ratings', 'best', 'good', 'top', 'great', 'nice', 'famous', 'popular',
+    'tasty', 'cheap', 'affordable', 'place', 'places', 'spot', 'spots', 'joint', 'joints', 'options', 'list',
+} | CITY_WORDS
+# Fillers that still steer the search results: left out of cache keys, kept in the query sent
+INTENT_WORDS = {
+    'cheap', 'affordable', 'inexpensive', 'best', 'top', 'good', 'great', 'nice', 'famous', 'popular', 'tasty',
+    'menu', 'menus', 'prices', 'price', 'reviews', 'review', 'rating', 'ratings',
+}
+# Without them nothing is left of "restaurants in koramangala": keep these rather than an empty query
+WEAK_FILLERS = {'food', 'foods', 'restaurant', 'restaurants', 'hotel', 'hotels', 'dining'}
+# Pattern matches that are not places ("biryani near me")
+NOT_LOCATIONS = {'me', 'here', 'home', 'my place', 'my area'}
+
+# Spellings and plurals -> one canonical term; two-word phrases are matched first
+CUISINE_SYNONYMS = {
+    'biriyani': 'biryani', 'briyani': 'biryani', 'biriani': 'biryani', 'biryanis': 'biryani', 'biriyanis': 'biryani',
+    'pizzas': 'pizza', 'burgers': 'burger', 'sandwiches': 'sandwich', 'momo': 'momos', 'dosas': 'dosa',
+    'dosai': 'dosa', 'idlis': 'idli', 'idly': 'idli', 'idlies': 'idli', 'parottas': 'parotta', 'porotta': 'parotta',
+    'paratha': 'parotta', 'rolls': 'roll', 'kebabs': 'kebab', 'kababs': 'kebab', 'kabab': 'kebab',
+    'shawarmas': 'shawarma', 'shawarama': 'shawarma', 'cafes': 'cafe', 'coffee shop': 'cafe',
+    'coffee shops': 'cafe', 'desserts': 'dessert', 'cakes': 'cake', 'bakeries': 'bakery', 'noodles': 'noodles',
+    'chineese': 'chinese', 'chinease': 'chinese', 'indo chinese': 'chinese', 'sea food': 'seafood',
+    'barbeque': 'barbecue', 'bbq': 'barbecue', 'veg': 'vegetarian', 'pure veg': 'vegetarian',
+    'non veg': 'non-vegetarian', 'nonveg': 'non-vegetarian', 'non vegetarian': 'non-vegetarian',
+    'thalis': 'thali', 'meals': 'thali', 'south indian meals': 'south indian thali', 'buffets': 'buffet',
+    'pubs': 'pub', 'bars': 'bar', 'breweries': 'brewery', 'microbrewery': 'brewery',
+}
+MAX_SYNONYM_WORDS = 3
+
+# Budget buckets: per-person amounts are rounded down to the nearest of these
+# (times a power of ten; steps of 10-17%), so round budgets stay as they are.
+# Only cache keys use them; an answer cached for another budget in the bucket is
+# filtered to the cards within the user's own budget (Card.within_budget) before
+# it is shown, by both apps and api_server.py /recommend
+BUDGET_EDGES = (1.0, 1.1, 1.2, 1.3, 1.4, 1.5, 1.6, 1.8, 2.0, 2.25, 2.5, 2.75, 3.0, 3.5, 4.0, 4.5, 5.0, 5.5,
+                6.0, 7.0, 8.0, 9.0)
+
+_NON_WORD = re.compile(r'[^a-z0-9\- ]+')
+
+def fold(text: str) -> str:
+    """Lowercase, accents stripped ('Café' -> 'cafe'), punctuation to spaces, whitespace collapsed."""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii').casefold()
+    return ' '.join(_NON_WORD.sub(' ', text.replace('&', ' and ')).replace(' - ', ' ').split())
+
+def canonical_terms(text: str) -> List[str]:
+    """Food terms of text: synonyms mapped, fillers dropped, duplicates removed, order kept."""
+    words = fold(text).replace('-', ' ').split()
+    terms: List[str] = []
+    i = 0
+    while i < len(words):
+        for size in range(min(MAX_SYNONYM_WORDS, len(words) - i), 0, -1):
+            phrase = ' '.join(words[i:i + size])
+            if phrase in CUISINE_SYNONYMS:
+                terms.extend(CUISINE_SYNONYMS[phrase].split())
+                i += size
+                break
+        else:
+            if words[i] not in FILLER_WORDS:
+                terms.append(words[i])
+            i += 1
+    if not terms:
+        terms = [word for word in words if word in WEAK_FILLERS][:1]
+    seen = set()
+    return [term for term in terms if not (term in seen or seen.add(term))]
+
+def intent_terms(text: str) -> List[str]:
+    """The INTENT_WORDS in text, in order, without duplicates."""
+    seen = set()
+    return [word for word in fold(text).split() if word in INTENT_WORDS and not (word in seen or seen.add(word))]
+
+def native_terms(text: str) -> List[str]:
+    """Words of text with no ASCII form (Kannada, Hindi, ...), which fold() drops; casefolded, order kept."""
+    words = (word.strip(string.punctuation) for word in unicodedata.normalize('NFKC', text or '').casefold().split())
+    return [word for word in words if any(ch.isalpha() for ch in word) and not fold(word)]
+
+def canonical_locality(location: Optional[str]) -> str:
+    """Gazetteer name for a locality or alias ('Kormangala' -> 'koramangala'); other places folded; '' for the city."""
+    words = [word for word in fold(location or '').split() if word not in CITY_WORDS]
+    text = ' '.join(words)
+    if not text or text in NOT_LOCATIONS:
+        return ''
+    locality = get_locality(text)
+    return locality.name if locality else text
+
+@dataclass(frozen=True)
+class ParsedQuery:
+    """A food query split into canonical food terms and locality, with the strings perform_google_search sends."""
+    base_query: str  # canonical food terms, e.g. "chicken biryani"
+    locality: str  # canonical locality ('' = all of Bangalore)
+    location: str  # display form, e.g. "HSR Layout" or "Bangalore"
+    location_type: str = 'in'
+    intent: str = ''  # intent words from the query, e.g. "cheap"; sent but not part of the key
+
+    @property
+    def location_context(self) -> str:
+        return 'Bangalore' if self.locality else ''
+
+    @property
+    def location_part(self) -> str:
+        return f"{self.location_type} {self.location}" + (f" {self.location_context}" if self.location_context else '')
+
+    @property
+    def enhanced_query(self) -> str:
+        return f"{self.intent} {self.base_query} {self.location_part}".strip()
+
+    @property
+    def fallback_query(self) -> str:
+        return f"{self.base_query} {self.location}"
+
+    @property
+    def key(self) -> str:
+        """Stable cache key: equal for every phrasing of the same request."""
+        return f"{self.base_query}|{self.locality or 'bangalore'}"
+
+def _display_location(locality: str) -> str:
+    if not locality:
+        return 'Bangalore'
+    known = get_locality(locality)
+    return known.display_name if known else locality.title()
+
+def parse_query(query: str, verbose: bool = True) -> ParsedQuery:
+    """
+    Canonical parts of a free-text food query.
+
+    The locality comes from the gazetteer when the query names a known one (aliases
+    and misspellings included), else from an explicit "in/near/at X" / "X area"
+    phrase, else it is all of Bangalore. The rest of the query becomes the food terms
+    (its own words if it is in a non-Latin script) and the intent words.
+    verbose=False skips the log lines.
+    """
+    log = print if verbose else (lambda *args: None)
+    text = fold(query)
+    remainder = text
+    locality = ''
+    found = find_locality(text)
+    if found:
+        locality = found[0].name
+        start = text.rfind(found[1].lower())
+        remainder = text[:start] + ' ' + text[start + len(found[1]):]
+        log(f"Found location via gazetteer: {found[0].display_name}")
+    else:
+        for pattern, _ in patterns.LOCATION_PATTERNS:
+            match = pattern.search(text)
+            if match and len(match.group(1).strip()) > 1:
+                locality = canonical_locality(match.group(1))
+                if locality:
+                    remainder = text.replace(match.group(0), ' ', 1)
+                    log(f"Found location via explicit pattern: {locality}")
+                    break
+    if not locality:
+        log("No location found, using default: Bangalore")
+
+    base_query = ' '.join(canonical_terms(remainder) + native_terms(query)) or 'food'
+    parsed = ParsedQuery(base_query=base_query, locality=locality, location=_display_location(locality),
+                         intent=' '.join(intent_terms(remainder)))
+    log(f"Canonical query: '{parsed.base_query}' in {parsed.location} (key {parsed.key})")
+    return parsed
+
+@lru_cache(maxsize=10000)
+def query_key(query: str) -> str:
+    """parse_query(query).key without the log lines, memoized."""
+    return parse_query(query, verbose=False).key
+
+def bucket_budget(budget: float, num_people: int = 1) -> float:
+    """
+    Round a total budget down to its bucket (per person, on BUDGET_EDGES): 1090 for two -> 1000.
+    Budgets in the same bucket share cached recommendations; the result never exceeds the budget.
+    """
+    people = max(int(num_people or 1), 1)
+    per_person = float(budget or 0) / people
+    if per_person < 1:
+        return float(budget or 0)
+    scale = 10 ** math.floor(math.log10(per_person))
+    # Round to absorb float error (e.g. 2.25 * 100 = 224.99999...)
+    edge = max(round(mantissa * scale, 6) for mantissa in BUDGET_EDGES if round(mantissa * scale, 6) <= per_person)
+    return float(edge * people)
+
+def recommendation_key(request: Dict[str, Any]) -> str:
+    """
+    Canonical cache key for a whole recommendation request (pipeline.serve_recommendation).
+    Free text (query, food type, location, restaurant) is canonicalized; the budget is bucketed.
+    """
+    from name_index import normalize_name
+    canonical = {}
+    for field, value in request.items():
+        if value is None or value == '':
+            continue
+        if field == 'query':
+            value = query_key(str(value))
+        elif field == 'food_type':
+            value = ' '.join(canonical_terms(str(value)) + native_terms(str(value)))
+        elif field == 'location':
+            value = canonical_locality(str(value)) or 'bangalore'
+        elif field == 'restaurant':
+            value = normalize_name(str(value))
+        elif field == 'budget':
+            value = bucket_budget(float(value), int(request.get('num_people') or 1))
+        canonical[field] = value
+    return json.dumps(canonical, sort_keys=True, default=str)
+
+def raw_search_key(record: Dict[str, Any]) -> str:
+    """The search key a log record would have had before canonicalization (lowercased text)."""
+    return ' '.join(_record_query(record).lower().split())
+
+def _record_query(record: Dict[str, Any]) -> str:
+    return str(record.get('query') or f"Best {record.get('food_type', '')} {record.get('location') or 'Bangalore'}")
+
+def _recommendation_request(record: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: record.get(field) for field in
+            ('app', 'query', 'food_type', 'budget', 'num_people', 'restaurant', 'location', 'json_mode')
+            if record.get(field) not in (None, '')}
+
+def key_hit_rates(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Hit rates an unbounded cache would reach over a query log with raw versus canonical keys,
+    for the search layer and for whole recommendations.
+    """
+    seen = {name: set() for name in ('search_raw', 'search_canonical', 'recommendation_raw', 'recommendation_canonical')}
+    hits = dict.fromkeys(seen, 0)
+    total = 0
+    for record in records:
+        total += 1
+        request = _recommendation_request(record)
+        keys = {
+            'search_raw': raw_search_key(record),
+            'search_canonical': query_key(_record_query(record)),
+            'recommendation_raw': json.dumps(request, sort_keys=True, default=str).lower(),
+            'recommendation_canonical': recommendation_key(request),
+        }
+        for name, key in keys.items():
+            if key in seen[name]:
+                hits[name] += 1
+            else:
+                seen[name].add(key)
+    report: Dict[str, Any] = {'queries': total}
+    for name in seen:
+        report[name] = {'distinct_keys': len(seen[name]), 'hit_rate': hits[name] / total if total else 0.0}
+    return report
+
+def describe_hit_rates(report: Dict[str, Any]) -> List[str]:
+    lines = [f"Key canonicalization over {report['queries']} queries (unbounded cache):"]
+    for layer in ('search', 'recommendation'):
+        raw, canonical = report[f'{layer}_raw'], report[f'{layer}_canonical']
+        lines.append(f"  {layer:<15} raw {raw['hit_rate']:.0%} ({raw['distinct_keys']} keys) -> "
+                     f"canonical {canonical['hit_rate']:.0%} ({canonical['distinct_keys']} keys)")
+    return lines
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(2)
+    argument = sys.argv[1]
+    if argument.endswith(('.jsonl', '.json', '.log')):
+        from query_log import read_queries
+        for line in describe_hit_rates(key_hit_rates(read_queries(argument))):
+            print(line)
+    else:
+        parse_query(argument)
+
+if __name__ == "__main__":
+    main()
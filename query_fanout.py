@@ -0,0 +1,130 @@
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from dedupe import canonicalize_url
+from metrics import METRICS
+from quota import QuotaExceeded
+from ranking import DOMAIN_PRIORS
+
+# Query fan-out for perform_google_search.
+# Instead of one Custom Search query, several complementary variants of it are
+# issued concurrently (menu/prices pages, reviews, aggregator listings,
+# adjacent localities), so
+# recall no longer hinges on a single query string. Their result lists are
+# merged with reciprocal rank fusion (RRF) and canonical-URL dedup; pages found
+# by several variants rise to the top. Wall-clock stays close to one query
+# because the variants run in parallel and each fetches a single page.
+#
+# SEARCH_FANOUT=1 enables it; SEARCH_FANOUT_VARIANTS picks the variants
+# (comma-separated, default: all of VARIANT_TEMPLATES). Every variant is one
+# more Custom Search call per uncached query; perform_google_search runs only
+# the primary query when the daily quota (quota.py) cannot cover the variants.
+
+# RRF constant: score = sum(weight / (RRF_K + rank)); 60 is the usual choice
+RRF_K = 60
+# Aggregators with structured menus and prices, from ranking.DOMAIN_PRIORS
+AGGREGATOR_SITES = [domain for domain, prior in DOMAIN_PRIORS.items() if prior >= 2.0]
+
+# Variant name -> (query template, RRF weight). {base} is the dish/cuisine part, {location} e.g. "in Koramangala Bangalore"
+VARIANT_TEMPLATES = {
+    'menu': ("{base} menu prices {location}", 1.0),
+    'reviews': ("{base} reviews {location}", 0.8),
+    'aggregators': ("{base} {location} " + ' OR '.join(f"site:{site}" for site in AGGREGATOR_SITES), 1.0),
+    # Adjacent localities (localities.py); skipped when the query locality is unknown
+    'nearby': ("{base} in {nearby} Bangalore", 0.6),
+}
+PRIMARY_WEIGHT = 1.0
+
+def fanout_enabled() -> bool:
+    return os.getenv('SEARCH_FANOUT', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+def query_variants(primary_query: str, base_query: str, location_part: str,
+                   names: Optional[List[str]] = None, nearby: List[str] = ()) -> List[Tuple[str, str, float]]:
+    """(name, query, weight) for the primary query and each enabled variant; nearby are adjacent locality names."""
+    if names is None:
+        configured = os.getenv('SEARCH_FANOUT_VARIANTS', '')
+        names = [name.strip() for name in configured.split(',') if name.strip()] or list(VARIANT_TEMPLATES)
+    variants = [('primary', primary_query, PRIMARY_WEIGHT)]
+    for name in names:
+        if name not in VARIANT_TEMPLATES:
+            print(f"Unknown search fan-out variant: {name}")
+            continue
+        template, weight = VARIANT_TEMPLATES[name]
+        if '{nearby}' in template and not nearby:
+            continue
+        nearby_part = ' OR '.join(f'"{area}"' for area in nearby)
+        query = ' '.join(template.format(base=base_query, location=location_part, nearby=nearby_part).split())
+        if query.lower() != primary_query.lower():
+            variants.append((name, query, weight))
+    return variants
+
+def reciprocal_rank_fusion(ranked_lists: List[Tuple[float, List[Dict[str, Any]]]],
+                           k: int = RRF_K) -> List[Tuple[float, Dict[str, Any]]]:
+    """
+    Merge ranked result lists by weighted reciprocal rank, deduplicating on canonical URL.
+
+    Args:
+        ranked_lists: (weight, items) per query, items best first.
+        k (int): RRF constant; larger values flatten the rank contribution.
+
+    Returns:
+        List of (fused score, item), best first. The item kept for a URL is the
+        one from the list where it ranked highest.
+    """
+    scores: Dict[str, float] = {}
+    best: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+    order: List[str] = []
+    for weight, items in ranked_lists:
+        seen = set()
+        for rank, item in enumerate(items, 1):
+            key = canonicalize_url(item.get('link', ''))
+            if key in seen:
+                continue  # a list counts once per URL
+            seen.add(key)
+            if key not in scores:
+                scores[key] = 0.0
+                order.append(key)
+            scores[key] += weight / (k + rank)
+            if key not in best or rank < best[key][0]:
+                best[key] = (rank, item)
+    fused = [(scores[key], best[key][1]) for key in order]
+    fused.sort(key=lambda pair: pair[0], reverse=True)  # stable: ties keep first-seen order
+    return fused
+
+def fan_out(variants: List[Tuple[str, str, float]],
+            search: Callable[[str, str], List[Dict[str, Any]]]) -> List[Tuple[float, Dict[str, Any]]]:
+    """
+    Run search(name, query) for every variant concurrently and fuse the results.
+
+    A failing variant is skipped; the error is re-raised only if every variant failed.
+    """
+    def run(variant):
+        name, query, _ = variant
+        try:
+            return search(name, query), None
+        except (requests.exceptions.RequestException, QuotaExceeded) as e:
+            print(f"Search variant '{name}' failed: {str(e)}")
+            return [], e
+
+    # Each variant runs in a copy of the caller's context, so it is charged to the caller's quota priority
+    contexts = [contextvars.copy_context() for _ in variants]
+    with ThreadPoolExecutor(max_workers=len(variants), thread_name_prefix='fanout') as pool:
+        outcomes = list(pool.map(lambda context, variant: context.run(run, variant), contexts, variants))
+    errors = [error for _, error in outcomes if error is not None]
+    if errors and len(errors) == len(outcomes):
+        raise errors[0]
+
+    ranked_lists = []
+    for (name, query, weight), (items, _) in zip(variants, outcomes):
+        METRICS.incr(f'fanout.{name}.items', len(items))
+        ranked_lists.append((weight, items))
+    fused = reciprocal_rank_fusion(ranked_lists)
+    METRICS.incr('fanout.searches')
+    METRICS.incr('fanout.unique_items', len(fused))
+    print(f"Fan-out merged {sum(len(items) for items, _ in outcomes)} items from {len(variants)} queries "
+          f"into {len(fused)} unique results")
+    return fused
@@ -0,0 +1,67 @@
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, Optional
+
+# Opt-in capture of normalized user queries for replay and cache pre-warming.
+# Set FOOD_QUERY_LOG to a file path to enable; nothing is recorded otherwise.
+# One JSON object per line with a "request_id" (the requests.jsonl layout), e.g.
+#   {"request_id": "q-3f2a9c1e", "ts": 1760861400.1, "app": "food_app", "food_type": "biryani",
+#    "budget": 800.0, "num_people": 2, "location": "koramangala", "restaurant": "",
+#    "query": "Best biryani koramangala", "json_mode": false}
+# Only the form fields are stored: no API keys, IPs or session identifiers.
+
+_lock = threading.Lock()
+
+def log_path() -> Optional[str]:
+    return os.getenv('FOOD_QUERY_LOG') or None
+
+def _normalize(value: Any) -> str:
+    return ' '.join(str(value or '').split()).lower()
+
+def normalize_query(food_type: str = '', budget: float = 0, num_people: int = 1, location: str = '',
+                    restaurant: str = '', query: str = '', app: str = '', json_mode: bool = False) -> Dict[str, Any]:
+    """Build a query-log record from the form fields (whitespace collapsed, lowercased)."""
+    return {
+        'request_id': f"q-{uuid.uuid4().hex[:8]}",
+        'ts': round(time.time(), 3),
+        'app': app,
+        'food_type': _normalize(food_type),
+        'budget': float(budget or 0),
+        'num_people': int(num_people or 1),
+        'location': _normalize(location),
+        'restaurant': _normalize(restaurant),
+        'query': ' '.join(str(query or '').split()),
+        'json_mode': bool(json_mode),
+    }
+
+def log_query(path: Optional[str] = None, **fields) -> Optional[Dict[str, Any]]:
+    """Append a normalized record if capture is enabled. Returns the record or None."""
+    path = path or log_path()
+    if not path:
+        return None
+    record = normalize_query(**fields)
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with _lock, open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    except OSError as e:
+        print(f"Could not write query log {path}: {str(e)}")
+        return None
+    return record
+
+def read_queries(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield records from a query log, skipping malformed lines."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict):
+                yield record
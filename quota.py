@@ -0,0 +1,208 @@
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, Optional
+
+from metrics import METRICS
+
+try:
+    from zoneinfo import ZoneInfo
+    _QUOTA_TZ = ZoneInfo('America/Los_Angeles')
+except Exception:  # no tz database: Pacific Standard Time is close enough
+    _QUOTA_TZ = timezone(timedelta(hours=-8))
+
+# Persistent daily quota for the Custom Search API.
+# Google resets the quota at midnight Pacific time. Usage is counted per day
+# and per priority in the shared cache database, so the Streamlit apps, the
+# API server, prewarm.py and replay.py all draw from one budget.
+#
+# Priorities: 'interactive' (a user is waiting; the default), 'refresh'
+# (stale-while-revalidate), 'prefetch' (prewarm.py) and 'batch' (replay.py).
+# Everything but interactive traffic stops at the limit minus
+# INTERACTIVE_RESERVE, so background work cannot starve users. When a call is
+# refused, QuotaExceeded is raised and perform_google_search degrades to
+# cached items of any age, then to the local restaurant index.
+#
+# Only calls to the real endpoint are charged; an overridden GOOGLE_CSE_URL
+# (stub_server.py load tests) does not consume the budget.
+#
+# GOOGLE_CSE_DAILY_QUOTA sets the limit (default 100, the free tier) and
+# GOOGLE_CSE_INTERACTIVE_RESERVE the share kept for interactive use (default 0.2).
+
+PRIORITIES = ('interactive', 'refresh', 'prefetch', 'batch')
+DAILY_LIMIT = int(os.getenv('GOOGLE_CSE_DAILY_QUOTA', 100))
+INTERACTIVE_RESERVE = float(os.getenv('GOOGLE_CSE_INTERACTIVE_RESERVE', 0.2))
+# Projections need some history; before this many hours the rate is taken over this window
+MIN_PROJECTION_HOURS = 0.25
+
+_priority = contextvars.ContextVar('quota_priority', default='interactive')
+
+class QuotaExceeded(Exception):
+    """The Custom Search call was refused: the daily quota (or this priority's share of it) is spent."""
+
+@contextmanager
+def priority(name: str) -> Iterator[None]:
+    """Attribute Custom Search calls made inside the block (in this thread/context) to a priority."""
+    if name not in PRIORITIES:
+        raise ValueError(f"unknown quota priority: {name}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority() -> str:
+    return _priority.get()
+
+def quota_day(now: Optional[float] = None) -> str:
+    """The quota day (Pacific date) for a timestamp."""
+    return datetime.fromtimestamp(time.time() if now is None else now, _QUOTA_TZ).strftime('%Y-%m-%d')
+
+def next_reset(now: Optional[float] = None) -> float:
+    """Timestamp of the next Pacific midnight."""
+    local = datetime.fromtimestamp(time.time() if now is None else now, _QUOTA_TZ)
+    midnight = (local + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight.timestamp()
+
+class QuotaManager:
+    def __init__(self, daily_limit: int = DAILY_LIMIT, interactive_reserve: float = INTERACTIVE_RESERVE,
+                 path: Optional[str] = None):
+        self.daily_limit = daily_limit
+        self.interactive_reserve = interactive_reserve
+        self._path = path
+        self._local = threading.local()
+
+    @property
+    def path(self) -> str:
+        # Same database as the caches (cache.py)
+        from cache import DEFAULT_CACHE_PATH
+        return self._path or os.getenv('FOOD_CACHE_PATH', DEFAULT_CACHE_PATH)
+
+    def _db(self) -> sqlite3.Connection:
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        connection = connections.get(self.path)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS quota_usage ('
+                ' day TEXT NOT NULL, priority TEXT NOT NULL, calls INTEGER NOT NULL, PRIMARY KEY (day, priority))'
+            )
+            connection.execute('CREATE TABLE IF NOT EXISTS quota_exhausted (day TEXT PRIMARY KEY, at REAL NOT NULL)')
+            connections[self.path] = connection
+        return connection
+
+    def limit_for(self, priority_name: str) -> int:
+        """Calls this priority may have been made today (all priorities counted) before it is refused."""
+        if priority_name == 'interactive':
+            return self.daily_limit
+        return int(self.daily_limit * (1 - self.interactive_reserve))
+
+    def acquire(self, calls: int = 1, priority_name: Optional[str] = None) -> None:
+        """
+        Reserve calls against today's quota (atomically, across processes).
+
+        Raises:
+            QuotaExceeded: If the calls would exceed the limit for the priority, or Google
+                           already reported the quota as exhausted today.
+        """
+        priority_name = priority_name or current_priority()
+        day = quota_day()
+        connection = self._db()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                if connection.execute('SELECT 1 FROM quota_exhausted WHERE day = ?', (day,)).fetchone():
+                    raise QuotaExceeded(f"Custom Search quota exhausted for {day} (reported by the API)")
+                used = connection.execute('SELECT COALESCE(SUM(calls), 0) FROM quota_usage WHERE day = ?',
+                                          (day,)).fetchone()[0]
+                limit = self.limit_for(priority_name)
+                if used + calls > limit:
+                    raise QuotaExceeded(f"Custom Search quota: {used}/{self.daily_limit} used today, "
+                                        f"{priority_name} work may use {limit}")
+                connection.execute(
+                    'INSERT INTO quota_usage (day, priority, calls) VALUES (?, ?, ?)'
+                    ' ON CONFLICT (day, priority) DO UPDATE SET calls = calls + excluded.calls',
+                    (day, priority_name, calls))
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        except QuotaExceeded:
+            METRICS.incr(f'quota.refused.{priority_name}')
+            raise
+        except sqlite3.Error as e:
+            # Never block searches on a bookkeeping failure
+            print(f"Quota bookkeeping failed: {str(e)}")
+        METRICS.incr(f'quota.used.{priority_name}', calls)
+
+    def available(self, calls: int = 1, priority_name: Optional[str] = None) -> bool:
+        """Whether acquire(calls) would currently succeed (no reservation is made)."""
+        snapshot = self.snapshot()
+        if snapshot['exhausted']:
+            return False
+        return snapshot['used'] + calls <= self.limit_for(priority_name or current_priority())
+
+    def mark_exhausted(self) -> None:
+        """Record that the API itself reported the daily quota as spent (HTTP 429 / quota 403)."""
+        try:
+            self._db().execute('INSERT OR REPLACE INTO quota_exhausted (day, at) VALUES (?, ?)',
+                               (quota_day(), time.time()))
+        except sqlite3.Error as e:
+            print(f"Quota bookkeeping failed: {str(e)}")
+        METRICS.incr('quota.exhausted_by_api')
+
+    def snapshot(self) -> Dict:
+        """Today's usage, remaining calls and the projected exhaustion time at the current rate."""
+        now = time.time()
+        day = quota_day(now)
+        try:
+            rows = self._db().execute('SELECT priority, calls FROM quota_usage WHERE day = ?', (day,)).fetchall()
+            exhausted = self._db().execute('SELECT 1 FROM quota_exhausted WHERE day = ?', (day,)).fetchone() is not None
+        except sqlite3.Error as e:
+            print(f"Quota bookkeeping failed: {str(e)}")
+            rows, exhausted = [], False
+        by_priority = dict(rows)
+        used = sum(by_priority.values())
+        remaining = 0 if exhausted else max(0, self.daily_limit - used)
+        reset = next_reset(now)
+        hours_elapsed = max(MIN_PROJECTION_HOURS, (now - (reset - 86400)) / 3600)
+        rate = used / hours_elapsed  # calls per hour today
+        projected = None
+        if remaining == 0:
+            projected = now
+        elif rate > 0 and now + remaining / rate * 3600 < reset:
+            projected = now + remaining / rate * 3600
+        return {
+            'day': day,
+            'limit': self.daily_limit,
+            'used': used,
+            'by_priority': by_priority,
+            'remaining': remaining,
+            'background_remaining': max(0, self.limit_for('prefetch') - used) if not exhausted else 0,
+            'exhausted': exhausted,
+            'calls_per_hour': round(rate, 2),
+            'projected_exhaustion': projected,  # None: lasts until the reset
+            'resets_at': reset,
+        }
+
+QUOTA = QuotaManager()
+
+def describe(snapshot: Dict) -> str:
+    """One-line summary of a QuotaManager.snapshot() for CLI reports."""
+    reset = datetime.fromtimestamp(snapshot['resets_at']).strftime('%H:%M')
+    if snapshot['exhausted'] or not snapshot['remaining']:
+        outlook = f"exhausted until {reset}"
+    elif snapshot['projected_exhaustion']:
+        outlook = f"runs out ~{datetime.fromtimestamp(snapshot['projected_exhaustion']).strftime('%H:%M')} at " \
+                  f"{snapshot['calls_per_hour']:.0f}/h (resets {reset})"
+    else:
+        outlook = f"lasts until the reset at {reset}"
+    return f"Custom Search quota: {snapshot['remaining']}/{snapshot['limit']} left today, {outlook}"
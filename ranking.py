@@ -0,0 +1,124 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import patterns
+
+# Cheap pre-scrape ranking of search items. Uses only what the search API
+# already returned (URL, title, snippet) so the best pages are scraped first and
+# scraping can stop once enough results carry usable prices.
+
+# Domain priors: listing pages with structured menus/prices rank highest
+DOMAIN_PRIORS = {
+    'zomato.com': 3.0,
+    'swiggy.com': 3.0,
+    'dineout.co.in': 2.0,
+    'eazydiner.com': 1.5,
+    'magicpin.in': 1.5,
+    'tripadvisor.in': 1.0,
+    'tripadvisor.com': 1.0,
+    'justdial.com': 0.5,
+}
+# Generic listicles / aggregations rarely have a menu with prices
+LISTICLE_PATTERN = re.compile(r'\b(?:top[\s-]?\d+|best[\s-]\d+|\d+[\s-]best|must[\s-]visit|places[\s-]to|list[\s-]of)\b')
+OFFICIAL_SITE_BONUS = 1.5
+LISTICLE_PENALTY = 1.5
+PRICE_RANGE_BONUS = 2.0
+MENU_PRICE_BONUS = 1.0
+RATING_BONUS = 0.5
+LOCALITY_TITLE_BONUS = 1.5
+LOCALITY_SNIPPET_BONUS = 0.75
+# Item mentions an adjacent locality (localities.py) instead of the query's own
+NEARBY_LOCALITY_BONUS = 0.5
+# Bonus for the top query fan-out result (query_fanout.py), scaled by fused score
+FUSION_BONUS = 2.0
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+def _registered_domain(host: str) -> str:
+    """'www.zomato.com' -> 'zomato.com', 'foo.co.in' kept as is."""
+    parts = host.lower().split('.')
+    if len(parts) >= 3 and parts[-2] in ('co', 'com', 'org', 'net') and len(parts[-1]) == 2:
+        return '.'.join(parts[-3:])
+    return '.'.join(parts[-2:])
+
+def _looks_official(domain: str, title: str) -> bool:
+    """A restaurant's own site: the domain label is made of the title's leading words."""
+    label = domain.split('.')[0]
+    words = _WORD.findall(title.lower())
+    if len(label) < 5 or not words:
+        return False
+    joined = ''
+    for word in words[:4]:
+        joined += word
+        if joined == label:
+            return True
+    return False
+
+def score_item(item: Dict[str, Any], location_terms: frozenset = frozenset(), nearby_terms: tuple = ()) -> float:
+    """Score one raw search item; higher is more worth scraping."""
+    title = item.get('title', '')
+    snippet = item.get('snippet', '')
+    title_lower = title.lower()
+    snippet_lower = snippet.lower()
+    domain = _registered_domain(urlsplit(item.get('link', '')).hostname or '')
+
+    score = DOMAIN_PRIORS.get(domain, 0.0)
+    if domain not in DOMAIN_PRIORS and _looks_official(domain, title):
+        score += OFFICIAL_SITE_BONUS
+    if LISTICLE_PATTERN.search(title_lower) or LISTICLE_PATTERN.search(item.get('link', '').lower()):
+        score -= LISTICLE_PENALTY
+
+    if patterns.match_price_range(snippet):
+        score += PRICE_RANGE_BONUS
+    elif patterns.MENU_PRICE.search(snippet):
+        score += MENU_PRICE_BONUS
+    if patterns.match_rating(snippet):
+        score += RATING_BONUS
+
+    if location_terms:
+        if any(term in title_lower for term in location_terms):
+            score += LOCALITY_TITLE_BONUS
+        elif any(term in snippet_lower for term in location_terms):
+            score += LOCALITY_SNIPPET_BONUS
+        elif nearby_terms and any(term in title_lower or term in snippet_lower for term in nearby_terms):
+            score += NEARBY_LOCALITY_BONUS
+    return score
+
+def rank_items(items: List[Dict[str, Any]], location: Optional[str] = None,
+               fusion_scores: Optional[Dict[str, float]] = None,
+               nearby: Iterable[str] = ()) -> List[Tuple[float, Dict[str, Any]]]:
+    """
+    Rank raw search items for scraping.
+
+    Args:
+        items: Raw Custom Search items (dicts with 'link', 'title', 'snippet').
+        location (str): Query locality; items mentioning it score higher.
+        fusion_scores: Reciprocal-rank-fusion score per link from a query fan-out; items found
+                       high up by several query variants score higher.
+        nearby: Names of localities adjacent to location; items mentioning them get a smaller bonus.
+
+    Returns:
+        List of (score, item), best first. Ties keep the search engine's order.
+    """
+    location_terms = frozenset()
+    if location and location.lower() not in ('bangalore', 'bengaluru'):
+        location_terms = frozenset(location.lower().split())
+    nearby_terms = tuple(term.lower() for term in nearby)
+    scored = [(score_item(item, location_terms, nearby_terms), item) for item in items]
+    if fusion_scores:
+        top = max(fusion_scores.values())
+        scored = [(score + FUSION_BONUS * fusion_scores.get(item.get('link', ''), 0.0) / top, item)
+                  for score, item in scored]
+    scored.sort(key=lambda pair: pair[0], reverse=True)  # sort is stable
+    return scored
+
+def has_usable_prices(result) -> bool:
+    """True if a SearchResult carries prices the LLM can build a combination from."""
+    info = result.info
+    if info is not None:
+        if any(item.price is not None for item in info.menu_items):
+            return True
+        if info.price_range and patterns.MENU_PRICE.search(info.price_range):
+            return True
+    return bool(patterns.match_price_range(result.snippet))
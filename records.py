@@ -0,0 +1,132 @@
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, List, Optional
+
+# Compact typed records for search results and scraped restaurant details.
+# Slotted dataclasses replace the per-result dicts: no per-instance __dict__,
+# fixed field set, and menu prices are parsed to numbers once at scrape time.
+# to_dict()/from_dict() and the mapping-style accessors on SearchResult keep
+# code written against the old dict shape working.
+
+def parse_price(value: Any) -> Optional[float]:
+    """Parse a price given as a number or a string like '320', '1,250.50' or '₹320'."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    cleaned = ''.join(ch for ch in str(value) if ch.isdigit() or ch == '.')
+    try:
+        return float(cleaned) if cleaned else None
+    except ValueError:
+        return None
+
+def format_price(price: Optional[float]) -> str:
+    """Format a numeric price the way the scraper used to emit it ('320', '12.5')."""
+    if price is None:
+        return ''
+    return str(int(price)) if price == int(price) else str(price)
+
+@dataclass(slots=True)
+class MenuItem:
+    """A single menu entry with its price parsed to a number."""
+    name: str
+    price: Optional[float] = None
+    currency: str = '₹'
+
+    def to_dict(self) -> Dict[str, str]:
+        return {'name': self.name, 'price': format_price(self.price), 'currency': self.currency}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MenuItem":
+        return cls(name=data.get('name', ''), price=parse_price(data.get('price')),
+                   currency=data.get('currency', '₹'))
+
+@dataclass(slots=True)
+class RestaurantInfo:
+    """Details scraped from a restaurant or listing page."""
+    name: str = ''
+    cuisine: str = ''
+    location: str = ''
+    price_range: str = ''
+    rating: str = ''
+    specialties: str = ''
+    contact: str = ''
+    timing: str = ''
+    features: str = ''
+    menu_items: List[MenuItem] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not any(getattr(self, f.name) for f in fields(self))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the old scrape_website dict shape (empty fields dropped)."""
+        data = {f.name: getattr(self, f.name) for f in fields(self) if f.name != 'menu_items' and getattr(self, f.name)}
+        if self.menu_items:
+            data['menu_items'] = [item.to_dict() for item in self.menu_items]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RestaurantInfo":
+        info = cls(**{f.name: data.get(f.name) or '' for f in fields(cls) if f.name != 'menu_items'})
+        info.menu_items = [MenuItem.from_dict(item) for item in data.get('menu_items') or []]
+        return info
+
+_INFO_FIELDS = frozenset(f.name for f in fields(RestaurantInfo))
+
+@dataclass(slots=True)
+class SearchResult:
+    """A filtered search hit, optionally enriched with scraped restaurant info.
+
+    Supports read-only mapping access (``result['title']``, ``'name' in result``,
+    ``result.get('price_range')``) over the flattened fields, matching the old
+    dict where scraped fields were merged in with ``result.update(...)``.
+    """
+    title: str
+    link: str
+    snippet: str = ''
+    query_location: str = ''
+    query_location_type: str = ''
+    info: Optional[RestaurantInfo] = None
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _INFO_FIELDS:
+            value = getattr(self.info, key) if self.info is not None else None
+            if not value:
+                raise KeyError(key)
+            return [item.to_dict() for item in value] if key == 'menu_items' else value
+        if key == 'info' or key not in _RESULT_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the old flat result dict (search fields plus scraped fields)."""
+        data = {name: getattr(self, name) for name in _RESULT_FIELDS}
+        if self.info is not None:
+            data.update(self.info.to_dict())
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SearchResult":
+        info = RestaurantInfo.from_dict(data)
+        return cls(
+            title=data.get('title', ''),
+            link=data.get('link', ''),
+            snippet=data.get('snippet', ''),
+            query_location=data.get('query_location', ''),
+            query_location_type=data.get('query_location_type', ''),
+            info=None if info.is_empty() else info,
+        )
+
+_RESULT_FIELDS = tuple(f.name for f in fields(SearchResult) if f.name != 'info')
@@ -0,0 +1,115 @@
+"""
+Offline re-extraction of stored page snapshots.
+
+Re-runs the current scrape_website extractors over the raw HTML bodies kept by
+snapshot_store.py, in parallel worker processes and with no network access,
+then updates the scrape cache and rebuilds the price index. Use it after
+changing the extraction heuristics (and bumping google_search.EXTRACTOR_VERSION)
+instead of re-fetching every page.
+
+Cache entries keep the original fetch time, so pages fetched longer ago than
+the scrape cache TTL are re-extracted but not written back.
+
+Usage:
+    python reextract.py                      # every snapshot
+    python reextract.py --stale-only         # only snapshots extracted by an older EXTRACTOR_VERSION
+    python reextract.py --dry-run --url zomato --workers 8
+    python reextract.py --stats
+    python reextract.py --prune-days 30 --max-mb 500   # drop old snapshots, then unreferenced objects
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from cache import SCRAPE_CACHE
+from dedupe import canonicalize_url
+from google_search import EXTRACTOR_VERSION, extract_html
+from price_index import load_or_build
+from snapshot_store import SNAPSHOTS, Snapshot
+
+def _extract(snapshot: Snapshot) -> Tuple[str, Optional[Dict[str, Any]], float, Optional[str]]:
+    """Worker: (url, extracted record or None, seconds, error)."""
+    started = time.perf_counter()
+    try:
+        info = extract_html(SNAPSHOTS.read_body(snapshot), snapshot.encoding, snapshot.url)
+    except Exception as e:
+        return snapshot.url, None, time.perf_counter() - started, str(e)
+    record = None if info.is_empty() else info.to_dict()
+    return snapshot.url, record, time.perf_counter() - started, None
+
+def reextract(workers: Optional[int] = None, stale_only: bool = False, url_filter: Optional[str] = None,
+              dry_run: bool = False) -> Dict[str, Any]:
+    """Re-extract matching snapshots and write the results back; returns a summary."""
+    snapshots = [snapshot for snapshot in SNAPSHOTS.entries(below_version=EXTRACTOR_VERSION if stale_only else None)
+                 if not url_filter or url_filter in snapshot.url]
+    by_url = {snapshot.url: snapshot for snapshot in snapshots}
+    summary = {'snapshots': len(snapshots), 'changed': 0, 'unchanged': 0, 'empty': 0, 'expired': 0,
+               'errors': 0, 'extract_seconds': 0.0}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for url, record, seconds, error in pool.map(_extract, snapshots, chunksize=8):
+            summary['extract_seconds'] += seconds
+            if error is not None:
+                summary['errors'] += 1
+                print(f"Re-extraction failed for {url}: {error}")
+                continue
+            if record is None:
+                summary['empty'] += 1
+                continue
+            snapshot = by_url[url]
+            cache_key = canonicalize_url(url)
+            summary['changed' if SCRAPE_CACHE.peek(cache_key) != record else 'unchanged'] += 1
+            if dry_run:
+                continue
+            if time.time() - snapshot.fetched_at <= SCRAPE_CACHE.ttl:
+                SCRAPE_CACHE.set(cache_key, record, stored_at=snapshot.fetched_at)
+            else:
+                summary['expired'] += 1
+            SNAPSHOTS.mark_extracted(url, EXTRACTOR_VERSION)
+    summary['elapsed'] = time.perf_counter() - started
+    if not dry_run and snapshots:
+        summary['indexed'] = len(load_or_build(max_age=0))
+    return summary
+
+def print_stats() -> None:
+    stats = SNAPSHOTS.stats()
+    print(f"{stats['snapshots']} snapshots in {stats['objects']} objects under {SNAPSHOTS.root}: "
+          f"{stats['raw_bytes'] / 1024:.0f}KB raw, {stats['stored_bytes'] / 1024:.0f}KB stored "
+          f"({stats['ratio']:.1f}x)")
+    stale = sum(1 for _ in SNAPSHOTS.entries(below_version=EXTRACTOR_VERSION))
+    print(f"{stale} extracted by an extractor older than version {EXTRACTOR_VERSION}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, help='extraction processes (default: CPU count)')
+    parser.add_argument('--stale-only', action='store_true', help='only snapshots from an older EXTRACTOR_VERSION')
+    parser.add_argument('--url', help='only snapshots whose URL contains this text')
+    parser.add_argument('--dry-run', action='store_true', help='extract and compare, but write nothing')
+    parser.add_argument('--stats', action='store_true', help='print store size and staleness, then exit')
+    parser.add_argument('--prune-days', type=float, help='delete snapshots fetched more than N days ago, then exit')
+    parser.add_argument('--max-mb', type=float, help='delete the oldest snapshots until the store is under N MB, then exit')
+    args = parser.parse_args()
+
+    if args.stats:
+        print_stats()
+        return
+    if args.prune_days is not None or args.max_mb is not None:
+        pruned = SNAPSHOTS.prune(max_age=args.prune_days * 86400 if args.prune_days is not None else None,
+                                 max_bytes=int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None)
+        print(f"Pruned {pruned['snapshots']} snapshots and {pruned['objects']} objects "
+              f"({pruned['bytes'] / 1024:.0f}KB freed)")
+        return
+    summary = reextract(workers=args.workers, stale_only=args.stale_only, url_filter=args.url, dry_run=args.dry_run)
+    pages_per_second = summary['snapshots'] / summary['elapsed'] if summary['elapsed'] else 0.0
+    print(f"Re-extracted {summary['snapshots']} snapshots in {summary['elapsed']:.1f}s ({pages_per_second:.1f} pages/s, "
+          f"{summary['extract_seconds']:.1f}s CPU): {summary['changed']} changed, {summary['unchanged']} unchanged, "
+          f"{summary['empty']} empty, {summary['errors']} errors")
+    if summary['expired']:
+        print(f"{summary['expired']} fetched longer ago than the scrape cache TTL (not written to the cache)")
+    if 'indexed' in summary:
+        print(f"Price index rebuilt with {summary['indexed']} restaurants")
+
+if __name__ == "__main__":
+    main()
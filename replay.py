@@ -0,0 +1,244 @@
+"""
+Replay captured queries against the recommendation pipeline for capacity planning.
+
+Reads a query log written with FOOD_QUERY_LOG (see query_log.py) and fires the
+queries at pipeline.py at a fixed arrival rate (open loop) with a bounded
+number of concurrent workers, then reports throughput, end-to-end and
+per-stage latency percentiles, and search/scrape cache hit ratios, plus the
+hit rates raw versus canonical cache keys would reach on the log (query_canon.py).
+
+With --stub the Together AI, Custom Search and restaurant page endpoints are
+replaced by stub_server.py running in-process, so runs need no network or API
+quota; stub latencies are configurable, and the politeness sleep after each live
+page fetch is off (SCRAPE_POLITENESS_DELAY=0 unless set). --stub always runs on
+a fresh temporary SQLite cache and snapshot directory (as --cold does), so stub
+results never reach the app's caches or a shared FOOD_CACHE_BACKEND. Without
+--stub the endpoints come from TOGETHER_API_URL / GOOGLE_CSE_URL and the usual
+API key variables; the sleeps are then part of the end-to-end latency and
+reported separately as stage.politeness.
+
+Usage:
+    python replay.py logs/queries.jsonl --stub --rate 5 --concurrency 8 --duration 60
+    python replay.py logs/queries.jsonl --stub --stage search --llm-delay 2 --page-delay 0.3
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from metrics import Metrics
+from query_canon import describe_hit_rates, key_hit_rates
+from query_log import read_queries
+
+def _run_one(record: Dict[str, Any], stage: str, num_results: int) -> None:
+    import pipeline
+    from quota import priority
+    location = record.get('location') or None
+    # Worker threads start with a fresh context, so each request sets the quota priority itself
+    with priority('batch'):
+        if stage == 'search':
+            query = record.get('query') or f"Best {record.get('food_type', '')} {location or 'Bangalore'}"
+            pipeline.search(query, num_results=num_results)
+            return
+        pipeline.recommend(record.get('food_type') or 'food', float(record.get('budget') or 1000),
+                           int(record.get('num_people') or 1), record.get('restaurant') or None, location,
+                           json_mode=bool(record.get('json_mode')), num_results=num_results)
+
+def replay(records: List[Dict[str, Any]], rate: float, concurrency: int, duration: Optional[float] = None,
+           limit: Optional[int] = None, stage: str = 'recommend', num_results: int = 5) -> Dict[str, Any]:
+    """
+    Fire records at the pipeline and collect latencies.
+
+    Args:
+        records (list): Query-log records, replayed in order (cycled when duration is set).
+        rate (float): Arrivals per second; 0 sends as fast as workers free up.
+        concurrency (int): Worker threads.
+        duration (float): Stop scheduling after this many seconds (default: one pass over records).
+        limit (int): Stop after this many requests.
+        stage (str): 'recommend' (search, scrape and LLM) or 'search' (search and scrape only).
+        num_results (int): Search results per query.
+
+    Returns:
+        dict: Report with counts, throughput and latency summaries (seconds).
+    """
+    from metrics import METRICS
+    from quota import priority
+    METRICS.reset()
+    run_metrics = Metrics()
+    source = itertools.cycle(records) if duration else iter(records)
+    if limit:
+        source = itertools.islice(source, limit)
+    errors: Dict[str, int] = {}
+    errors_lock = threading.Lock()
+    # Closed loop (rate 0): keep at most `concurrency` requests in flight
+    in_flight = threading.BoundedSemaphore(concurrency) if rate <= 0 else None
+
+    def worker(record, scheduled):
+        started = time.perf_counter()
+        run_metrics.observe('queue_wait', started - scheduled)
+        try:
+            _run_one(record, stage, num_results)
+            run_metrics.incr('completed')
+        except Exception as e:
+            with errors_lock:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        finally:
+            # Open-loop latency: measured from the scheduled arrival, so queueing counts
+            run_metrics.observe('latency', time.perf_counter() - scheduled)
+            if in_flight:
+                in_flight.release()
+
+    start = time.perf_counter()
+    sent = 0
+    with priority('batch'), ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='replay') as executor:
+        for record in source:
+            if in_flight:
+                in_flight.acquire()
+            scheduled = start + sent / rate if rate > 0 else time.perf_counter()
+            if duration and scheduled - start >= duration:
+                if in_flight:
+                    in_flight.release()
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(worker, record, scheduled)
+            sent += 1
+    elapsed = time.perf_counter() - start
+
+    from cache import SEARCH_CACHE, SCRAPE_CACHE
+    from domain_health import DOMAIN_HEALTH
+    from google_search import api_usage
+    from quota import QUOTA
+    completed = run_metrics.counters.get('completed', 0)
+    snapshot = METRICS.snapshot()
+    return {
+        'stage': stage,
+        'sent': sent,
+        'completed': completed,
+        'errors': errors,
+        'elapsed': elapsed,
+        'throughput': completed / elapsed if elapsed else 0.0,
+        'latency': run_metrics.summary('latency'),
+        'queue_wait': run_metrics.summary('queue_wait'),
+        'stages': snapshot['latencies'],
+        'counters': snapshot['counters'],
+        'cache_hit_ratio': {'search': SEARCH_CACHE.hit_ratio(), 'scrape': SCRAPE_CACHE.hit_ratio()},
+        'cse_calls': api_usage['cse_calls'],
+        'quota': QUOTA.snapshot(),
+        'domains': DOMAIN_HEALTH.snapshot(),
+    }
+
+def _format_summary(summary: Dict[str, float], unit: str = 'ms') -> str:
+    if not summary.get('count'):
+        return "no samples"
+    if unit == 'KB':
+        return (f"n={summary['count']} mean={summary['mean'] / 1024:.0f}KB p50={summary['p50'] / 1024:.0f}KB "
+                f"p90={summary['p90'] / 1024:.0f}KB max={summary['max'] / 1024:.0f}KB")
+    return (f"n={summary['count']} mean={summary['mean'] * 1000:.0f}ms p50={summary['p50'] * 1000:.0f}ms "
+            f"p90={summary['p90'] * 1000:.0f}ms p99={summary['p99'] * 1000:.0f}ms max={summary['max'] * 1000:.0f}ms")
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"Replayed {report['sent']} queries ({report['stage']}) in {report['elapsed']:.1f}s: "
+          f"{report['completed']} completed, {sum(report['errors'].values())} errors {report['errors'] or ''}")
+    print(f"Throughput: {report['throughput']:.2f} req/s")
+    print(f"Latency:    {_format_summary(report['latency'])}")
+    print(f"Queue wait: {_format_summary(report['queue_wait'])}")
+    for name, summary in sorted(report['stages'].items()):
+        print(f"  {name:<16} {_format_summary(summary, 'KB' if name.startswith('size.') else 'ms')}")
+    politeness = report['stages'].get('stage.politeness', {})
+    if politeness.get('count'):
+        print(f"Politeness sleeps: {politeness['count']} x {politeness['mean'] * 1000:.0f}ms, included in the latency "
+              f"above (SCRAPE_POLITENESS_DELAY=0 to leave them out)")
+    ratios = report['cache_hit_ratio']
+    print(f"Cache hit ratio: search {ratios['search']:.0%}, scrape {ratios['scrape']:.0%}; "
+          f"Custom Search calls: {report['cse_calls']}")
+    if 'quota' in report:
+        from quota import describe
+        degraded = {name.split('.')[2]: count for name, count in report['counters'].items()
+                    if name.startswith('quota.degraded.')}
+        print(describe(report['quota']) + (f"; degraded: {degraded}" if degraded else ''))
+    shared = {name.split('.')[1]: count for name, count in report['counters'].items()
+              if name.startswith('singleflight.') and name.endswith('.shared')}
+    if shared:
+        print(f"Shared in-flight calls (single-flight): {shared}")
+    open_breakers = [domain for domain, stats in report['domains'].items() if stats['state'] != 'closed']
+    if open_breakers:
+        print(f"Open circuit breakers: {', '.join(open_breakers)}")
+    if 'stub' in report:
+        print(f"Stub requests: {report['stub']}")
+    if 'canonical_keys' in report:
+        for line in describe_hit_rates(report['canonical_keys']):
+            print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('log', help='query log (JSON lines, see query_log.py)')
+    parser.add_argument('--rate', type=float, default=2.0, help='arrivals per second, 0 = closed loop (default: 2)')
+    parser.add_argument('--concurrency', type=int, default=4, help='worker threads (default: 4)')
+    parser.add_argument('--duration', type=float, help='run for N seconds, cycling the log')
+    parser.add_argument('--limit', type=int, help='stop after N requests')
+    parser.add_argument('--stage', choices=['recommend', 'search'], default='recommend')
+    parser.add_argument('--num-results', type=int, default=5)
+    parser.add_argument('--cold', action='store_true', help='use a fresh, empty cache database')
+    parser.add_argument('--stub', action='store_true',
+                        help='serve all external endpoints from an in-process stub (implies --cold, SQLite cache)')
+    parser.add_argument('--llm-delay', type=float, default=0.0, help='stub completions latency (s)')
+    parser.add_argument('--cse-delay', type=float, default=0.0, help='stub search latency (s)')
+    parser.add_argument('--page-delay', type=float, default=0.0, help='stub page latency (s)')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('--verbose', action='store_true', help='keep the pipeline log output')
+    args = parser.parse_args()
+
+    records = list(read_queries(args.log))
+    if not records:
+        parser.error(f"no queries in {args.log}")
+    if args.cold or args.stub:
+        # Stub results (localhost links, "Stub Restaurant N") must never reach the shared caches
+        state_dir = tempfile.mkdtemp(prefix='replay-cache-')
+        os.environ['FOOD_CACHE_PATH'] = os.path.join(state_dir, 'cache.sqlite3')
+        os.environ['FOOD_SNAPSHOT_PATH'] = os.path.join(state_dir, 'snapshots')
+    if args.stub:
+        os.environ['FOOD_CACHE_BACKEND'] = 'sqlite'
+
+    stub = None
+    report_keys = key_hit_rates(records)
+
+    if args.stub:
+        from stub_server import StubConfig, start_stub_server
+        config = StubConfig(default_delay=args.llm_delay, cse_delay=args.cse_delay, page_delay=args.page_delay)
+        server, base_url = start_stub_server(config=config)
+        stub = (server, config)
+        os.environ.update({
+            'TOGETHER_API_URL': f"{base_url}/v1/completions",
+            'TOGETHER_API_KEY': 'stub',
+            'GOOGLE_CSE_URL': f"{base_url}/customsearch/v1",
+            'GOOGLE_API_KEY': 'stub',
+            'GOOGLE_CSE_ID': 'stub',
+        })
+        os.environ.setdefault('SCRAPE_POLITENESS_DELAY', '0')
+
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    with output:
+        report = replay(records, args.rate, args.concurrency, args.duration, args.limit, args.stage, args.num_results)
+    report['canonical_keys'] = report_keys
+    if stub:
+        server, config = stub
+        report['stub'] = {'completions': config.requests, 'search': config.cse_requests, 'pages': config.page_requests}
+        server.shutdown()
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Ad / relevance filter for Custom Search items, compiled once per query.
+# Every keyword list becomes a single regex automaton, and the location terms
+# are precomputed instead of being re-split for every item, so filtering the
+# 50-100 items of a paginated search is one pass with a few regex scans per item.
+
+AD_KEYWORDS = ['sponsored', 'advertisement', 'promoted', 'ad:', 'deals', 'offers', 'discount', 'sale']
+AD_DOMAIN_MARKERS = ['ad.', '.ad', 'ads.', 'advertising.', 'promo.', 'deals.']
+CITY_NAMES = ['bangalore', 'bengaluru']
+
+def _substring_automaton(terms: Iterable[str]) -> Optional["re.Pattern"]:
+    """Compile terms into one alternation matching any of them as a plain substring."""
+    # Longest first so overlapping terms report the most specific match
+    unique_terms = sorted({term for term in terms if term}, key=len, reverse=True)
+    if not unique_terms:
+        return None
+    return re.compile('|'.join(re.escape(term) for term in unique_terms))
+
+class ResultFilter:
+    """
+    Drop ad and off-location search items.
+
+    Matching is plain lowercase substring matching, the same rules the inline
+    filter loop used: an item is dropped if its title or snippet contains an ad
+    keyword, if its link contains an ad domain marker, or if neither the query
+    location, a nearby locality nor the city context appears in its title/snippet.
+    """
+
+    def __init__(self, location: str, location_context: str = '',
+                 ad_keywords: List[str] = AD_KEYWORDS, ad_domains: List[str] = AD_DOMAIN_MARKERS,
+                 nearby: Iterable[str] = ()):
+        self.location = location
+        self.location_context = location_context
+        self._ad_keywords = _substring_automaton(keyword.lower() for keyword in ad_keywords)
+        self._ad_domains = _substring_automaton(domain.lower() for domain in ad_domains)
+
+        location_terms = set(location.lower().split())
+        if location_context:
+            location_terms.update(location_context.lower().split())
+            # A result mentioning the city is still relevant for a locality inside it
+            if location_context.lower() == 'bangalore':
+                location_terms.update(CITY_NAMES)
+        # Adjacent localities (localities.nearby_terms) count as relevant, matched as whole names
+        location_terms.update(term.lower() for term in nearby)
+        self.location_terms = frozenset(location_terms)
+        self._location = _substring_automaton(self.location_terms)
+
+    def check(self, item: Dict[str, Any]) -> Optional[str]:
+        """Return the reason the item should be dropped, or None to keep it."""
+        # Title and snippet are joined with a newline so no keyword can match across them
+        content = f"{item.get('title', '')}\n{item.get('snippet', '')}".lower()
+
+        if self._ad_keywords:
+            match = self._ad_keywords.search(content)
+            if match:
+                return f"ad keyword '{match.group(0)}'"
+
+        if self._ad_domains:
+            match = self._ad_domains.search(item.get('link', '').lower())
+            if match:
+                return f"ad domain marker '{match.group(0)}'"
+
+        if self._location and not self._location.search(content):
+            context = f" or {self.location_context}" if self.location_context else ''
+            return f"not relevant to {self.location}{context}"
+        return None
+
+    def apply(self, items: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Tuple[Dict[str, Any], str]]]:
+        """
+        Filter items in one pass.
+
+        Returns:
+            Tuple of (kept items in input order, [(dropped item, reason)]).
+        """
+        kept, dropped = [], []
+        for item in items:
+            reason = self.check(item)
+            if reason is None:
+                kept.append(item)
+            else:
+                dropped.append((item, reason))
+        return kept, dropped
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Optional
+
+from metrics import METRICS
+from quota import QUOTA, priority
+
+# Background refreshes for stale-while-revalidate.
+# When a cache lookup returns a stale entry (cache.Cache.lookup), the caller
+# answers with it immediately and schedules the refresh here. Refreshes are
+# bounded so a burst of stale hits cannot stampede the upstream APIs:
+#   - one pending refresh per key (later requests for the same key are dropped),
+#   - a token bucket (FOOD_REFRESH_PER_MINUTE, default 12, burst FOOD_REFRESH_BURST 4),
+#   - an hourly quota of Custom Search calls spent on refreshes
+#     (FOOD_REFRESH_CSE_PER_HOUR, default 60; each job declares its cost),
+#   - FOOD_REFRESH_WORKERS threads (default 2) and at most MAX_PENDING queued jobs.
+# Refreshes run at 'refresh' quota priority (quota.py), so they never spend the
+# share of the daily Custom Search quota reserved for interactive users.
+# Dropped refreshes are fine: the next stale hit schedules another.
+
+MAX_PENDING = 32
+QUOTA_WINDOW = 3600.0
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_take(self, tokens: float = 1.0) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+class Revalidator:
+    def __init__(self, workers: Optional[int] = None, per_minute: Optional[float] = None,
+                 burst: Optional[float] = None, cse_per_hour: Optional[int] = None):
+        self.workers = workers or int(os.getenv('FOOD_REFRESH_WORKERS', 2))
+        self.bucket = TokenBucket((per_minute or float(os.getenv('FOOD_REFRESH_PER_MINUTE', 12))) / 60.0,
+                                  burst or float(os.getenv('FOOD_REFRESH_BURST', 4)))
+        self.cse_per_hour = cse_per_hour if cse_per_hour is not None else int(os.getenv('FOOD_REFRESH_CSE_PER_HOUR', 60))
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._spent = deque()  # (time, Custom Search calls) per scheduled refresh in the last hour
+
+    def _quota_available(self, cost: int) -> bool:
+        cutoff = time.time() - QUOTA_WINDOW
+        while self._spent and self._spent[0][0] < cutoff:
+            self._spent.popleft()
+        return sum(spent for _, spent in self._spent) + cost <= self.cse_per_hour
+
+    def schedule(self, key: Hashable, refresh: Callable[[], object], cost: int = 0) -> bool:
+        """
+        Run refresh() in the background unless it is already pending or over a limit.
+
+        Args:
+            key: Identifies the cache entry being refreshed.
+            refresh: Recomputes the value and writes it back to its cache.
+            cost (int): Custom Search API calls the refresh may spend.
+
+        Returns:
+            bool: True if the refresh was queued.
+        """
+        with self._lock:
+            if key in self._pending:
+                return False
+            if len(self._pending) >= MAX_PENDING:
+                METRICS.incr('swr.dropped.backlog')
+                return False
+            if cost and not (self._quota_available(cost) and QUOTA.available(cost, 'refresh')):
+                METRICS.incr('swr.dropped.quota')
+                return False
+            if not self.bucket.try_take():
+                METRICS.incr('swr.dropped.rate')
+                return False
+            if cost:
+                self._spent.append((time.time(), cost))
+            self._pending.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='revalidate')
+        METRICS.incr('swr.scheduled')
+        self._executor.submit(self._run, key, refresh)
+        return True
+
+    def _run(self, key: Hashable, refresh: Callable[[], object]) -> None:
+        try:
+            with METRICS.timed('swr.refresh'), priority('refresh'):
+                refresh()
+            METRICS.incr('swr.refreshed')
+        except Exception as e:
+            METRICS.incr('swr.failed')
+            print(f"Background refresh failed for {key}: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            spent = sum(cost for when, cost in self._spent if when >= time.time() - QUOTA_WINDOW)
+            return {'pending': len(self._pending), 'cse_calls_last_hour': spent, 'cse_per_hour': self.cse_per_hour}
+
+    def drain(self, timeout: float = 30.0) -> None:
+        """Wait (up to timeout seconds) until no refresh is pending; for CLIs and tests."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._pending:
+                    return
+            time.sleep(0.05)
+
+def format_age(seconds: float) -> str:
+    """'just now', '12 min ago', '3 h ago', '2 days ago'."""
+    if seconds < 60:
+        return 'just now'
+    if seconds < 3600:
+        return f"{int(seconds // 60)} min ago"
+    if seconds < 2 * 86400:
+        return f"{int(seconds // 3600)} h ago"
+    return f"{int(seconds // 86400)} days ago"
+
+REVALIDATOR = Revalidator()
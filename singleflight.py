@@ -0,0 +1,66 @@
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from metrics import METRICS
+
+# Single-flight deduplication for identical concurrent calls.
+# Streamlit runs every session as a thread of one process, so when several
+# users submit the same query at the same moment, the first caller (the
+# leader) does the work and the others block until it finishes and receive
+# the same result, or the same exception. Nothing is remembered afterwards;
+# repeat calls are served by cache.py. Shared results must be treated as
+# read-only by callers.
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """Run func() unless a call with this key is already in flight; then wait for its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            METRICS.incr(f'singleflight.{self.name}.shared')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        METRICS.incr(f'singleflight.{self.name}.executed')
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+SEARCH_FLIGHTS = SingleFlight('search')
+SCRAPE_FLIGHTS = SingleFlight('scrape')
+LLM_FLIGHTS = SingleFlight('llm')
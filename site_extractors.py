@@ -0,0 +1,256 @@
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+import patterns
+from domain_health import domain_of
+from incremental_extract import MAX_MENU_ITEMS
+from metrics import METRICS
+from records import MenuItem, RestaurantInfo, parse_price
+
+# Site-specific extractor plugins for the domains that make up most results.
+# A plugin reads the page's embedded structured data (schema.org JSON-LD,
+# Next.js __NEXT_DATA__ state) or a handful of CSS selectors instead of the
+# generic keyword walk over the whole document, so known domains extract in a
+# few milliseconds. A plugin returns None when the page does not have what it
+# expects, and scrape_website falls back to the generic extractor.
+#
+# Timing per plugin is recorded as extract.<plugin> in metrics.METRICS, with
+# extract.<plugin>.hit / .fallback counters.
+#
+# SITE_SELECTORS points to a JSON file of CSS-selector plugins, one per domain:
+#   {"someblog.in": {"name": "h1.entry-title", "cuisine": ".cuisine", "location": ".address",
+#                    "price_range": ".cost", "menu_item": "table.menu tr",
+#                    "menu_name": "td:nth-of-type(1)", "menu_price": "td:nth-of-type(2)",
+#                    "parse_only": ["h1", "div", "table"]}}
+# "parse_only" limits parsing to those tags (much faster on large pages).
+
+RESTAURANT_TYPES = frozenset(['restaurant', 'foodestablishment', 'fastfoodrestaurant', 'cafeorcoffeeshop',
+                              'barorpub', 'bakery', 'icecreamshop', 'localbusiness'])
+CURRENCY_SYMBOLS = {'INR': '₹', 'USD': '$', 'EUR': '€', 'GBP': '£'}
+
+class SiteExtractor:
+    """A plugin: extract(html) returns a RestaurantInfo, or None to fall back to the generic extractor."""
+    name = 'site'
+
+    def extract(self, html: str) -> Optional[RestaurantInfo]:
+        raise NotImplementedError
+
+def _text(value: Any) -> str:
+    if isinstance(value, list):
+        return ', '.join(_text(v) for v in value if v)
+    if isinstance(value, dict):
+        return _text(value.get('name') or value.get('@value') or '')
+    return patterns.WHITESPACE.sub(' ', str(value)).strip() if value is not None else ''
+
+def _add_menu_item(items: List[MenuItem], seen: set, name: Any, price: Optional[float], currency: str) -> None:
+    name = _text(name)
+    if name and price is not None and name not in seen and len(items) < MAX_MENU_ITEMS:
+        seen.add(name)
+        items.append(MenuItem(name=name, price=price, currency=currency))
+
+# --- schema.org JSON-LD ---
+def json_ld_objects(html: str) -> Iterator[Dict[str, Any]]:
+    """Every JSON-LD object on the page, with @graph containers and top-level lists flattened."""
+    for match in patterns.JSON_LD_SCRIPT.finditer(html):
+        try:
+            data = json.loads(match.group(1).strip())
+        except ValueError:
+            continue
+        stack = data if isinstance(data, list) else [data]
+        while stack:
+            obj = stack.pop(0)
+            if isinstance(obj, list):
+                stack.extend(obj)
+            elif isinstance(obj, dict):
+                if '@graph' in obj:
+                    stack.extend(obj['@graph'] if isinstance(obj['@graph'], list) else [obj['@graph']])
+                else:
+                    yield obj
+
+def _schema_types(obj: Dict[str, Any]) -> set:
+    types = obj.get('@type', [])
+    return {str(t).lower() for t in (types if isinstance(types, list) else [types])}
+
+def _address(value: Any) -> str:
+    if isinstance(value, dict):
+        parts = [value.get(key) for key in ('streetAddress', 'addressLocality', 'addressRegion')]
+        return ', '.join(_text(part) for part in parts if part)
+    return _text(value)
+
+def _schema_menu(menu: Any, items: List[MenuItem], seen: set) -> None:
+    """Collect hasMenuItem entries from a Menu / MenuSection tree (URL-only menus are skipped)."""
+    if isinstance(menu, list):
+        for entry in menu:
+            _schema_menu(entry, items, seen)
+        return
+    if not isinstance(menu, dict):
+        return
+    for section in ('hasMenu', 'hasMenuSection'):
+        if section in menu:
+            _schema_menu(menu[section], items, seen)
+    menu_items = menu.get('hasMenuItem') or []
+    for item in menu_items if isinstance(menu_items, list) else [menu_items]:
+        if not isinstance(item, dict):
+            continue
+        offers = item.get('offers') or {}
+        offer = offers[0] if isinstance(offers, list) and offers else offers
+        if not isinstance(offer, dict):
+            continue
+        currency = str(offer.get('priceCurrency') or 'INR').upper()
+        _add_menu_item(items, seen, item.get('name'), parse_price(offer.get('price')),
+                       CURRENCY_SYMBOLS.get(currency, currency))
+
+def info_from_schema(obj: Dict[str, Any]) -> RestaurantInfo:
+    """RestaurantInfo from a schema.org Restaurant (or other FoodEstablishment) object."""
+    info = RestaurantInfo(name=_text(obj.get('name')), cuisine=_text(obj.get('servesCuisine')),
+                          location=_address(obj.get('address')), price_range=_text(obj.get('priceRange')),
+                          contact=_text(obj.get('telephone')), timing=_text(obj.get('openingHours')))
+    rating = obj.get('aggregateRating')
+    if isinstance(rating, dict) and rating.get('ratingValue'):
+        info.rating = f"{_text(rating['ratingValue'])}/{_text(rating.get('bestRating') or 5)}"
+    seen = set()
+    _schema_menu(obj, info.menu_items, seen)
+    return info
+
+class JsonLdExtractor(SiteExtractor):
+    """schema.org Restaurant JSON-LD, as embedded by most aggregators for search engines."""
+    name = 'json_ld'
+
+    def extract(self, html: str) -> Optional[RestaurantInfo]:
+        for obj in json_ld_objects(html):
+            if _schema_types(obj) & RESTAURANT_TYPES and obj.get('name'):
+                return info_from_schema(obj)
+        return None
+
+# --- Next.js page state ---
+def _walk(value: Any) -> Iterator[Dict[str, Any]]:
+    stack = [value]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            yield node
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+class NextDataExtractor(JsonLdExtractor):
+    """
+    Next.js __NEXT_DATA__ state (Swiggy): the restaurant record has 'name' and a
+    'cuisines' list; dishes have 'name' and an integer 'price'/'defaultPrice' in paise.
+    JSON-LD on the same page fills anything the state lacks.
+    """
+    name = 'next_data'
+    price_scale = 0.01
+
+    def extract(self, html: str) -> Optional[RestaurantInfo]:
+        info = super().extract(html) or RestaurantInfo()
+        match = patterns.NEXT_DATA_SCRIPT.search(html)
+        if match:
+            try:
+                state = json.loads(match.group(1))
+            except ValueError:
+                state = None
+            seen = {item.name for item in info.menu_items}
+            for node in _walk(state):
+                if isinstance(node.get('cuisines'), list) and node.get('name') and not info.cuisine:
+                    info.name = info.name or _text(node['name'])
+                    info.cuisine = _text(node['cuisines'])
+                    info.location = info.location or _text(node.get('areaName') or node.get('locality'))
+                    info.price_range = info.price_range or _text(node.get('costForTwoMessage'))
+                    info.rating = info.rating or _text(node.get('avgRatingString') or node.get('avgRating'))
+                    continue
+                price = node.get('price', node.get('defaultPrice'))
+                if node.get('name') and isinstance(price, int) and not isinstance(price, bool):
+                    _add_menu_item(info.menu_items, seen, node['name'], price * self.price_scale, '₹')
+        return None if info.is_empty() else info
+
+# --- CSS selectors ---
+class SelectorExtractor(SiteExtractor):
+    """Targeted CSS selectors for one site's markup (see SITE_SELECTORS above)."""
+    FIELDS = ('name', 'cuisine', 'location', 'price_range', 'rating', 'specialties', 'contact', 'timing', 'features')
+
+    def __init__(self, name: str, selectors: Dict[str, Any]):
+        self.name = name
+        self.selectors = selectors
+        parse_only = selectors.get('parse_only')
+        self._strainer = SoupStrainer(parse_only) if parse_only else None
+
+    def extract(self, html: str) -> Optional[RestaurantInfo]:
+        soup = BeautifulSoup(html, 'html.parser', parse_only=self._strainer)
+        info = RestaurantInfo()
+        for field in self.FIELDS:
+            selector = self.selectors.get(field)
+            if selector:
+                element = soup.select_one(selector)
+                if element is not None:
+                    setattr(info, field, _text(element.get_text(' ')))
+        item_selector = self.selectors.get('menu_item')
+        if item_selector:
+            seen = set()
+            for row in soup.select(item_selector):
+                name_tag = row.select_one(self.selectors['menu_name']) if self.selectors.get('menu_name') else row
+                price_tag = row.select_one(self.selectors['menu_price']) if self.selectors.get('menu_price') else row
+                if name_tag is None or price_tag is None:
+                    continue
+                price_match = patterns.MENU_PRICE.search(price_tag.get_text(' '))
+                if price_match:
+                    name = name_tag.get_text(' ') if name_tag is not price_tag else \
+                        price_tag.get_text(' ')[:price_match.start()]
+                    _add_menu_item(info.menu_items, seen, name, float(price_match.group('amount')),
+                                   price_match.group('currency'))
+        return None if info.is_empty() else info
+
+# --- Registry ---
+_REGISTRY: Dict[str, SiteExtractor] = {}
+
+def register(extractor: SiteExtractor, *domains: str) -> SiteExtractor:
+    """Use extractor for pages on these domains (and their subdomains)."""
+    for domain in domains:
+        _REGISTRY[domain.lower()] = extractor
+    return extractor
+
+def extractor_for(url: str) -> Optional[SiteExtractor]:
+    """The plugin for url's domain or its closest registered parent domain, if any."""
+    labels = domain_of(url).split('.')
+    for start in range(len(labels) - 1):
+        extractor = _REGISTRY.get('.'.join(labels[start:]))
+        if extractor is not None:
+            return extractor
+    return None
+
+def extract_with_plugin(url: str, html: str) -> Optional[RestaurantInfo]:
+    """Run the plugin for url's domain; None if there is none or it found nothing (use the generic extractor)."""
+    extractor = extractor_for(url)
+    if extractor is None:
+        return None
+    with METRICS.timed(f'extract.{extractor.name}'):
+        try:
+            info = extractor.extract(html)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"Site extractor {extractor.name} failed on {url}: {str(e)}")
+            info = None
+    METRICS.incr(f'extract.{extractor.name}.{"fallback" if info is None else "hit"}')
+    return info
+
+def load_selector_plugins(path: Optional[str] = None) -> int:
+    """Register the CSS-selector plugins from a SITE_SELECTORS file; returns how many were loaded."""
+    path = path or os.getenv('SITE_SELECTORS')
+    if not path:
+        return 0
+    try:
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not load site selectors from {path}: {str(e)}")
+        return 0
+    for domain, selectors in config.items():
+        register(SelectorExtractor(f"css.{domain}", selectors), domain)
+    return len(config)
+
+JSON_LD = register(JsonLdExtractor(), 'zomato.com', 'dineout.co.in', 'eazydiner.com', 'magicpin.in',
+                   'tripadvisor.in', 'tripadvisor.com', 'justdial.com')
+NEXT_DATA = register(NextDataExtractor(), 'swiggy.com')
+load_selector_plugins()
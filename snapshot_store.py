@@ -0,0 +1,249 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip is always available
+    zstandard = None
+
+# Content-addressed store of raw fetched page bodies, so improved extraction
+# heuristics can be re-run over pages already fetched (reextract.py) instead of
+# re-fetching them, and so profiling has a realistic offline corpus.
+#
+# Bodies are compressed (zstd when the zstandard package is installed, else
+# gzip) and stored once per SHA-256 of the raw bytes under objects/ab/cdef....
+# A SQLite index maps each URL to its latest body plus fetch metadata: fetch
+# time, status, headers, encoding, whether the body is complete and the
+# extractor version that produced the cached record.
+#
+# FOOD_SNAPSHOTS: 'off' (default) disables the store, 'prefix' stores the bytes
+# the scraper read (with incremental extraction that may stop early), 'full'
+# keeps downloading the rest of the body for the snapshot after extraction stops.
+# FOOD_SNAPSHOT_PATH overrides the store directory (default: .cache/snapshots).
+#
+# A re-fetched URL replaces its snapshot and the old object is deleted once no
+# URL refers to it. prune() (reextract.py --prune-days / --max-mb) bounds the
+# store by age and size.
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'snapshots')
+SNAPSHOT_MODES = ('off', 'prefix', 'full')
+ZSTD_LEVEL = 10
+# prune() leaves unreferenced object files younger than this (seconds) alone
+ORPHAN_GRACE = 3600
+# Response headers worth keeping (the rest are per-request noise)
+KEPT_HEADERS = ('content-type', 'content-encoding', 'content-language', 'last-modified', 'etag',
+                'cache-control', 'server')
+
+def snapshot_mode() -> str:
+    mode = os.getenv('FOOD_SNAPSHOTS', 'off').strip().lower()
+    return mode if mode in SNAPSHOT_MODES else 'off'
+
+@dataclass
+class Snapshot:
+    url: str
+    digest: str
+    codec: str
+    fetched_at: float
+    status: int
+    encoding: Optional[str]
+    headers: Dict[str, str]
+    size: int
+    stored_size: int
+    complete: bool
+    extractor_version: int
+
+_SNAPSHOT_COLUMNS = ('url', 'digest', 'codec', 'fetched_at', 'status', 'encoding', 'headers', 'size', 'stored_size',
+                     'complete', 'extractor_version')
+
+class SnapshotStore:
+    """Compressed raw HTML bodies keyed by content hash, indexed by URL."""
+
+    def __init__(self, root: Optional[str] = None):
+        self._root = root
+        self._local = threading.local()
+
+    @property
+    def root(self) -> str:
+        return self._root or os.getenv('FOOD_SNAPSHOT_PATH', DEFAULT_SNAPSHOT_PATH)
+
+    def _db(self) -> sqlite3.Connection:
+        """One connection per thread (and store directory)."""
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        connection = connections.get(self.root)
+        if connection is None:
+            os.makedirs(self.root, exist_ok=True)
+            connection = sqlite3.connect(os.path.join(self.root, 'index.sqlite3'), timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS snapshots ('
+                ' url TEXT PRIMARY KEY, digest TEXT NOT NULL, codec TEXT NOT NULL, fetched_at REAL NOT NULL,'
+                ' status INTEGER, encoding TEXT, headers TEXT, size INTEGER, stored_size INTEGER,'
+                ' complete INTEGER, extractor_version INTEGER)'
+            )
+            connections[self.root] = connection
+        return connection
+
+    def _object_path(self, digest: str, codec: str) -> str:
+        return os.path.join(self.root, 'objects', digest[:2], f"{digest[2:]}.{codec}")
+
+    def put(self, url: str, body: bytes, status: int = 200, encoding: Optional[str] = None,
+            headers: Optional[Dict[str, str]] = None, complete: bool = True, extractor_version: int = 0,
+            fetched_at: Optional[float] = None) -> Optional[Snapshot]:
+        """Store body for url (deduplicated by content) and return its index entry, or None on failure."""
+        digest = hashlib.sha256(body).hexdigest()
+        codec = 'zst' if zstandard is not None else 'gz'
+        path = self._object_path(digest, codec)
+        try:
+            if os.path.exists(path):
+                stored_size = os.path.getsize(path)
+            else:
+                if codec == 'zst':
+                    compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+                else:
+                    compressed = gzip.compress(body, compresslevel=6)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Write-then-rename so concurrent readers never see a partial object
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(compressed)
+                os.replace(tmp_path, path)
+                stored_size = len(compressed)
+            kept = {name.lower(): value for name, value in (headers or {}).items() if name.lower() in KEPT_HEADERS}
+            snapshot = Snapshot(url=url, digest=digest, codec=codec,
+                                fetched_at=time.time() if fetched_at is None else fetched_at,
+                                status=status, encoding=encoding, headers=kept, size=len(body),
+                                stored_size=stored_size, complete=complete, extractor_version=extractor_version)
+            connection = self._db()
+            with connection:
+                previous = connection.execute('SELECT digest, codec FROM snapshots WHERE url = ?', (url,)).fetchone()
+                connection.execute(
+                    f"INSERT OR REPLACE INTO snapshots ({', '.join(_SNAPSHOT_COLUMNS)}) VALUES ({', '.join('?' * len(_SNAPSHOT_COLUMNS))})",
+                    (url, digest, codec, snapshot.fetched_at, status, encoding, json.dumps(kept), len(body),
+                     stored_size, int(complete), extractor_version)
+                )
+            if previous is not None and tuple(previous) != (digest, codec):
+                self._delete_unreferenced([tuple(previous)])
+            return snapshot
+        except (OSError, sqlite3.Error) as e:
+            print(f"Snapshot write failed for {url}: {str(e)}")
+            return None
+
+    def _row_to_snapshot(self, row) -> Snapshot:
+        values = dict(zip(_SNAPSHOT_COLUMNS, row))
+        values['headers'] = json.loads(values['headers'] or '{}')
+        values['complete'] = bool(values['complete'])
+        return Snapshot(**values)
+
+    def get(self, url: str) -> Optional[Snapshot]:
+        row = self._db().execute(
+            f"SELECT {', '.join(_SNAPSHOT_COLUMNS)} FROM snapshots WHERE url = ?", (url,)).fetchone()
+        return None if row is None else self._row_to_snapshot(row)
+
+    def entries(self, below_version: Optional[int] = None) -> Iterator[Snapshot]:
+        """Every indexed snapshot, optionally only those extracted by an older extractor version."""
+        query = f"SELECT {', '.join(_SNAPSHOT_COLUMNS)} FROM snapshots"
+        params = ()
+        if below_version is not None:
+            query += ' WHERE extractor_version < ?'
+            params = (below_version,)
+        for row in self._db().execute(query + ' ORDER BY url', params).fetchall():
+            yield self._row_to_snapshot(row)
+
+    def read_body(self, snapshot: Snapshot) -> bytes:
+        """The decompressed raw body of a snapshot."""
+        with open(self._object_path(snapshot.digest, snapshot.codec), 'rb') as f:
+            compressed = f.read()
+        if snapshot.codec == 'zst':
+            if zstandard is None:
+                raise RuntimeError("snapshot is zstd-compressed but the zstandard package is not installed")
+            return zstandard.ZstdDecompressor().decompress(compressed)
+        return gzip.decompress(compressed)
+
+    def mark_extracted(self, url: str, extractor_version: int) -> None:
+        connection = self._db()
+        with connection:
+            connection.execute('UPDATE snapshots SET extractor_version = ? WHERE url = ?', (extractor_version, url))
+
+    def _delete_unreferenced(self, objects: Iterable[Tuple[str, str]]) -> Tuple[int, int]:
+        """Delete the (digest, codec) objects no snapshot refers to; returns (objects, bytes) removed."""
+        removed = freed = 0
+        for digest, codec in objects:
+            if self._db().execute('SELECT 1 FROM snapshots WHERE digest = ? AND codec = ? LIMIT 1',
+                                  (digest, codec)).fetchone():
+                continue
+            path = self._object_path(digest, codec)
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+            freed += size
+        return removed, freed
+
+    def prune(self, max_age: Optional[float] = None, max_bytes: Optional[int] = None) -> Dict[str, int]:
+        """
+        Drop snapshots fetched more than max_age seconds ago, then the oldest ones until the
+        stored objects total at most max_bytes, then every object file no snapshot refers to
+        (e.g. left behind by a crash). Returns counts of what was removed.
+        """
+        connection = self._db()
+        dropped = []
+        with connection:
+            if max_age is not None:
+                cutoff = time.time() - max_age
+                dropped += connection.execute('SELECT digest, codec FROM snapshots WHERE fetched_at < ?',
+                                              (cutoff,)).fetchall()
+                connection.execute('DELETE FROM snapshots WHERE fetched_at < ?', (cutoff,))
+            if max_bytes is not None:
+                # Objects are shared between URLs with identical bodies, so count each once
+                total = connection.execute('SELECT COALESCE(SUM(stored_size), 0) FROM'
+                                           ' (SELECT DISTINCT digest, codec, stored_size FROM snapshots)').fetchone()[0]
+                for url, digest, codec, stored_size in connection.execute(
+                        'SELECT url, digest, codec, stored_size FROM snapshots ORDER BY fetched_at').fetchall():
+                    if total <= max_bytes:
+                        break
+                    connection.execute('DELETE FROM snapshots WHERE url = ?', (url,))
+                    dropped.append((digest, codec))
+                    if not connection.execute('SELECT 1 FROM snapshots WHERE digest = ? AND codec = ? LIMIT 1',
+                                              (digest, codec)).fetchone():
+                        total -= stored_size or 0
+        objects, freed = self._delete_unreferenced(set(map(tuple, dropped)))
+        # Orphans from interrupted writes or older versions of this store
+        referenced = {(digest, codec) for digest, codec in connection.execute('SELECT digest, codec FROM snapshots')}
+        objects_root = os.path.join(self.root, 'objects')
+        for directory, _, files in os.walk(objects_root):
+            for name in files:
+                stem, _, codec = name.partition('.')
+                if (os.path.basename(directory) + stem, codec) in referenced:
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    # Recent files may belong to a put() that has not indexed them yet
+                    if os.path.getmtime(path) > time.time() - ORPHAN_GRACE:
+                        continue
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+                    objects += 1
+                except OSError:
+                    continue
+        return {'snapshots': len(dropped), 'objects': objects, 'bytes': freed}
+
+    def stats(self) -> Dict[str, float]:
+        """Snapshot count, raw and stored bytes, and the compression ratio."""
+        count, raw, stored, objects = self._db().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0), COUNT(DISTINCT digest)'
+            ' FROM snapshots').fetchone()
+        return {'snapshots': count, 'objects': objects, 'raw_bytes': raw, 'stored_bytes': stored,
+                'ratio': raw / stored if stored else 0.0}
+
+SNAPSHOTS = SnapshotStore()
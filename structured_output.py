@@ -0,0 +1,179 @@
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from card_parser import Card
+from records import format_price, parse_price
+
+# Structured (JSON) output mode for the recommendation call.
+# Instead of the emoji-decorated free text, the model is asked for compact JSON
+# matching RECOMMENDATION_SCHEMA. Decoration tokens are not generated, a much
+# smaller max_tokens suffices, and the output is validated/repaired locally and
+# turned into the same Card records the text parser produces. Totals are
+# recomputed from item prices, so over-budget cards are rejected before rendering.
+#
+# Enable with the LLM_OUTPUT_MODE=json environment variable.
+
+RECOMMENDATION_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "required": ["recommendations"],
+    "properties": {
+        "recommendations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["restaurant", "items", "total"],
+                "properties": {
+                    "restaurant": {"type": "string"},
+                    "location": {"type": "string"},
+                    "link": {"type": "string"},
+                    "items": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "required": ["name", "price"],
+                            "properties": {"name": {"type": "string"}, "price": {"type": ["number", "null"]}},
+                        },
+                    },
+                    "total": {"type": ["number", "null"]},
+                    "why": {"type": "string"},
+                    "offers": {"type": "string"},
+                },
+            },
+        },
+    },
+}
+
+JSON_MAX_TOKENS = 400
+# Minified JSON is a single line; a blank line or a code fence means the model is done
+JSON_STOP_SEQUENCES = ["\n\n", "```"]
+JSON_TEMPERATURE = 0.2
+# The prompt ends with this prefix so the completion starts inside the object
+JSON_PRIMER = '{"recommendations":['
+
+def json_mode_enabled() -> bool:
+    """True when LLM_OUTPUT_MODE=json is set in the environment."""
+    return os.getenv('LLM_OUTPUT_MODE', '').strip().lower() == 'json'
+
+def json_format_instructions(budget: float, num_people: int) -> str:
+    """Prompt tail asking for compact JSON instead of the emoji card format."""
+    return f"""Respond with ONE line of minified JSON and nothing else, matching this schema:
+{json.dumps(RECOMMENDATION_SCHEMA, separators=(',', ':'))}
+Rules: prices are plain numbers in rupees (null if unknown), "total" is the sum for all {num_people} people and MUST be <= {budget}, at most 3 recommendations, "why" under 20 words. If nothing fits the budget return {{"recommendations":[]}}.
+JSON:
+{JSON_PRIMER}"""
+
+_TRAILING_COMMA = re.compile(r',\s*([\]}])')
+_RESTARTED_OBJECT = re.compile(r'(?:```(?:json)?\s*)?\{\s*"recommendations"')
+
+def _close_truncated(text: str) -> str:
+    """Close strings/brackets left open when generation hit max_tokens or a stop sequence."""
+    stack = []
+    in_string = escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+        elif ch in '}]' and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = text.rstrip().rstrip(',:')
+    return text + ''.join(reversed(stack))
+
+def repair_json(text: str) -> Optional[Dict[str, Any]]:
+    """Parse model output as JSON, repairing the usual defects. Returns None if hopeless."""
+    text = text.strip()
+    # Completion continues the primer; re-attach it unless the model restarted the object
+    if not _RESTARTED_OBJECT.match(text):
+        text = JSON_PRIMER + text
+    text = text.replace('```json', '').replace('```', '')
+    candidates = [text, _TRAILING_COMMA.sub(r'\1', text)]
+    candidates.append(_close_truncated(candidates[-1]))
+    candidates.append(_TRAILING_COMMA.sub(r'\1', candidates[-1]))
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, list):
+            data = {"recommendations": data}
+        if isinstance(data, dict):
+            return data
+    return None
+
+def _to_card(entry: Dict[str, Any], num_people: int) -> Optional[Card]:
+    restaurant = str(entry.get('restaurant') or '').strip()
+    if not restaurant:
+        return None
+    menu_items, prices = [], []
+    for item in entry.get('items') or []:
+        if not isinstance(item, dict) or not item.get('name'):
+            continue
+        price = parse_price(item.get('price'))
+        prices.append(price)
+        menu_items.append(f"- {item['name']}: " + (f"₹{format_price(price)}" if price is not None else "Unknown"))
+
+    # Items are unit prices (no quantities), so their sum is a floor for the order, not the total:
+    # keep the model's total unless it is missing or below that floor
+    total = parse_price(entry.get('total'))
+    if prices and all(price is not None for price in prices):
+        total = sum(prices) if total is None else max(total, sum(prices))
+    per_person = total / num_people if total is not None and num_people else None
+    cost_text = ''
+    if total is not None:
+        cost_text = f"Total Cost: ₹{format_price(total)}"
+        if per_person is not None:
+            cost_text += f" (₹{format_price(round(per_person, 2))} per person)"
+    return Card(
+        restaurant=restaurant,
+        location=str(entry.get('location') or ''),
+        source_link=str(entry.get('link') or ''),
+        cost_text=cost_text,
+        total_cost=total,
+        per_person_cost=per_person,
+        menu_items=menu_items,
+        why=str(entry.get('why') or ''),
+        special_offers=str(entry.get('offers') or ''),
+    )
+
+def parse_recommendations(text: str, budget: Optional[float] = None, num_people: int = 1) -> Tuple[List[Card], List[str]]:
+    """
+    Validate and repair a JSON-mode response and convert it to cards.
+
+    Args:
+        text (str): Raw completion text (continuation of JSON_PRIMER).
+        budget (float): If given, cards whose total exceeds it are rejected.
+        num_people (int): Used for the per-person cost.
+
+    Returns:
+        Tuple of (cards, list of human-readable problems found).
+    """
+    problems = []
+    data = repair_json(text)
+    if data is None:
+        return [], ["Response was not valid JSON"]
+    entries = data.get('recommendations')
+    if not isinstance(entries, list):
+        return [], ["Response JSON has no 'recommendations' list"]
+
+    cards = []
+    for entry in entries:
+        card = _to_card(entry, num_people) if isinstance(entry, dict) else None
+        if card is None:
+            problems.append(f"Skipped malformed recommendation: {str(entry)[:80]}")
+            continue
+        if budget is not None and card.total_cost is not None and card.total_cost > budget:
+            problems.append(f"Rejected over-budget recommendation: {card.restaurant} (₹{format_price(card.total_cost)})")
+            continue
+        cards.append(card)
+    return cards, problems
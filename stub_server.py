@@ -0,0 +1,287 @@
+"""
+Local stubs of the external services, for tests and load runs.
+
+Answers POST /v1/completions with a canned response in the shape the apps
+expect: emoji cards normally, or a JSON-mode continuation when the prompt ends
+with the JSON primer. Per-model latency and failure injection make it possible
+to exercise llm_router's timeouts and hedging without network access.
+
+GET /customsearch/v1 imitates the Google Custom Search API (deterministic items
+per query, paginated with start/num) and its result links point at
+GET /page/<n>, small restaurant pages with a priced menu for the scraper.
+
+start_resp_stub() (or --resp-port) runs a small in-memory server speaking the
+Redis protocol (GET/SET with expiry, MGET, DEL, SCAN), for the Redis cache
+backend in cache_backends.py.
+
+Usage:
+    python stub_server.py --port 8765 --delay mistralai/Mixtral-8x7B-Instruct-v0.1=8
+    TOGETHER_API_URL=http://127.0.0.1:8765/v1/completions streamlit run food_app.py
+    GOOGLE_CSE_URL=http://127.0.0.1:8765/customsearch/v1 GOOGLE_API_KEY=stub GOOGLE_CSE_ID=stub python replay.py ...
+    python stub_server.py --resp-port 6390 & FOOD_CACHE_BACKEND=redis://127.0.0.1:6390 streamlit run food_app.py
+"""
+import argparse
+import fnmatch
+import json
+import socketserver
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from structured_output import JSON_PRIMER
+
+CARD_TEXT = """🏪 Stub Biryani House
+📍 Koramangala, Bangalore
+🔗 https://example.com/stub-biryani-house
+💰 Total Cost: ₹640 (₹320 per person)
+🍽️ Recommended Combination:
+   - Chicken Biryani: ₹320
+   - Chicken Biryani: ₹320
+   Total: ₹640
+✨ Why This Combo: Stub response for local testing
+🎁 Special Offers: None
+---"""
+
+JSON_TEXT = ('{"restaurant":"Stub Biryani House","location":"Koramangala","link":"https://example.com/stub-biryani-house",'
+             '"items":[{"name":"Chicken Biryani","price":320},{"name":"Chicken Biryani","price":320}],"total":640,'
+             '"why":"Stub response for local testing","offers":""}]}')
+
+# Search results per query (the real API stops at 100) and distinct stub pages
+STUB_RESULTS_PER_QUERY = 30
+STUB_PAGE_COUNT = 500
+
+PAGE_HTML = """<html><head><title>Stub Restaurant {n} | Zomato</title></head><body>
+<h1>Stub Restaurant {n}</h1>
+<p>Cuisine: North Indian, Biryani</p>
+<p>Location: Koramangala, Bangalore</p>
+<p>Cost for two: ₹{for_two}</p>
+<p>Rating: 4.{rating}/5</p>
+<ul class="menu">
+<li>Chicken Biryani ₹{price_a}</li>
+<li>Paneer Butter Masala ₹{price_b}</li>
+<li>Butter Naan ₹{price_c}</li>
+</ul></body></html>"""
+
+class StubConfig:
+    def __init__(self, delays: Optional[Dict[str, float]] = None, fail_models: Optional[set] = None,
+                 default_delay: float = 0.0, cse_delay: float = 0.0, page_delay: float = 0.0):
+        self.delays = delays or {}
+        self.fail_models = fail_models or set()
+        self.default_delay = default_delay
+        self.cse_delay = cse_delay
+        self.page_delay = page_delay
+        self.requests = 0  # completions
+        self.cse_requests = 0
+        self.page_requests = 0
+
+def stub_items(base_url: str, query: str, start: int = 1, num: int = 10):
+    """Deterministic Custom Search items for a query; links point at the stub pages."""
+    first = zlib.crc32(query.lower().encode('utf-8')) % STUB_PAGE_COUNT
+    items = []
+    for i in range(start - 1, min(start - 1 + num, STUB_RESULTS_PER_QUERY)):
+        n = (first + i) % STUB_PAGE_COUNT
+        items.append({
+            'title': f"Stub Restaurant {n}, Bangalore",
+            'link': f"{base_url}/page/{n}",
+            'snippet': f"{query} - menu, prices and reviews. ₹{300 + n % 700} for two. Rated 4.{n % 10}/5",
+        })
+    return items
+
+class StubHandler(BaseHTTPRequestHandler):
+    config: StubConfig = StubConfig()
+
+    def log_message(self, format, *args):
+        pass  # keep test output quiet
+
+    def _send_json(self, status: int, body: dict):
+        encoded = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def _send_html(self, status: int, html: str):
+        encoded = html.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path.rstrip('/').endswith('/customsearch/v1'):
+            self.config.cse_requests += 1
+            time.sleep(self.config.cse_delay)
+            query = parse_qs(parsed.query)
+            base_url = f"http://{self.headers.get('Host', '127.0.0.1')}"
+            items = stub_items(base_url, query.get('q', [''])[0], int(query.get('start', ['1'])[0]),
+                               int(query.get('num', ['10'])[0]))
+            self._send_json(200, {'items': items} if items else {})
+            return
+        if parsed.path.startswith('/page/'):
+            self.config.page_requests += 1
+            time.sleep(self.config.page_delay)
+            try:
+                n = int(parsed.path.rsplit('/', 1)[1])
+            except ValueError:
+                self._send_html(404, '<html><body>not found</body></html>')
+                return
+            self._send_html(200, PAGE_HTML.format(n=n, for_two=300 + n % 700, rating=n % 10,
+                                                  price_a=180 + n % 200, price_b=160 + n % 150, price_c=30 + n % 40))
+            return
+        self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/completions'):
+            self._send_json(404, {'error': 'not found'})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        model = payload.get('model', '')
+        self.config.requests += 1
+        time.sleep(self.config.delays.get(model, self.config.default_delay))
+        if model in self.config.fail_models:
+            self._send_json(503, {'error': f'stub failure for {model}'})
+            return
+        text = JSON_TEXT if payload.get('prompt', '').rstrip().endswith(JSON_PRIMER) else CARD_TEXT
+        self._send_json(200, {'model': model, 'choices': [{'text': text}]})
+
+def start_stub_server(port: int = 0, config: Optional[StubConfig] = None,
+                      handler: type = StubHandler) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the stub in a daemon thread. Returns (server, base URL); call server.shutdown() to stop."""
+    handler_class = type('ConfiguredStubHandler', (handler,), {'config': config or StubConfig()})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler_class)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+class RespStubHandler(socketserver.StreamRequestHandler):
+    """One client connection of the RESP stub; the keyspace is shared through the server."""
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line.startswith(b'*'):
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _write(self, value) -> None:
+        if value is None:
+            self.wfile.write(b'$-1\r\n')
+        elif isinstance(value, int):
+            self.wfile.write(b':%d\r\n' % value)
+        elif isinstance(value, list):
+            self.wfile.write(b'*%d\r\n' % len(value))
+            for item in value:
+                self._write(item)
+        elif isinstance(value, str):
+            self.wfile.write(value.encode() + b'\r\n')  # status ('+OK') or error ('-ERR ...')
+        else:
+            self.wfile.write(b'$%d\r\n%s\r\n' % (len(value), value))
+
+    def _get(self, key: bytes):
+        entry = self.server.store.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            self.server.store.pop(key, None)
+            return None
+        return None if entry is None else entry[0]
+
+    def handle(self):
+        while True:
+            args = self._read_command()
+            if not args:
+                return
+            name = args[0].upper()
+            self.server.commands += 1
+            with self.server.lock:
+                if name == b'AUTH' and self.server.password is not None:
+                    self.authenticated = args[-1].decode('utf-8', 'replace') == self.server.password
+                    reply = '+OK' if self.authenticated else '-WRONGPASS invalid username-password pair'
+                elif self.server.password is not None and not getattr(self, 'authenticated', False):
+                    reply = '-NOAUTH Authentication required.'
+                elif name in (b'PING', b'AUTH', b'SELECT', b'FLUSHDB'):
+                    if name == b'FLUSHDB':
+                        self.server.store.clear()
+                    reply = '+PONG' if name == b'PING' else '+OK'
+                elif name == b'GET':
+                    reply = self._get(args[1])
+                elif name == b'MGET':
+                    reply = [self._get(key) for key in args[1:]]
+                elif name == b'SET':
+                    expires = None
+                    options = [arg.upper() for arg in args[3:]]
+                    if b'PX' in options:
+                        expires = time.time() + int(args[3 + options.index(b'PX') + 1]) / 1000
+                    elif b'EX' in options:
+                        expires = time.time() + int(args[3 + options.index(b'EX') + 1])
+                    self.server.store[args[1]] = (args[2], expires)
+                    reply = '+OK'
+                elif name == b'DEL':
+                    reply = sum(1 for key in args[1:] if self.server.store.pop(key, None) is not None)
+                elif name == b'DBSIZE':
+                    reply = len(self.server.store)
+                elif name == b'SCAN':
+                    # Single pass: every matching key with cursor 0
+                    options = [arg.upper() for arg in args[2:]]
+                    pattern = args[2 + options.index(b'MATCH') + 1].decode() if b'MATCH' in options else '*'
+                    keys = [key for key in list(self.server.store) if self._get(key) is not None
+                            and fnmatch.fnmatchcase(key.decode(), pattern)]
+                    reply = [b'0', keys]
+                else:
+                    reply = f"-ERR unknown command '{name.decode()}'"
+            self._write(reply)
+
+def start_resp_stub(port: int = 0, password: Optional[str] = None) -> Tuple[socketserver.ThreadingTCPServer, str]:
+    """
+    Start the RESP stub in a daemon thread. Returns (server, redis:// URL); server.store holds the keyspace.
+    With a password, connections must AUTH with it before any other command (the URL does not include it).
+    """
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', port), RespStubHandler)
+    server.daemon_threads = True
+    server.password = password
+    server.store = {}
+    server.lock = threading.Lock()
+    server.commands = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"redis://127.0.0.1:{server.server_address[1]}"
+
+def _parse_delays(values) -> Dict[str, float]:
+    delays = {}
+    for value in values or []:
+        model, _, seconds = value.rpartition('=')
+        delays[model] = float(seconds)
+    return delays
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', action='append', metavar='MODEL=SECONDS', help='per-model latency')
+    parser.add_argument('--default-delay', type=float, default=0.0)
+    parser.add_argument('--fail', action='append', metavar='MODEL', help='model that always returns 503')
+    parser.add_argument('--cse-delay', type=float, default=0.0, help='latency of the search endpoint')
+    parser.add_argument('--page-delay', type=float, default=0.0, help='latency of the restaurant pages')
+    parser.add_argument('--resp-port', type=int, help='also serve the in-memory Redis-protocol stub on this port')
+    args = parser.parse_args()
+
+    config = StubConfig(_parse_delays(args.delay), set(args.fail or []), args.default_delay,
+                        args.cse_delay, args.page_delay)
+    server, url = start_stub_server(args.port, config)
+    print(f"Stub completions endpoint at {url}/v1/completions, search at {url}/customsearch/v1 (Ctrl+C to stop)")
+    if args.resp_port is not None:
+        resp_server, resp_url = start_resp_stub(args.resp_port)
+        print(f"Redis-protocol stub at {resp_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import socket
+import time
+
+import pytest
+
+import cache_backends
+from cache import Cache
+from cache_backends import MARSHAL_TAG, CacheBackendError, CorruptEntry, LRUBackend, RedisBackend, decode, encode
+from stub_server import start_resp_stub
+
+@pytest.fixture
+def resp_stub():
+    server, url = start_resp_stub(0)
+    yield server, url
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def opened_sockets(monkeypatch):
+    """Every socket RedisBackend opens, to check none are leaked."""
+    sockets = []
+    create_connection = socket.create_connection
+
+    def recording_create_connection(*args, **kwargs):
+        sock = create_connection(*args, **kwargs)
+        sockets.append(sock)
+        return sock
+
+    monkeypatch.setattr(cache_backends.socket, 'create_connection', recording_create_connection)
+    return sockets
+
+def test_get_set_roundtrip(resp_stub):
+    server, url = resp_stub
+    backend = RedisBackend(url, prefix='test')
+    stored_at = time.time()
+    backend.set('search', 'biryani koramangala', backend.encode({'items': [1, 2]}), stored_at)
+    data, when = backend.get('search', 'biryani koramangala')
+    assert backend.decode(data) == {'items': [1, 2]}
+    assert when == stored_at
+    assert list(server.store) == [b'test:search:biryani koramangala']
+    assert backend.get('search', 'missing') is None
+
+def test_set_expires_relative_to_stored_at(resp_stub):
+    server, url = resp_stub
+    backend = RedisBackend(url, prefix='test')
+    backend.set('scrape', 'fresh', b'x', time.time(), expire=60)
+    backend.set('scrape', 'backdated', b'x', time.time() - 120, expire=60)
+    assert backend.get('scrape', 'fresh') is not None
+    assert backend.get('scrape', 'backdated') is None
+    assert 59 < server.store[b'test:scrape:fresh'][1] - time.time() <= 60
+
+def test_scan_returns_namespace_entries_since(resp_stub):
+    server, url = resp_stub
+    backend = RedisBackend(url, prefix='test')
+    now = time.time()
+    backend.set('search', 'old', b'1', now - 100)
+    backend.set('search', 'new', b'2', now)
+    backend.set('scrape', 'other', b'3', now)
+    assert sorted(backend.scan('search', now - 10)) == [('new', b'2')]
+    assert sorted(backend.scan('search', 0)) == [('new', b'2'), ('old', b'1')]
+
+def test_handshake_uses_password_and_keeps_connection(resp_stub, opened_sockets):
+    server, url = resp_stub
+    server.password = 's3cret'
+    backend = RedisBackend(url.replace('redis://', 'redis://:s3cret@'), prefix='test')
+    backend.set('search', 'a', b'1', time.time())
+    assert backend.get('search', 'a')[0] == b'1'
+    assert len(opened_sockets) == 1
+
+def test_failed_auth_closes_and_does_not_keep_connection(resp_stub, opened_sockets):
+    server, url = resp_stub
+    server.password = 's3cret'
+    backend = RedisBackend(url.replace('redis://', 'redis://:wrong@'), prefix='test')
+    with pytest.raises(CacheBackendError, match='WRONGPASS'):
+        backend.get('search', 'a')
+    assert getattr(backend._local, 'connection', None) is None
+    assert opened_sockets[0].fileno() == -1
+    # Fails fast afterwards instead of reusing an unauthenticated connection
+    with pytest.raises(CacheBackendError, match='retrying shortly'):
+        backend.get('search', 'a')
+    assert len(opened_sockets) == 1
+
+def test_unreachable_server_fails_fast(resp_stub):
+    server, url = resp_stub
+    server.shutdown()
+    server.server_close()
+    backend = RedisBackend(url, prefix='test', timeout=0.5)
+    with pytest.raises(CacheBackendError):
+        backend.get('search', 'a')
+    started = time.perf_counter()
+    with pytest.raises(CacheBackendError, match='retrying shortly'):
+        backend.get('search', 'a')
+    assert time.perf_counter() - started < 0.1
+
+def test_redis_stores_json_and_refuses_marshal(resp_stub, monkeypatch):
+    server, url = resp_stub
+    monkeypatch.delenv('FOOD_CACHE_FORMAT', raising=False)
+    cache = Cache('scrape', ttl=60, backend=RedisBackend(url, prefix='test'))
+    cache.set('json', {'name': 'Meghana Foods'})
+    assert server.store[b'test:scrape:json'][0][8:] == b'{"name": "Meghana Foods"}'
+    cache.backend.set('scrape', 'marshal', encode({'name': 'Truffles'}), time.time())
+    assert cache.get('json') == {'name': 'Meghana Foods'}
+    assert cache.get('marshal') is None
+    monkeypatch.setenv('FOOD_CACHE_FORMAT', 'marshal')
+    assert cache.get('marshal') == {'name': 'Truffles'}
+
+@pytest.mark.parametrize('data', [
+    MARSHAL_TAG + encode({'name': 'Truffles', 'menu': [1, 2, 3]})[1:20],  # truncated
+    b'\x00\x01not a cache value',
+    MARSHAL_TAG + b'\xff\xff',
+    encode(b'raw bytes'),
+    encode({'a', 'set'}),
+    b'"just json"'[:-2],
+    b'null',
+])
+def test_decode_rejects_corrupt_values(data):
+    with pytest.raises(CorruptEntry):
+        decode(data)
+
+def test_corrupt_entries_read_as_misses():
+    backend = LRUBackend()
+    cache = Cache('scrape', ttl=60, backend=backend)
+    cache.set('good', {'name': 'Meghana Foods'})
+    backend.set('scrape', 'bad', MARSHAL_TAG + b'\xff\xff', time.time())
+    assert cache.lookup('bad') is None
+    assert cache.peek('bad') is None
+    assert dict(cache.items()) == {'good': {'name': 'Meghana Foods'}}
+    assert (cache.hits, cache.misses) == (0, 1)
@@ -0,0 +1,69 @@
+import pytest
+import requests
+
+from llm_router import LLMRouter, ModelTier
+from stub_server import StubConfig, start_stub_server
+
+FAST = 'stub/fast-model'
+LARGE = 'stub/large-model'
+
+@pytest.fixture
+def stub():
+    config = StubConfig()
+    server, base_url = start_stub_server(0, config)
+    yield config, f"{base_url}/v1/completions"
+    server.shutdown()
+
+def make_router(url, hedge_after=0.0, fast_timeout=5.0, large_timeout=5.0):
+    tiers = {'fast': ModelTier('fast', FAST, fast_timeout), 'large': ModelTier('large', LARGE, large_timeout)}
+    return LLMRouter('stub-key', tiers=tiers, hedge_after=hedge_after, url=url)
+
+def payload(prompt):
+    # Distinct prompts, so single-flight never merges calls across tests
+    return {'prompt': prompt, 'max_tokens': 50}
+
+def test_general_queries_use_the_fast_tier(stub):
+    config, url = stub
+    router = make_router(url)
+    response = router.complete(payload('general'))
+    assert (response.tier, response.model, response.hedged) == ('fast', FAST, False)
+    assert response.data['choices'][0]['text']
+    assert config.requests == 1
+
+def test_restaurant_queries_use_the_large_tier(stub):
+    _, url = stub
+    response = make_router(url).complete(payload('restaurant'), restaurant='Truffles')
+    assert (response.tier, response.model) == ('large', LARGE)
+
+def test_slow_primary_is_hedged_and_the_backup_wins(stub):
+    config, url = stub
+    config.delays = {FAST: 1.0}
+    router = make_router(url, hedge_after=0.1)
+    response = router.complete(payload('hedge'))
+    assert (response.tier, response.hedged) == ('large', True)
+    assert response.latency < 0.9
+    assert router.stats['hedged'] == 1 and router.stats['wins'] == {'fast': 0, 'large': 1}
+
+def test_failed_primary_falls_back_immediately(stub):
+    config, url = stub
+    config.fail_models = {FAST}
+    router = make_router(url, hedge_after=5.0)
+    response = router.complete(payload('failover'))
+    assert response.tier == 'large'
+    assert response.latency < 1.0
+
+def test_timeout_without_hedging_raises(stub):
+    config, url = stub
+    config.delays = {FAST: 1.0}
+    router = make_router(url, hedge_after=0.0, fast_timeout=0.2)
+    with pytest.raises(requests.exceptions.Timeout):
+        router.complete(payload('timeout'))
+    assert router.stats['errors'] == 1
+
+def test_all_tiers_failing_raises_the_primary_error(stub):
+    config, url = stub
+    config.fail_models = {FAST, LARGE}
+    router = make_router(url, hedge_after=0.1)
+    with pytest.raises(requests.exceptions.HTTPError):
+        router.complete(payload('all fail'))
+    assert router.stats['errors'] == 1
@@ -0,0 +1,34 @@
+from name_index import NameIndex
+from records import MenuItem, RestaurantInfo
+
+def _index(*branches):
+    return NameIndex((link, RestaurantInfo(name='Truffles', location=location, menu_items=[MenuItem(name='Burger')]))
+                     for link, location in branches)
+
+def _links(matches):
+    return [match.link for match in matches]
+
+def test_alias_matches_canonical_locality():
+    index = _index(('https://example.com/truffles-hsr', 'HSR, Bangalore'),
+                   ('https://example.com/truffles-indiranagar', 'Indiranagar, Bangalore'))
+    assert _links(index.lookup('truffles', 'HSR Layout')) == ['https://example.com/truffles-hsr']
+    assert _links(index.lookup('truffles', 'hsr')) == ['https://example.com/truffles-hsr']
+
+def test_misspelt_alias_matches_canonical_locality():
+    index = _index(('https://example.com/a', 'Koramangala 5th Block, Bangalore'),
+                   ('https://example.com/b', 'Jayanagar, Bangalore'))
+    matches = index.lookup('truffles', 'Kormangala')
+    assert _links(matches) == ['https://example.com/a']
+
+def test_locality_from_link_and_unknown_location_are_kept_but_rank_last():
+    index = _index(('https://example.com/truffles-hsr-layout', 'Sector 7'),
+                   ('https://example.com/truffles', ''),
+                   ('https://example.com/truffles-main', 'HSR Layout'))
+    assert _links(index.lookup('truffles', 'HSR')) == ['https://example.com/truffles-main',
+                                                      'https://example.com/truffles-hsr-layout',
+                                                      'https://example.com/truffles']
+
+def test_unknown_localities_fall_back_to_substring():
+    index = _index(('https://example.com/a', 'Church Street, Bangalore'),
+                   ('https://example.com/b', 'Lavelle Road, Bangalore'))
+    assert _links(index.lookup('truffles', 'church street')) == ['https://example.com/a']
@@ -0,0 +1,25 @@
+import pytest
+
+from price_index import normalize_price_text
+
+@pytest.mark.parametrize('text', [
+    'Open hours 11am - 11pm',
+    'Tours 12 per day',
+    'Our entrepreneur 5 star chef',
+    'Yours 4 ever',
+    'Sinr 3',
+])
+def test_currency_words_inside_other_words_are_not_prices(text):
+    assert normalize_price_text(text) is None
+
+@pytest.mark.parametrize('text, low, high, basis, currency', [
+    ('Rs. 300 for two', 300, 300, 'for_two', 'INR'),
+    ('rs300 per person', 300, 300, 'per_person', 'INR'),
+    ('INR 1,200 for two', 1200, 1200, 'for_two', 'INR'),
+    ('₹300 - ₹600 for two', 300, 600, 'for_two', 'INR'),
+    ('Dinner for 2: Rs 800', 800, 800, 'for_two', 'INR'),
+    ('Costs usd15', 1245, 1245, 'unknown', 'USD'),
+])
+def test_currency_amounts(text, low, high, basis, currency):
+    quote = normalize_price_text(text)
+    assert (quote.low, quote.high, quote.basis, quote.currency) == (low, high, basis, currency)
@@ -0,0 +1,41 @@
+import threading
+
+from metrics import METRICS
+from profiling import profile_request
+
+MB = 1024 * 1024
+
+def _allocate(name, size):
+    with METRICS.timed(name):
+        block = bytearray(size)
+        del block
+
+def test_request_peak_survives_later_stages(tmp_path):
+    with profile_request('peak', 'sample', str(tmp_path)) as profile:
+        _allocate('stage.big', 8 * MB)
+        _allocate('stage.small', 1024)
+    report = profile.report
+    assert report['stages']['stage.big']['peak_kb'] >= 8 * 1024
+    assert report['stages']['stage.small']['peak_kb'] < 1024
+    # The second stage reset tracemalloc's peak; the request peak must still include the first
+    assert report['peak_kb'] >= 8 * 1024
+
+def test_request_peak_includes_the_tail_after_the_last_stage(tmp_path):
+    with profile_request('tail', 'sample', str(tmp_path)) as profile:
+        _allocate('stage.small', 1024)
+        block = bytearray(8 * MB)
+        del block
+    assert profile.report['peak_kb'] >= 8 * 1024
+
+def test_only_the_profiled_requests_stages_are_recorded(tmp_path):
+    with profile_request('scoped', 'sample', str(tmp_path)) as profile:
+        # Another request's work on its own thread, concurrent with the profiled one
+        other = threading.Thread(target=_allocate, args=('stage.other_request', 1024))
+        other.start()
+        other.join()
+        worker = threading.Thread(target=profile.run_in_thread, args=(_allocate, 'stage.worker', 1024))
+        worker.start()
+        worker.join()
+        _allocate('stage.own', 1024)
+    assert set(profile.report['stages']) == {'stage.worker', 'stage.own'}
+    assert METRICS.stage_hook is None
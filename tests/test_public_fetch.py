@@ -0,0 +1,82 @@
+import asyncio
+import http.server
+import threading
+
+import pytest
+
+import public_fetch
+from public_fetch import NonPublicAddress, is_public_address, public_session
+
+# 127.0.0.2 stands in for a public host; the redirect target 127.0.0.1 is loopback like any internal service
+FRONT_HOST = '127.0.0.2'
+PAGE = b'<html><head><title>Internal</title></head><body><h1>Internal admin</h1><p>Cuisine: secrets</p></body></html>'
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', self.server.redirect_to)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+@pytest.fixture
+def servers(monkeypatch):
+    internal = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    front = http.server.ThreadingHTTPServer((FRONT_HOST, 0), _Handler)
+    front.redirect_to = f"http://127.0.0.1:{internal.server_address[1]}/admin"
+    for server in (internal, front):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(public_fetch, 'is_public_address', lambda address: str(address) == FRONT_HOST)
+    yield f"http://{FRONT_HOST}:{front.server_address[1]}"
+    for server in (internal, front):
+        server.shutdown()
+        server.server_close()
+
+@pytest.mark.parametrize('address, public', [
+    ('8.8.8.8', True),
+    ('2606:4700:4700::1111', True),
+    ('127.0.0.1', False),
+    ('10.1.2.3', False),
+    ('192.168.0.10', False),
+    ('169.254.169.254', False),
+    ('::1', False),
+    ('fe80::1%eth0', False),
+    ('::ffff:10.0.0.1', False),
+])
+def test_is_public_address(address, public):
+    assert is_public_address(address) is public
+
+def test_public_host_is_fetched(servers):
+    assert public_session().get(f"{servers}/menu").content == PAGE
+
+def test_redirect_to_private_address_is_refused(servers):
+    with pytest.raises(NonPublicAddress, match='127.0.0.1'):
+        public_session().get(f"{servers}/redirect")
+
+def test_scrape_endpoint_refuses_redirect_to_private_address(servers, monkeypatch, tmp_path):
+    pytest.importorskip('streamlit')
+    pytest.importorskip('googleapiclient')
+    monkeypatch.setenv('FOOD_CACHE_PATH', str(tmp_path / 'cache.sqlite3'))
+    from aiohttp.test_utils import TestClient, TestServer
+    import api_server
+    monkeypatch.setattr(api_server, 'is_public_address', public_fetch.is_public_address)
+
+    async def scrape(url):
+        client = TestClient(TestServer(api_server.create_app()))
+        await client.start_server()
+        try:
+            response = await client.get('/scrape', params={'url': url})
+            return response.status, await response.text()
+        finally:
+            await client.close()
+
+    status, body = asyncio.run(scrape(f"{servers}/redirect"))
+    assert status == 403
+    assert 'Internal admin' not in body
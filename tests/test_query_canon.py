@@ -0,0 +1,38 @@
+import pytest
+
+from query_canon import bucket_budget, parse_query, recommendation_key
+
+@pytest.mark.parametrize('query', [
+    'biryani koramangala',
+    'Biryani in Koramangala',
+    'best biryani near koramangala bangalore',
+    'cheap biriyani koramangala',
+])
+def test_phrasings_share_one_key(query):
+    assert parse_query(query, verbose=False).key == 'biryani|koramangala'
+
+@pytest.mark.parametrize('query, sent', [
+    ('cheap biryani in koramangala', 'cheap biryani in Koramangala Bangalore'),
+    ('affordable best dosa', 'affordable best dosa in Bangalore'),
+    ('biryani koramangala', 'biryani in Koramangala Bangalore'),
+])
+def test_intent_words_stay_in_the_sent_query(query, sent):
+    assert parse_query(query, verbose=False).enhanced_query == sent
+
+@pytest.mark.parametrize('query, key', [
+    ('ಬಿರಿಯಾನಿ', 'ಬಿರಿಯಾನಿ|bangalore'),
+    ('बिरयानी koramangala', 'बिरयानी|koramangala'),
+    ('मसाला दोसा', 'मसाला दोसा|bangalore'),
+])
+def test_non_latin_queries_keep_their_words(query, key):
+    parsed = parse_query(query, verbose=False)
+    assert parsed.key == key
+    assert parsed.base_query in parsed.enhanced_query
+
+def test_non_latin_queries_do_not_share_a_key():
+    assert parse_query('ಬಿರಿಯಾನಿ', verbose=False).key != parse_query('ದೋಸೆ', verbose=False).key
+
+def test_budget_is_bucketed_only_in_the_key():
+    request = {'app': 'food_app', 'food_type': 'biryani', 'budget': 1090.0, 'num_people': 2}
+    assert bucket_budget(1090, 2) == 1000.0
+    assert recommendation_key(request) == recommendation_key(dict(request, budget=1000.0))
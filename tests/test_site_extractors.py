@@ -0,0 +1,93 @@
+from pathlib import Path
+
+import pytest
+
+import site_extractors
+from metrics import METRICS
+from site_extractors import (JSON_LD, NEXT_DATA, JsonLdExtractor, NextDataExtractor, SelectorExtractor,
+                             extract_with_plugin, extractor_for, register)
+
+FIXTURES = Path(__file__).parent / 'fixtures' / 'site_extractors'
+
+BLOG_SELECTORS = {'name': 'h1.entry-title', 'cuisine': '.cuisine', 'location': '.address',
+                  'price_range': '.cost', 'menu_item': 'table.menu tr',
+                  'menu_name': 'td:nth-of-type(1)', 'menu_price': 'td:nth-of-type(2)',
+                  'parse_only': ['h1', 'div', 'p', 'table']}
+
+def fixture(name):
+    return (FIXTURES / name).read_text(encoding='utf-8')
+
+def menu(info):
+    return [(item.name, item.price, item.currency) for item in info.menu_items]
+
+@pytest.fixture
+def registry(monkeypatch):
+    """An isolated copy of the plugin registry, so test registrations don't leak."""
+    monkeypatch.setattr(site_extractors, '_REGISTRY', dict(site_extractors._REGISTRY))
+    METRICS.reset()
+    yield site_extractors._REGISTRY
+    METRICS.reset()
+
+def test_json_ld_reads_restaurant_from_graph():
+    info = JsonLdExtractor().extract(fixture('zomato_json_ld.html'))
+    assert info.name == 'Meghana Foods'
+    assert info.cuisine == 'Biryani, Andhra'
+    assert info.location == '124, 1st Cross, Koramangala, Bangalore'
+    assert info.price_range == '₹700 for two'
+    assert info.rating == '4.4/5'
+    # Nested menu sections, list-valued offers and a single-object hasMenuItem; items without a price are skipped.
+    assert menu(info) == [('Chicken Boneless Biryani', 340.0, '₹'), ('Paneer Biryani', 290.0, '₹'),
+                          ('Chilli Chicken', 310.5, '₹')]
+
+def test_json_ld_without_restaurant_object_is_none():
+    assert JsonLdExtractor().extract(fixture('no_structured_data.html')) is None
+
+def test_next_data_converts_paise_to_rupees():
+    info = NextDataExtractor().extract(fixture('swiggy_next_data.html'))
+    assert info.name == 'Truffles'
+    assert info.cuisine == 'Burgers, American'
+    assert info.location == 'Koramangala'
+    assert info.price_range == '₹450 for two'
+    assert info.rating == '4.5'
+    assert menu(info) == [('All American Cheese Burger', 285.0, '₹'), ('Ghee Roast Chicken Burger', 310.0, '₹'),
+                          ('Alfredo Pasta', 320.5, '₹')]
+
+def test_selector_extractor_reads_configured_fields():
+    info = SelectorExtractor('css.foodieblog.in', BLOG_SELECTORS).extract(fixture('selector_blog.html'))
+    assert info.name == 'Vidyarthi Bhavan'
+    assert info.cuisine == 'South Indian'
+    assert info.location == 'Gandhi Bazaar, Basavanagudi'
+    assert info.price_range == 'Cost for two: ₹200'
+    assert menu(info) == [('Masala Dosa', 80.0, '₹'), ('Rava Vada', 45.0, 'Rs.')]
+
+def test_selector_extractor_with_no_matches_is_none():
+    assert SelectorExtractor('css.foodieblog.in', BLOG_SELECTORS).extract(fixture('no_structured_data.html')) is None
+
+def test_registry_matches_subdomains():
+    assert extractor_for('https://www.zomato.com/bangalore/meghana-foods') is JSON_LD
+    assert extractor_for('https://m.swiggy.com/restaurants/truffles') is NEXT_DATA
+    assert extractor_for('https://notzomato.com/') is None
+    assert extractor_for('https://example.com/zomato.com') is None
+
+def test_registered_selector_plugin_is_used(registry):
+    plugin = register(SelectorExtractor('css.foodieblog.in', BLOG_SELECTORS), 'foodieblog.in')
+    assert extractor_for('https://www.foodieblog.in/vidyarthi-bhavan') is plugin
+    info = extract_with_plugin('https://www.foodieblog.in/vidyarthi-bhavan', fixture('selector_blog.html'))
+    assert info.name == 'Vidyarthi Bhavan'
+    assert METRICS.counters['extract.css.foodieblog.in.hit'] == 1
+
+def test_registry_falls_back_when_plugin_finds_nothing(registry):
+    assert extract_with_plugin('https://example.com/some-cafe', fixture('no_structured_data.html')) is None
+    assert extract_with_plugin('https://www.zomato.com/some-cafe', fixture('no_structured_data.html')) is None
+    assert METRICS.counters == {'extract.json_ld.fallback': 1}
+
+def test_extract_html_uses_generic_extractor_on_plugin_miss(registry):
+    pytest.importorskip('streamlit')
+    pytest.importorskip('googleapiclient')
+    from google_search import extract_html
+
+    html = fixture('no_structured_data.html')
+    info = extract_html(html.encode('utf-8'), 'utf-8', 'https://www.zomato.com/some-cafe')
+    assert info.name == 'Some Cafe'
+    assert METRICS.counters['extract.json_ld.fallback'] == 1
+    assert METRICS.summary('extract.generic')['count'] == 1
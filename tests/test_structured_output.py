@@ -0,0 +1,26 @@
+import json
+
+from structured_output import parse_recommendations
+
+def _response(total, prices):
+    entry = {'restaurant': 'Meghana Foods', 'location': 'Koramangala',
+             'items': [{'name': f'Item {i}', 'price': price} for i, price in enumerate(prices)]}
+    if total is not None:
+        entry['total'] = total
+    return json.dumps({'recommendations': [entry]})
+
+def test_group_order_total_is_kept_over_unit_prices():
+    # 4 people x ₹300 biryani: the items list the dish once
+    cards, problems = parse_recommendations(_response(1200, [300]), budget=2000, num_people=4)
+    assert cards[0].total_cost == 1200
+    assert cards[0].per_person_cost == 300
+    assert problems == []
+
+def test_group_order_over_budget_is_rejected():
+    cards, problems = parse_recommendations(_response(1200, [300]), budget=1000, num_people=4)
+    assert cards == []
+    assert problems == ['Rejected over-budget recommendation: Meghana Foods (₹1200)']
+
+def test_item_sum_replaces_a_missing_or_lower_total():
+    assert parse_recommendations(_response(None, [300, 150]), num_people=2)[0][0].total_cost == 450
+    assert parse_recommendations(_response(400, [300, 150]), num_people=2)[0][0].total_cost == 450